@@ -1,6 +1,6 @@
 """Application configuration"""
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Any, Dict, List, Optional
 
 class Settings(BaseSettings):
     """Application settings"""
@@ -14,11 +14,33 @@ class Settings(BaseSettings):
     OPENAI_MODEL: str = "gpt-4o"
     OPENAI_TEMPERATURE: float = 0.7
     OPENAI_MAX_TOKENS: int = 4000
+    OPENAI_BASE_URL: str | None = None  # e.g. a local stub (scripts/batch_stub.py)
+    
+    # Upstream backend: "provider" (OpenAI/OpenRouter) or "fake" (in-process, for load tests)
+    LLM_BACKEND: str = "provider"
+    FAKE_LLM_LATENCY: Dict[str, Dict[str, Any]] = {  # Per model prefix; fixed/uniform/exponential/lognormal
+        "default": {"distribution": "lognormal", "median": 2.0, "p95": 6.0},
+        "gpt-4o-mini": {"distribution": "lognormal", "median": 1.0, "p95": 3.0},
+        "text-embedding": {"distribution": "fixed", "seconds": 0.1},
+        "dall-e": {"distribution": "lognormal", "median": 8.0, "p95": 15.0}
+    }
+    FAKE_LLM_ERROR_RATES: Dict[int, float] = {}  # HTTP status -> probability, e.g. {429: 0.02, 500: 0.01}
+    FAKE_LLM_SEED: Optional[int] = None
     
     # OpenRouter (alternative)
     OPENROUTER_API_KEY: str | None = None
     USE_OPENROUTER: bool = False
     
+    # Upstream HTTP clients (one keep-alive pool per provider)
+    HTTP_TIMEOUT: float = 600.0  # seconds per read/write
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_POOL_TIMEOUT: float = 30.0  # waiting for a free pooled connection
+    HTTP_MAX_RETRIES: int = 2  # openai client retries (connection errors, 429, 5xx)
+    HTTP_MAX_CONNECTIONS: int = 200
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 100
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0  # seconds an idle connection is kept
+    HTTP_HTTP2: bool = True  # needs h2 (httpx[http2]); HTTP/1.1 otherwise
+    
     # API Configuration
     API_HOST: str = "0.0.0.0"
     API_PORT: int = 8000
@@ -32,29 +54,83 @@ class Settings(BaseSettings):
     
     # Cache Settings
     CACHE_TTL: int = 604800  # 7 days in seconds
+    CACHE_TTLS: Dict[str, int] = {
+        "suggestions": 86400,
+        "image_generation": 3000  # DALL-E URLs expire after an hour
+    }
     ENABLE_CACHING: bool = True
     
+    # Near-duplicate cache lookups (query embeddings)
+    ENABLE_SEMANTIC_CACHE: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # Cosine similarity to reuse a response
+    SEMANTIC_CACHE_SIZE: int = 5000  # Recent queries indexed per replica
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_DIMENSIONS: int = 256
+    EMBEDDING_PRICE: float = 0.02  # per 1M tokens
+    
+    # Single-flight: identical in-flight generations share one upstream call
+    ENABLE_SINGLE_FLIGHT: bool = True
+    SINGLE_FLIGHT_SHARED: bool = False  # Coalesce across replicas via a Redis lock
+    SINGLE_FLIGHT_LOCK_TTL: int = 120  # seconds; a stuck leader's lock lapses after this
+    SINGLE_FLIGHT_POLL_INTERVAL: float = 0.25  # seconds between shared-cache checks
+    
     # Cost Tracking
     ENABLE_COST_TRACKING: bool = True
     COST_ALERT_THRESHOLD: float = 100.0  # Alert if daily cost exceeds $100
+    COST_TRACKING_BACKEND: str = "redis"  # "redis" (all replicas) or "local" (event log per host)
+    USAGE_LOG_FILE: str = "logs/usage_events.jsonl"  # Local backend / Redis fallback
+    USAGE_LOG_COMPACT_BYTES: int = 10_000_000  # Log size that triggers compaction into a checkpoint
+    USAGE_EVENTS_MAXLEN: int = 100000  # Approximate cap of the Redis event stream
+    USAGE_MINUTE_RETENTION: int = 1440  # Minutes of per-minute rollups kept
+    LATENCY_BUCKETS: List[float] = [0.5, 1, 2, 5, 10, 20, 30, 60, 120]  # seconds
     
-    # Rate Limiting
-    RATE_LIMIT_REQUESTS: int = 100
+    # Rate Limiting (upstream API budget; clamped by x-ratelimit-remaining-* headers)
+    RATE_LIMIT_REQUESTS: int = 100  # Requests per window
     RATE_LIMIT_WINDOW: int = 60  # seconds
+    RATE_LIMIT_TOKENS_PER_MINUTE: Optional[int] = None  # None: room for every request at OPENAI_MAX_TOKENS
+    RATE_LIMIT_SHARED: bool = False  # One Redis-backed budget for all replicas
+    MAX_CONCURRENT_REQUESTS: int = 100  # Upstream calls in flight per replica
+    
+    # Batch Generation
+    BATCH_GENERATE_CONCURRENCY: int = 5  # Recipes in flight per batch request
+    BATCH_GENERATE_MAX: int = 10  # Per request, public callers
+    BATCH_GENERATE_INTERNAL_MAX: int = 200  # Per request, callers sending X-Internal-Key
+    INTERNAL_API_KEY: str | None = None  # Shared secret for service-to-service calls
+    
+    # Offline generation (provider Batch API)
+    BATCH_API_MAX_REQUESTS: int = 50000  # Per job; the provider's per-batch limit
+    BATCH_COMPLETION_WINDOW: str = "24h"
+    BATCH_PRICE_FACTOR: float = 0.5  # Batch API price relative to synchronous calls
+    BATCH_RESULT_TTL: int = 604800  # seconds collected results stay cached
     
     # Monitoring
     ENABLE_METRICS: bool = True
     LOG_LEVEL: str = "INFO"
     
-    # Model Pricing (per 1M tokens)
-    GPT4_INPUT_PRICE: float = 30.0
-    GPT4_OUTPUT_PRICE: float = 60.0
-    GPT4O_INPUT_PRICE: float = 5.0
-    GPT4O_OUTPUT_PRICE: float = 15.0
-    GPT4O_MINI_INPUT_PRICE: float = 0.15
-    GPT4O_MINI_OUTPUT_PRICE: float = 0.60
+    # Model Pricing (per 1M tokens; longest prefix match, so dated snapshots resolve)
+    MODEL_PRICES: Dict[str, Dict[str, float]] = {
+        "gpt-4o-mini": {"input": 0.15, "output": 0.60},
+        "gpt-4o": {"input": 5.0, "output": 15.0},
+        "gpt-4": {"input": 30.0, "output": 60.0}
+    }
     DALLE3_PRICE: float = 0.040  # per image (1024x1024)
     
+    # Model Routing
+    MODEL_ROUTES: Dict[str, List[str]] = {  # Acceptable models per endpoint; others use OPENAI_MODEL
+        "blog_generation": ["gpt-4o"],
+        "suggestions": ["gpt-4o-mini", "gpt-4o"]
+    }
+    LATENCY_BUDGETS: Dict[str, float] = {  # p95 seconds; the cheapest model within budget wins
+        "suggestions": 5.0
+    }
+    ROUTING_LATENCY_BUDGET: float = 60.0  # Endpoints without a budget
+    ROUTING_LATENCY_WINDOW: int = 200  # Recent calls per route kept for p95
+    ENABLE_HEDGING: bool = True  # Fire a backup when a call outlives its route's p95
+    HEDGE_MIN_DELAY: float = 2.0  # seconds
+    HEDGE_DEFAULT_DELAY: float = 20.0  # seconds, before a route has enough samples
+    ENABLE_PROVIDER_FAILOVER: bool = True  # OpenAI <-> OpenRouter on 429/5xx/connection errors
+    OPENROUTER_MODEL_PREFIX: str = "openai/"
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -10,9 +10,17 @@ from loguru import logger
 import sys
 
 from app.core.config import settings
+from app.core.metrics import PrometheusMiddleware, metrics_endpoint
 from app.core.monitoring import metrics_middleware
 from app.routers import recipes, blog, suggestions, images
+from app.services.cache_service import cache_service
 from app.services.cost_tracker import cost_tracker
+from app.services.http_clients import http_clients
+from app.services.model_router import model_router
+from app.services.openai_service import openai_service
+from app.services.prompt_cache import prompt_cache
+from app.services.rate_limiter import rate_limiter
+from app.services.single_flight import single_flight
 
 # Configure logging
 logger.remove()
@@ -37,12 +45,20 @@ async def lifespan(app: FastAPI):
     
     # Initialize services
     await cost_tracker.initialize()
+    if settings.ENABLE_CACHING:
+        await cache_service.connect()
+    if settings.RATE_LIMIT_SHARED:
+        await rate_limiter.connect()
     
     yield
     
     # Cleanup
     logger.info("Shutting down AI Service")
     await cost_tracker.save_stats()
+    await rate_limiter.disconnect()
+    await cache_service.disconnect()
+    await http_clients.aclose()
+    openai_service.close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -65,6 +81,8 @@ app.add_middleware(
 
 # Metrics middleware
 app.middleware("http")(metrics_middleware)
+app.add_middleware(PrometheusMiddleware)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
 
 # Include routers
 app.include_router(recipes.router, prefix="/api/recipes", tags=["recipes"])
@@ -78,10 +96,15 @@ async def health_check():
     return {
         "status": "healthy",
         "service": "mealprep360-ai",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "rate_limit": rate_limiter.stats(),
+        "cache": prompt_cache.stats(),
+        "single_flight": single_flight.stats(),
+        "http": http_clients.stats(),
+        "routing": model_router.stats()
     }
 
-@app.get("/metrics")
+@app.get("/metrics/costs")
 async def get_metrics():
     """Get cost and usage metrics"""
     return await cost_tracker.get_stats()
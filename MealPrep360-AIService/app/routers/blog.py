@@ -17,7 +17,6 @@ async def generate_blog_content(request: BlogContentRequest):
         content, cost = await openai_service.generate_structured_response(
             response_model=BlogContent,
             messages=messages,
-            model="gpt-4o",  # Use GPT-4o for blog content
             endpoint="blog_generation"
         )
         
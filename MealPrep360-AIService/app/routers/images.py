@@ -19,8 +19,7 @@ async def generate_image(request: ImageGenerationRequest):
         
         url, revised_prompt, cost = await openai_service.generate_image(
             prompt=prompt,
-            size=request.size,
-            cache_key=f"image:{request.recipe_title}"
+            size=request.size
         )
         
         return ImageResponse(
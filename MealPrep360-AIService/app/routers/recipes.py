@@ -1,14 +1,51 @@
 """Recipe generation endpoints"""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from loguru import logger
+from typing import AsyncIterator, Optional
+import asyncio
+import hmac
+import json
 import time
+import uuid
 
-from app.models.schemas import RecipeRequest, RecipeResponse, Recipe
+from app.core.config import settings
+from app.models.schemas import RecipeRequest, RecipeResponse, Recipe, Season
+from app.services.batch_jobs import batch_jobs
+from app.services.model_router import served_model
 from app.services.openai_service import openai_service
 from app.services.prompt_manager import prompt_manager
 
 router = APIRouter()
 
+def _sse(event: str, data: str) -> str:
+    """Format one server-sent event (data is already JSON)"""
+    return f"event: {event}\ndata: {data}\n\n"
+
+async def _generate(request: RecipeRequest, use_cache: bool = True, endpoint: str = "recipe_generation") -> RecipeResponse:
+    """Generate and validate one recipe"""
+    start_time = time.time()
+    
+    # Build messages from prompt template
+    messages = prompt_manager.build_recipe_messages(request)
+    
+    # Generate structured response with automatic validation
+    recipe, cost = await openai_service.generate_structured_response(
+        response_model=Recipe,
+        messages=messages,
+        endpoint=endpoint,
+        use_cache=use_cache
+    )
+    
+    generation_time = time.time() - start_time
+    
+    return RecipeResponse(
+        recipe=recipe,
+        generation_time=generation_time,
+        cost=cost,
+        model_used=served_model()
+    )
+
 @router.post("/generate", response_model=RecipeResponse)
 async def generate_recipe(request: RecipeRequest):
     """
@@ -17,57 +54,224 @@ async def generate_recipe(request: RecipeRequest):
     This endpoint generates detailed recipes optimized for batch cooking
     and freezer storage, perfect for meal prep.
     """
-    start_time = time.time()
-    
     try:
-        # Build messages from prompt template
-        messages = prompt_manager.build_recipe_messages(request)
-        
-        # Generate structured response with automatic validation
-        recipe, cost = await openai_service.generate_structured_response(
-            response_model=Recipe,
-            messages=messages,
-            endpoint="recipe_generation",
-            cache_key=f"recipe:{request.season}:{request.recipe_name or 'random'}"
-        )
-        
-        generation_time = time.time() - start_time
-        
-        return RecipeResponse(
-            recipe=recipe,
-            generation_time=generation_time,
-            cost=cost,
-            model_used=openai_service.client.model or "gpt-4o"
-        )
+        return await _generate(request)
         
     except Exception as e:
         logger.error(f"Recipe generation failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/batch-generate")
-async def batch_generate_recipes(season: str, count: int = 5):
-    """Generate multiple recipes for a season"""
-    if count > 10:
-        raise HTTPException(status_code=400, detail="Maximum 10 recipes per batch")
+@router.post("/generate/stream")
+async def generate_recipe_stream(request: RecipeRequest):
+    """
+    Generate a recipe, streaming fields as they are produced (Server-Sent Events)
     
-    recipes = []
-    total_cost = 0.0
+    Events:
+    - `partial`: the recipe so far (any field may still be missing or growing)
+    - `recipe`: the final, fully validated RecipeResponse
+    - `error`: generation or validation failed; the stream ends
+    """
+    messages = prompt_manager.build_recipe_messages(request)
     
-    for i in range(count):
-        request = RecipeRequest(season=season)
+    async def events():
+        start_time = time.time()
+        last_sent = None
+        
         try:
-            response = await generate_recipe(request)
-            recipes.append(response.recipe)
-            total_cost += response.cost
+            async for recipe, cost in openai_service.stream_structured_response(
+                response_model=Recipe,
+                messages=messages,
+                endpoint="recipe_generation_stream"
+            ):
+                if cost is None:
+                    data = recipe.model_dump_json(by_alias=True, exclude_none=True)
+                    if data != last_sent:  # Chunks that don't change a field are skipped
+                        last_sent = data
+                        yield _sse("partial", data)
+                    continue
+                
+                response = RecipeResponse(
+                    recipe=recipe,
+                    generation_time=time.time() - start_time,
+                    cost=cost,
+                    model_used=served_model()
+                )
+                yield _sse("recipe", response.model_dump_json(by_alias=True))
+                
         except Exception as e:
-            logger.error(f"Failed to generate recipe {i+1}: {e}")
+            logger.error(f"Recipe stream failed: {e}")
+            yield _sse("error", json.dumps({"error": str(e)}))
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _internal(internal_key: Optional[str]) -> bool:
+    if not settings.INTERNAL_API_KEY or internal_key is None:
+        return False
+    return hmac.compare_digest(internal_key.encode(), settings.INTERNAL_API_KEY.encode())
+
+def _batch_limit(count: int, internal_key: Optional[str]) -> None:
+    """Public callers get BATCH_GENERATE_MAX; callers presenting INTERNAL_API_KEY get the internal cap"""
+    limit = settings.BATCH_GENERATE_INTERNAL_MAX if _internal(internal_key) else settings.BATCH_GENERATE_MAX
+    if count > limit:
+        raise HTTPException(status_code=400, detail=f"Maximum {limit} recipes per batch")
+
+async def _batch_results(season: Season, count: int) -> AsyncIterator[tuple[int, Optional[RecipeResponse], Optional[str]]]:
+    """
+    Generate `count` recipes concurrently (at most BATCH_GENERATE_CONCURRENCY
+    in flight, within the global OpenAI semaphore)
+    
+    Yields:
+        (index, response, None) or (index, None, error) as each item finishes
+    """
+    limit = asyncio.Semaphore(settings.BATCH_GENERATE_CONCURRENCY)
+    
+    async def generate_one(index: int):
+        async with limit:
+            try:
+                # Uncached: every item sends the same prompt, and should get a different recipe
+                response = await _generate(
+                    RecipeRequest(season=season),
+                    use_cache=False,
+                    endpoint="recipe_batch_generation"
+                )
+                return index, response, None
+            except Exception as e:
+                logger.error(f"Failed to generate recipe {index + 1}: {e}")
+                return index, None, str(e)
+    
+    tasks = [asyncio.create_task(generate_one(i)) for i in range(count)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # Client went away (or the batch failed): stop paying for the rest
+        for task in tasks:
+            task.cancel()
+
+@router.post("/batch-generate")
+async def batch_generate_recipes(
+    season: Season,
+    count: int = Query(default=5, ge=1),
+    x_internal_key: Optional[str] = Header(default=None)
+):
+    """Generate multiple recipes for a season concurrently; failed items are reported, not fatal"""
+    _batch_limit(count, x_internal_key)
     
+    recipes = [None] * count
+    failures = []
+    total_cost = 0.0
+    
+    async for index, response, error in _batch_results(season, count):
+        if response is None:
+            failures.append({"index": index, "error": error})
+            continue
+        recipes[index] = response.recipe
+        total_cost += response.cost
+    
+    generated = [recipe for recipe in recipes if recipe is not None]
     return {
-        "recipes": recipes,
-        "total_generated": len(recipes),
-        "total_cost": total_cost
+        "recipes": generated,
+        "total_generated": len(generated),
+        "total_cost": total_cost,
+        "failures": sorted(failures, key=lambda f: f["index"])
     }
 
+@router.post("/batch-generate/stream")
+async def batch_generate_recipes_stream(
+    season: Season,
+    count: int = Query(default=5, ge=1),
+    x_internal_key: Optional[str] = Header(default=None)
+):
+    """
+    Generate multiple recipes, streaming each one as it completes (Server-Sent Events)
+    
+    Events:
+    - `recipe`: {"index", "response"} for each success, in completion order
+    - `error`: {"index", "error"} for each failed item
+    - `done`: {"total_generated", "total_failed", "total_cost"}
+    """
+    _batch_limit(count, x_internal_key)
+    
+    async def events():
+        generated = failed = 0
+        total_cost = 0.0
+        
+        async for index, response, error in _batch_results(season, count):
+            if response is None:
+                failed += 1
+                yield _sse("error", json.dumps({"index": index, "error": error}))
+                continue
+            generated += 1
+            total_cost += response.cost
+            yield _sse("recipe", json.dumps({
+                "index": index,
+                "response": response.model_dump(mode="json", by_alias=True)
+            }))
+        
+        yield _sse("done", json.dumps({
+            "total_generated": generated,
+            "total_failed": failed,
+            "total_cost": total_cost
+        }))
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _require_internal(internal_key: Optional[str]) -> None:
+    """Batch API jobs are for internal callers (worker, admin) only; off without INTERNAL_API_KEY"""
+    if not settings.INTERNAL_API_KEY:
+        raise HTTPException(status_code=503, detail="Batch jobs are disabled: INTERNAL_API_KEY is not configured")
+    if not _internal(internal_key):
+        raise HTTPException(status_code=403, detail="Batch jobs require X-Internal-Key")
+
+@router.post("/batch-jobs")
+async def submit_batch_job(
+    season: Season,
+    count: int = Query(default=50, ge=1),
+    job_id: Optional[str] = None,
+    x_internal_key: Optional[str] = Header(default=None)
+):
+    """
+    Queue a large generation job on the provider's Batch API
+    
+    Results arrive within BATCH_COMPLETION_WINDOW (usually much sooner) at
+    about half the per-token price, without using the interactive rate
+    limits. Poll GET /batch-jobs/{batch_id} for them.
+    """
+    _require_internal(x_internal_key)
+    if count > settings.BATCH_API_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"Maximum {settings.BATCH_API_MAX_REQUESTS} recipes per batch job")
+    
+    try:
+        return await batch_jobs.submit(season, count, job_id or uuid.uuid4().hex)
+        
+    except Exception as e:
+        logger.error(f"Batch job submission failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/batch-jobs/{batch_id}")
+async def get_batch_job(batch_id: str, x_internal_key: Optional[str] = Header(default=None)):
+    """
+    Batch job status; once `status` is "completed" the response also has
+    `recipes` (each validated against the Recipe schema), `failures` and
+    `total_cost`. Final states: completed, failed, expired, cancelled.
+    """
+    _require_internal(x_internal_key)
+    
+    try:
+        return await batch_jobs.collect(batch_id)
+        
+    except Exception as e:
+        logger.error(f"Batch job {batch_id} lookup failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/validate")
 async def validate_recipe(recipe: Recipe):
     """Validate and audit a recipe"""
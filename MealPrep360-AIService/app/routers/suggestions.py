@@ -17,8 +17,8 @@ async def generate_suggestions(request: SuggestionRequest):
         suggestions, cost = await openai_service.generate_structured_response(
             response_model=SuggestionResponse,
             messages=messages,
-            model="gpt-4o-mini",  # Use mini model for simple suggestions
-            endpoint="suggestions"
+            endpoint="suggestions",
+            semantic_query=request.query  # "quick chicken dinners" ~ "fast chicken dinner ideas"
         )
         
         return suggestions
@@ -0,0 +1,193 @@
+"""Offline recipe generation through the provider's Batch API"""
+from functools import lru_cache
+from loguru import logger
+from pydantic import ValidationError
+import httpx
+import json
+
+from app.core.config import settings
+from app.core.metrics import track_upstream
+from app.models.schemas import Recipe, RecipeRequest, Season
+from app.services.cache_service import cache_service
+from app.services.cost_tracker import cost_tracker
+from app.services.http_clients import http_clients
+from app.services.model_router import model_router
+from app.services.prompt_manager import prompt_manager
+
+ENDPOINT = "recipe_batch_api"
+
+# A batch in one of these states will not change any more
+FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+@lru_cache(maxsize=None)
+def _recipe_format() -> dict:
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "Recipe", "schema": Recipe.model_json_schema()}
+    }
+
+class BatchJobService:
+    """
+    Large recipe jobs through the asynchronous Batch API
+
+    Each recipe is one JSONL request; the file is uploaded and submitted as
+    a batch, which the provider completes within BATCH_COMPLETION_WINDOW at
+    BATCH_PRICE_FACTOR of the synchronous price and outside the interactive
+    rate limits. Collecting a finished batch downloads its output, validates
+    every line against Recipe and caches the result, so repeated polls do
+    not download or bill it again.
+    """
+
+    # Collected results kept in process too, for when Redis is unavailable
+    LOCAL_RESULTS = 100
+
+    def __init__(self):
+        self._collected: dict = {}
+
+    @property
+    def client(self):
+        # Batch API is OpenAI's; OpenRouter has no equivalent
+        return http_clients.get("openai")
+
+    async def _request(self, method: str, path: str, body: dict = None) -> httpx.Response:
+        with track_upstream("openai", f"batch_{method.lower()}"):
+            if method == "POST":
+                response = await self.client.post(path, body=body, cast_to=httpx.Response)
+            else:
+                response = await self.client.get(path, cast_to=httpx.Response)
+        return response
+
+    @staticmethod
+    def _line(custom_id: str, request: RecipeRequest, model: str) -> dict:
+        return {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model,
+                "messages": prompt_manager.build_recipe_messages(request),
+                "temperature": settings.OPENAI_TEMPERATURE,
+                "max_tokens": settings.OPENAI_MAX_TOKENS,
+                "response_format": _recipe_format()
+            }
+        }
+
+    @staticmethod
+    def _status(batch: dict) -> dict:
+        return {
+            "batch_id": batch["id"],
+            "status": batch["status"],
+            "done": batch["status"] in FINAL_STATUSES,
+            "request_counts": batch.get("request_counts") or {},
+            "job_id": (batch.get("metadata") or {}).get("job_id")
+        }
+
+    async def submit(self, season: Season, count: int, job_id: str, servings: int = 6) -> dict:
+        """Upload `count` recipe requests and start a batch; returns its status"""
+        # Latency is irrelevant here: the cheapest acceptable model
+        model = min(
+            model_router.candidates(ENDPOINT),
+            key=lambda m: sum(model_router.prices(m).values())
+        )
+        request = RecipeRequest(season=season, servings=servings)
+        lines = [json.dumps(self._line(f"{job_id}:{i}", request, model)) for i in range(count)]
+
+        with track_upstream("openai", "batch_upload"):
+            upload = await self.client.files.create(
+                file=(f"{job_id}.jsonl", "\n".join(lines).encode()),
+                purpose="batch"
+            )
+        response = await self._request("POST", "/batches", {
+            "input_file_id": upload.id,
+            "endpoint": "/v1/chat/completions",
+            "completion_window": settings.BATCH_COMPLETION_WINDOW,
+            "metadata": {"job_id": job_id, "model": model}
+        })
+        response.raise_for_status()
+        batch = response.json()
+
+        logger.info(f"Submitted batch {batch['id']} ({count} {season.value} recipes, {model}) for job {job_id}")
+        return self._status(batch)
+
+    async def collect(self, batch_id: str) -> dict:
+        """
+        Batch status; once completed, also its validated recipes
+
+        Returns:
+            Status dict, plus "recipes" (camelCase, as the sync endpoints
+            return them, each with the "customId" of its request),
+            "failures" [{custom_id, error}] and "total_cost" once the batch
+            has completed
+        """
+        collected = self._collected.get(batch_id) or await cache_service.get(f"ai:batch:{batch_id}")
+        if collected is not None:
+            return collected
+
+        response = await self._request("GET", f"/batches/{batch_id}")
+        response.raise_for_status()
+        batch = response.json()
+        result = self._status(batch)
+        if batch["status"] != "completed":
+            return result
+
+        model = (batch.get("metadata") or {}).get("model", settings.OPENAI_MODEL)
+        recipes, failures, total_cost = [], [], 0.0
+        for line in await self._download(batch.get("output_file_id")):
+            recipe, cost, error = await self._parse(line, model)
+            total_cost += cost
+            if error:
+                failures.append({"custom_id": line.get("custom_id"), "error": error})
+            else:
+                recipes.append({**recipe.model_dump(mode="json", by_alias=True), "customId": line.get("custom_id")})
+        for line in await self._download(batch.get("error_file_id")):
+            error = (line.get("error") or {}).get("message") or "request failed"
+            failures.append({"custom_id": line.get("custom_id"), "error": error})
+
+        result.update(recipes=recipes, failures=failures, total_cost=total_cost)
+        await cache_service.set(f"ai:batch:{batch_id}", result, ttl=settings.BATCH_RESULT_TTL)
+        if len(self._collected) >= self.LOCAL_RESULTS:
+            self._collected.pop(next(iter(self._collected)))
+        self._collected[batch_id] = result
+        logger.info(
+            f"Collected batch {batch_id}: {len(recipes)} recipes, {len(failures)} failed "
+            f"(cost: ${total_cost:.4f})"
+        )
+        return result
+
+    async def _download(self, file_id: str | None) -> list:
+        if not file_id:
+            return []
+        response = await self._request("GET", f"/files/{file_id}/content")
+        response.raise_for_status()
+        return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+    async def _parse(self, line: dict, model: str) -> tuple:
+        """(recipe or None, cost, error or None) for one output line"""
+        result = line.get("response") or {}
+        if line.get("error") or result.get("status_code") != 200:
+            error = (line.get("error") or {}).get("message") or f"status {result.get('status_code')}"
+            return None, 0.0, error
+
+        body = result["body"]
+        usage = body.get("usage") or {}
+        input_tokens, output_tokens = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+        prices = model_router.prices(body.get("model", model))
+        cost = settings.BATCH_PRICE_FACTOR * (
+            (input_tokens / 1_000_000) * prices["input"] + (output_tokens / 1_000_000) * prices["output"]
+        )
+        await cost_tracker.track_request(
+            endpoint=ENDPOINT,
+            model=body.get("model", model),
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            cost=cost,
+            duration=0
+        )
+
+        try:
+            return Recipe.model_validate_json(body["choices"][0]["message"]["content"] or ""), cost, None
+        except (ValidationError, KeyError, IndexError) as e:
+            return None, cost, str(e)
+
+# Singleton
+batch_jobs = BatchJobService()
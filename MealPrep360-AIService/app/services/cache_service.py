@@ -5,6 +5,7 @@ import pickle
 from typing import Any, Optional
 
 from app.core.config import settings
+from app.core.metrics import track_upstream
 
 class CacheService:
     """Redis caching with pickle serialization"""
@@ -26,13 +27,20 @@ class CacheService:
             logger.warning(f"Redis connection failed: {e}. Caching disabled.")
             self.redis = None
     
+    async def disconnect(self):
+        """Close the Redis connection; the cache is disabled until connect()"""
+        if self.redis:
+            await self.redis.close()
+            self.redis = None
+    
     async def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
         if not self.redis:
             return None
         
         try:
-            value = await self.redis.get(key)
+            with track_upstream("redis", "get"):
+                value = await self.redis.get(key)
             if value:
                 return pickle.loads(value)
         except Exception as e:
@@ -46,7 +54,8 @@ class CacheService:
             return
         
         try:
-            await self.redis.set(key, pickle.dumps(value), ex=ttl)
+            with track_upstream("redis", "set"):
+                await self.redis.set(key, pickle.dumps(value), ex=ttl)
         except Exception as e:
             logger.error(f"Cache set error: {e}")
     
@@ -1,29 +1,140 @@
 """Cost tracking service"""
+from redis import asyncio as aioredis
 from loguru import logger
-from typing import Dict
+from typing import Dict, Optional
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 import json
+import os
 from pathlib import Path
 
+try:
+    import fcntl
+except ImportError:  # Windows: the local log is appended to but never compacted
+    fcntl = None
+
+from app.core.config import settings
+from app.core.metrics import track_upstream
+
+def _minute(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y%m%d%H%M")
+
+def _bucket_labels() -> list:
+    return [str(b) for b in settings.LATENCY_BUCKETS] + ["+Inf"]
+
+# Rollup fields that hold fractions (HINCRBYFLOAT); all others are integer counts
+FLOAT_FIELDS = {"cost", "duration"}
+
+def _increments(event: dict) -> dict:
+    """Counter increments one event adds to every rollup it belongs to"""
+    bucket = bisect_left(settings.LATENCY_BUCKETS, event["duration"])
+    return {
+        "requests": 1,
+        "cost": float(event["cost"]),
+        "tokens": int(event["input_tokens"] + event["output_tokens"]),
+        "input_tokens": int(event["input_tokens"]),
+        "output_tokens": int(event["output_tokens"]),
+        "duration": float(event["duration"]),
+        f"le_{_bucket_labels()[bucket]}": 1
+    }
+
+def _merge(rollups: Dict[str, dict], other: Dict[str, dict]) -> Dict[str, dict]:
+    """Sum two scope -> counters maps (Redis returns the counters as strings)"""
+    merged = {scope: dict(counters) for scope, counters in rollups.items()}
+    for scope, counters in other.items():
+        target = merged.setdefault(scope, {})
+        for field, amount in counters.items():
+            cast = float if field in FLOAT_FIELDS else int
+            target[field] = cast(target.get(field, 0)) + cast(float(amount))
+    return merged
+
+def _summary(counters: dict) -> dict:
+    """Public view of one rollup: counters plus latency histogram"""
+    requests = int(counters.get("requests", 0))
+    return {
+        "requests": requests,
+        "cost": float(counters.get("cost", 0.0)),
+        "tokens": int(counters.get("tokens", 0)),
+        "input_tokens": int(counters.get("input_tokens", 0)),
+        "output_tokens": int(counters.get("output_tokens", 0)),
+        "average_duration": float(counters.get("duration", 0.0)) / requests if requests else 0.0,
+        "latency_buckets": {label: int(counters.get(f"le_{label}", 0)) for label in _bucket_labels()}
+    }
+
 class CostTracker:
-    """Track AI API costs and usage"""
-    
+    """
+    Track AI API costs and usage
+
+    Every request is one event; counters (requests, tokens, cost, latency
+    histogram) are rolled up per endpoint, per model and per minute as the
+    events arrive, and /metrics/costs reads only the rollups.
+
+    With Redis the events go to a capped stream and the rollups are hashes
+    bumped with HINCRBY* in one pipeline, so all workers and replicas share
+    them. Without it each event is one O_APPEND write to a local log; every
+    worker tails the log into its own rollups, so workers on a host agree
+    and nothing is lost on a crash (the log is replayed on start). Events
+    Redis rejects at runtime are appended to the same log and counted on
+    top of the shared rollups.
+
+    Once the log passes USAGE_LOG_COMPACT_BYTES it is compacted: rewritten
+    as one checkpoint line holding the rollups so far, under an exclusive
+    lock that every append takes shared, so no write lands in the replaced
+    file. Workers notice the new file and re-read it from the checkpoint.
+    """
+
     def __init__(self):
-        self.stats = {
-            "total_requests": 0,
-            "total_cost": 0.0,
-            "total_tokens": 0,
-            "by_endpoint": {},
-            "by_model": {}
-        }
-        self.stats_file = Path("logs/cost_stats.json")
-    
+        self.redis: Optional[aioredis.Redis] = None
+        self.log_file = Path(settings.USAGE_LOG_FILE)
+        self.lock_file = self.log_file.with_name(self.log_file.name + ".lock")
+        self._fd: Optional[int] = None
+        self._lock_fd: Optional[int] = None
+        self._reader = None
+        self._offset = 0
+        self._rollups: Dict[str, dict] = {}
+
     async def initialize(self):
-        """Load saved stats"""
-        if self.stats_file.exists():
-            with open(self.stats_file) as f:
-                self.stats = json.load(f)
-            logger.info(f"Loaded cost stats: ${self.stats['total_cost']:.2f} total")
-    
+        """Connect to Redis, else open (and replay) the local event log"""
+        if settings.COST_TRACKING_BACKEND == "redis":
+            try:
+                self.redis = await aioredis.from_url(
+                    f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}",
+                    password=settings.REDIS_PASSWORD,
+                    decode_responses=True
+                )
+                await self.redis.ping()
+                logger.info("Connected to Redis (shared cost tracking)")
+                return
+            except Exception as e:
+                logger.warning(f"Redis connection failed: {e}. Tracking costs in {self.log_file}.")
+                self.redis = None
+
+        self._open_log()
+        self._tail()
+        total = self._rollups.get("total", {})
+        logger.info(f"Loaded cost stats: ${total.get('cost', 0.0):.2f} total")
+
+    def _open_log(self):
+        self.log_file.parent.mkdir(parents=True, exist_ok=True)
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.log_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if fcntl and self._lock_fd is None:
+            self._lock_fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+
+    @contextmanager
+    def _locked(self, mode: int):
+        """flock on the lock file (shared: append, exclusive: compact); no-op without fcntl"""
+        if self._lock_fd is None:
+            yield
+            return
+        fcntl.flock(self._lock_fd, mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
     async def track_request(
         self,
         endpoint: str,
@@ -34,53 +145,201 @@ class CostTracker:
         duration: float
     ):
         """Track a single request"""
-        # Update totals
-        self.stats["total_requests"] += 1
-        self.stats["total_cost"] += cost
-        self.stats["total_tokens"] += (input_tokens + output_tokens)
-        
-        # Track by endpoint
-        if endpoint not in self.stats["by_endpoint"]:
-            self.stats["by_endpoint"][endpoint] = {
-                "requests": 0,
-                "cost": 0.0,
-                "tokens": 0
-            }
-        self.stats["by_endpoint"][endpoint]["requests"] += 1
-        self.stats["by_endpoint"][endpoint]["cost"] += cost
-        self.stats["by_endpoint"][endpoint]["tokens"] += (input_tokens + output_tokens)
-        
-        # Track by model
-        if model not in self.stats["by_model"]:
-            self.stats["by_model"][model] = {
-                "requests": 0,
-                "cost": 0.0,
-                "tokens": 0
-            }
-        self.stats["by_model"][model]["requests"] += 1
-        self.stats["by_model"][model]["cost"] += cost
-        self.stats["by_model"][model]["tokens"] += (input_tokens + output_tokens)
-    
+        if not settings.ENABLE_COST_TRACKING:
+            return
+
+        event = {
+            "ts": datetime.now(timezone.utc).timestamp(),
+            "endpoint": endpoint,
+            "model": model,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost": cost,
+            "duration": duration
+        }
+        try:
+            if self.redis:
+                try:
+                    await self._record_shared(event)
+                    return
+                except Exception as e:
+                    logger.warning(f"Redis cost tracking failed: {e}. Appending to {self.log_file}.")
+                    if self._fd is None:
+                        self._open_log()
+            if self._fd is not None:
+                self._append(event)
+            else:
+                self._apply(event)
+        except Exception as e:
+            logger.error(f"Cost tracking error: {e}")
+
+    def _append(self, event: dict):
+        with self._locked(fcntl.LOCK_SH if fcntl else 0):
+            if self._replaced():
+                self._open_log()
+            # One write below PIPE_BUF: appends from workers never interleave
+            os.write(self._fd, (json.dumps(event, separators=(",", ":")) + "\n").encode())
+            size = os.fstat(self._fd).st_size
+        if fcntl and size > settings.USAGE_LOG_COMPACT_BYTES:
+            self._compact()
+
+    def _replaced(self) -> bool:
+        """Whether another worker compacted the log since this one opened it"""
+        try:
+            return os.stat(self.log_file).st_ino != os.fstat(self._fd).st_ino
+        except FileNotFoundError:
+            return True
+
+    async def _record_shared(self, event: dict):
+        increments = _increments(event)
+        minute_key = f"ai:usage:minute:{_minute(event['ts'])}"
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xadd(
+            "ai:usage:events",
+            {k: str(v) for k, v in event.items()},
+            maxlen=settings.USAGE_EVENTS_MAXLEN,
+            approximate=True
+        )
+        pipe.sadd("ai:usage:endpoints", event["endpoint"])
+        pipe.sadd("ai:usage:models", event["model"])
+        for key in (
+            "ai:usage:total",
+            f"ai:usage:endpoint:{event['endpoint']}",
+            f"ai:usage:model:{event['model']}",
+            minute_key
+        ):
+            for field, amount in increments.items():
+                if field in FLOAT_FIELDS:
+                    pipe.hincrbyfloat(key, field, amount)
+                else:
+                    pipe.hincrby(key, field, amount)
+        pipe.expire(minute_key, settings.USAGE_MINUTE_RETENTION * 60)
+        with track_upstream("redis", "usage"):
+            await pipe.execute()
+
+    def _apply(self, event: dict):
+        increments = _increments(event)
+        for scope in (
+            "total",
+            f"endpoint:{event['endpoint']}",
+            f"model:{event['model']}",
+            f"minute:{_minute(event['ts'])}"
+        ):
+            rollup = self._rollups.setdefault(scope, {})
+            for field, amount in increments.items():
+                rollup[field] = rollup.get(field, 0) + amount
+
+    def _tail(self):
+        """Fold log lines appended since the last read (by any worker) into the rollups"""
+        if not self.log_file.exists():
+            return
+        # The open reader pins its inode, so a compacted log never reuses it unnoticed
+        if self._reader is None or os.stat(self.log_file).st_ino != os.fstat(self._reader.fileno()).st_ino:
+            if self._reader is not None:
+                self._reader.close()
+            # New or compacted log: it starts from a checkpoint of everything before
+            self._reader, self._offset, self._rollups = open(self.log_file, "rb"), 0, {}
+        self._reader.seek(self._offset)
+        data = self._reader.read()
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            try:
+                record = json.loads(line)
+                if "checkpoint" in record:
+                    self._rollups = _merge(self._rollups, record["checkpoint"])
+                else:
+                    self._apply(record)
+            except (ValueError, KeyError):
+                logger.warning("Skipping malformed cost log line")
+        self._offset += complete
+
+        oldest = _minute((datetime.now(timezone.utc) - timedelta(minutes=settings.USAGE_MINUTE_RETENTION)).timestamp())
+        for scope in [s for s in self._rollups if s.startswith("minute:") and s[7:] < oldest]:
+            del self._rollups[scope]
+
+    def _compact(self):
+        """Replace the log with one checkpoint line of the rollups it adds up to"""
+        with self._locked(fcntl.LOCK_EX):
+            if os.stat(self.log_file).st_size <= settings.USAGE_LOG_COMPACT_BYTES:
+                return  # another worker just did
+            self._tail()
+            tmp = self.log_file.with_name(self.log_file.name + ".tmp")
+            line = (json.dumps({"checkpoint": self._rollups}, separators=(",", ":")) + "\n").encode()
+            with open(tmp, "wb") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.log_file)
+            self._open_log()
+            self._reader.close()
+            self._reader, self._offset = open(self.log_file, "rb"), len(line)
+        logger.info(f"Compacted cost log {self.log_file}")
+
+    async def _load_rollups(self) -> Dict[str, dict]:
+        """scope -> counters, from Redis and/or the local log"""
+        if self._fd is not None or self.redis:
+            self._tail()
+        if not self.redis:
+            return self._rollups
+
+        endpoints = await self.redis.smembers("ai:usage:endpoints")
+        models = await self.redis.smembers("ai:usage:models")
+        now = datetime.now(timezone.utc)
+        scopes = (
+            ["total"]
+            + [f"endpoint:{e}" for e in endpoints]
+            + [f"model:{m}" for m in models]
+            + [f"minute:{_minute((now - timedelta(minutes=i)).timestamp())}" for i in range(60)]
+        )
+        pipe = self.redis.pipeline(transaction=False)
+        for scope in scopes:
+            pipe.hgetall(f"ai:usage:{scope}")
+        shared = {scope: counters for scope, counters in zip(scopes, await pipe.execute()) if counters}
+        # Events that fell back to the log while Redis was failing
+        return _merge(shared, self._rollups) if self._rollups else shared
+
     async def get_stats(self) -> Dict:
         """Get current stats"""
-        avg_cost = (
-            self.stats["total_cost"] / self.stats["total_requests"]
-            if self.stats["total_requests"] > 0
-            else 0.0
-        )
-        
+        try:
+            rollups = await self._load_rollups()
+        except Exception as e:
+            logger.error(f"Cost stats error: {e}")
+            rollups = {}
+
+        total = _summary(rollups.get("total", {}))
+        since = _minute((datetime.now(timezone.utc) - timedelta(minutes=60)).timestamp())
         return {
-            **self.stats,
-            "average_cost_per_request": avg_cost
+            "backend": "redis" if self.redis else "local",
+            "total_requests": total["requests"],
+            "total_cost": total["cost"],
+            "total_tokens": total["tokens"],
+            "average_cost_per_request": total["cost"] / total["requests"] if total["requests"] else 0.0,
+            "average_duration": total["average_duration"],
+            "latency_buckets": total["latency_buckets"],
+            "by_endpoint": {s[9:]: _summary(c) for s, c in rollups.items() if s.startswith("endpoint:")},
+            "by_model": {s[6:]: _summary(c) for s, c in rollups.items() if s.startswith("model:")},
+            "last_hour": {
+                s[7:]: _summary(c) for s, c in sorted(rollups.items())
+                if s.startswith("minute:") and s[7:] > since
+            }
         }
-    
+
     async def save_stats(self):
-        """Save stats to file"""
-        self.stats_file.parent.mkdir(exist_ok=True)
-        with open(self.stats_file, 'w') as f:
-            json.dump(self.stats, f, indent=2)
+        """Close the event log / Redis connection (events are already durable)"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self.redis:
+            await self.redis.close()
+            self.redis = None
         logger.info("Cost stats saved")
 
 # Singleton
 cost_tracker = CostTracker()
-
@@ -0,0 +1,121 @@
+"""Shared, pooled HTTP clients for upstream AI APIs"""
+from openai import AsyncOpenAI
+from loguru import logger
+from typing import Optional
+import importlib.util
+import httpx
+
+from app.core.config import settings
+from app.services import llm_backends
+from app.services.rate_limiter import rate_limiter
+
+class ClientRegistry:
+    """
+    One AsyncOpenAI client per provider, each on one long-lived httpx pool
+
+    Chat, embedding and image calls all go through these clients, so
+    connections (and their TLS sessions) are kept alive and reused instead
+    of being set up per call. HTTP/2 is used when enabled and the h2
+    package is installed. With LLM_BACKEND="fake" the pools are served
+    by an in-process fake instead of the network. Closed by the app lifespan.
+    """
+
+    def __init__(self):
+        self._clients: dict[str, AsyncOpenAI] = {}
+        self._pools: list[httpx.AsyncClient] = []
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+
+    @property
+    def provider(self) -> str:
+        return "openrouter" if settings.USE_OPENROUTER and settings.OPENROUTER_API_KEY else "openai"
+
+    def get(self, provider: Optional[str] = None) -> AsyncOpenAI:
+        """The shared client for `provider` (defaults to the configured one)"""
+        provider = provider or self.provider
+        if provider not in self._clients:
+            if provider == "openrouter":
+                api_key, base_url = settings.OPENROUTER_API_KEY, "https://openrouter.ai/api/v1"
+            else:
+                api_key, base_url = settings.OPENAI_API_KEY, settings.OPENAI_BASE_URL
+            self._clients[provider] = AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=self._timeout(),
+                max_retries=settings.HTTP_MAX_RETRIES,
+                http_client=self._pool(provider)
+            )
+            logger.info(f"Created pooled {provider} client")
+        return self._clients[provider]
+
+    @staticmethod
+    def _timeout() -> httpx.Timeout:
+        return httpx.Timeout(
+            settings.HTTP_TIMEOUT,
+            connect=settings.HTTP_CONNECT_TIMEOUT,
+            pool=settings.HTTP_POOL_TIMEOUT
+        )
+
+    def _pool(self, provider: str) -> httpx.AsyncClient:
+        http2 = settings.HTTP_HTTP2 and importlib.util.find_spec("h2") is not None
+        if settings.HTTP_HTTP2 and not http2:
+            logger.warning("HTTP_HTTP2 is set but h2 is not installed; using HTTP/1.1")
+        pool = httpx.AsyncClient(
+            http2=http2,
+            transport=llm_backends.transport(),
+            timeout=self._timeout(),
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY
+            ),
+            follow_redirects=True,
+            event_hooks={
+                "request": [self._on_request],
+                "response": [self._rate_limit_hook(provider)]
+            }
+        )
+        self._pools.append(pool)
+        return pool
+
+    def _rate_limit_hook(self, provider: str):
+        """
+        Response hook feeding the rate limiter chat completions from the
+        primary provider only: that's what it budgets. Embeddings, images,
+        batch files and the failover provider have limits of their own
+        """
+        async def on_response(response: httpx.Response):
+            if provider == self.provider and response.request.url.path.endswith("/chat/completions"):
+                await rate_limiter.on_response(response)
+        return on_response
+
+    async def _on_request(self, request: httpx.Request):
+        self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event: str, info: dict):
+        """httpcore connection events: only new connections reach these"""
+        if event == "connection.connect_tcp.complete":
+            self.connections += 1
+        elif event == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    async def aclose(self):
+        for pool in self._pools:
+            await pool.aclose()
+        self._pools.clear()
+        self._clients.clear()
+
+    def stats(self) -> dict:
+        reused = max(0, self.requests - self.connections)
+        return {
+            "clients": sorted(self._clients),
+            "requests": self.requests,
+            "connections_opened": self.connections,
+            "tls_handshakes": self.tls_handshakes,
+            "reuse_rate": round(reused / self.requests, 4) if self.requests else 0.0
+        }
+
+# Singleton
+http_clients = ClientRegistry()
@@ -0,0 +1,273 @@
+"""Upstream LLM backends: the real providers, or a local fake for load tests"""
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+import uuid
+
+import httpx
+import numpy as np
+
+from app.core.config import settings
+
+TITLES = ["Beef and Barley Stew", "Chicken Enchilada Bake", "Lentil Shepherd's Pie",
+          "Turkey Meatball Marinara", "White Bean Chili", "Pork Carnitas", "Vegetable Lasagna",
+          "Coconut Chickpea Curry", "Sausage and Kale Soup", "Baked Ziti"]
+CATEGORIES = ["stew", "casserole", "pie", "pasta", "soup", "curry"]
+CUISINES = ["American", "Mexican", "Italian", "Indian", "French"]
+
+def build_recipe(rng: random.Random, season: str = "fall", servings: int = 6) -> dict:
+    """A schema-valid Recipe (camelCase, as the model returns it)"""
+    title = rng.choice(TITLES)
+    return {
+        "title": title,
+        "description": f"A freezer-friendly {title.lower()} for busy weeknights",
+        "summary": f"{title}, made ahead and frozen in portions.",
+        "ingredients": [
+            {"name": name, "amount": str(rng.randint(1, 4)), "unit": unit}
+            for name, unit in rng.sample([("onion", "whole"), ("garlic", "cloves"), ("olive oil", "tbsp"),
+                                          ("stock", "cups"), ("carrots", "whole"), ("tomatoes", "cans")], 4)
+        ],
+        "instructions": ["Prepare the ingredients.", "Cook everything together.", "Cool and portion."],
+        "prepInstructions": ["Chop the vegetables."],
+        "cookingInstructions": ["Simmer for 40 minutes."],
+        "servingInstructions": ["Reheat until piping hot."],
+        "freezerPrep": ["Cool completely.", "Portion into containers."],
+        "defrostInstructions": ["Thaw overnight in the refrigerator."],
+        "containerSuggestions": ["Freezer-safe glass containers"],
+        "prepTime": rng.randint(10, 40),
+        "cookTime": rng.randint(20, 90),
+        "servings": servings,
+        "storageTime": rng.choice([60, 90, 120]),
+        "category": rng.choice(CATEGORIES),
+        "cuisine": rng.choice(CUISINES),
+        "difficulty": rng.choice(["easy", "medium", "hard"]),
+        "mealType": rng.choice(["lunch", "dinner"]),
+        "season": season,
+        "tags": ["freezer-friendly", "make-ahead"],
+        "allergenInfo": [],
+        "dietaryInfo": [],
+        "nutrition": {"calories": rng.randint(250, 650), "protein": float(rng.randint(10, 40))}
+    }
+
+def build_blog(rng: random.Random, topic: str = "Meal Prep", words: int = 1000) -> dict:
+    """A schema-valid BlogContent of roughly `words` words"""
+    paragraph = (f"Planning ahead makes {topic.lower()} simple. Cook once, portion carefully "
+                 "and freeze what you will not eat this week. ")
+    sections = [f"## Tip {i + 1}\n\n{paragraph * 3}" for i in range(max(1, words // 75))]
+    return {
+        "title": f"{rng.randint(5, 12)} Ideas for {topic}",
+        "content": f"# {topic}\n\n" + "\n\n".join(sections),
+        "excerpt": paragraph[:150].strip(),
+        "estimated_reading_time": max(1, words // 200)
+    }
+
+def build_suggestions(rng: random.Random, query: str = "dinner ideas", count: int = 5) -> dict:
+    """A schema-valid SuggestionResponse with `count` suggestions"""
+    return {
+        "suggestions": [
+            {
+                "title": title,
+                "description": f"A make-ahead take on {title.lower()}",
+                "estimated_time": rng.randint(20, 120),
+                "difficulty": rng.choice(["easy", "medium", "hard"])
+            }
+            for title in rng.sample(TITLES, min(count, len(TITLES)))
+        ],
+        "query": query
+    }
+
+def _payload(schema: str, prompt: str, rng: random.Random) -> dict:
+    """Response for a response model, shaped by what the prompt asks for"""
+    if schema == "Recipe":
+        season = re.search(r"spring|summer|fall|winter", prompt.lower())
+        servings = re.search(r"Servings: (\d+)", prompt)
+        return build_recipe(rng, season.group() if season else "fall", int(servings.group(1)) if servings else 6)
+    if schema == "BlogContent":
+        topic = re.search(r"blog post about: (.+)", prompt)
+        words = re.search(r"Write a (\d+)-word", prompt)
+        return build_blog(rng, topic.group(1).strip() if topic else "Meal Prep", int(words.group(1)) if words else 1000)
+    if schema == "SuggestionResponse":
+        request = re.search(r"Provide (\d+) recipe suggestions for: (.+)", prompt)
+        return build_suggestions(rng, request.group(2).strip(), int(request.group(1))) if request else build_suggestions(rng)
+    raise KeyError(schema)
+
+class FakeLLMTransport(httpx.AsyncBaseTransport):
+    """
+    OpenAI-compatible chat, embedding and image endpoints served in-process
+
+    Chat responses are schema-valid payloads for the requested response
+    model, in whichever shape instructor asked for (tool call, function
+    call or JSON content), streamed in chunks when stream=true. Latency
+    is drawn per model from FAKE_LLM_LATENCY and errors are injected per
+    status code at FAKE_LLM_ERROR_RATES, so retries, failover, hedging
+    and the p95 router all see realistic behaviour without a provider.
+    """
+
+    STREAM_CHUNKS = 20
+
+    def __init__(
+        self,
+        latency: Dict[str, Dict[str, Any]],
+        error_rates: Dict[int, float],
+        seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.error_rates = error_rates
+        self.rng = random.Random(seed)
+
+    def delay(self, model: str) -> float:
+        """Seconds one call to model takes, drawn from its latency distribution"""
+        model = model.rsplit("/", 1)[-1]
+        matches = [name for name in self.latency if model.startswith(name)]
+        spec = self.latency[max(matches, key=len)] if matches else self.latency.get("default", {})
+
+        distribution = spec.get("distribution", "fixed")
+        if distribution == "fixed":
+            return spec.get("seconds", 0.0)
+        if distribution == "uniform":
+            return self.rng.uniform(spec["low"], spec["high"])
+        if distribution == "exponential":
+            return self.rng.expovariate(1 / spec["mean"])
+        if distribution == "lognormal":
+            # Parameterised by median and p95 (z = 1.645)
+            mu = math.log(spec["median"])
+            return self.rng.lognormvariate(mu, (math.log(spec["p95"]) - mu) / 1.645)
+        raise ValueError(f"Unknown latency distribution: {distribution}")
+
+    def _error(self) -> Optional[int]:
+        draw = self.rng.random()
+        for status, rate in self.error_rates.items():
+            if draw < rate:
+                return int(status)
+            draw -= rate
+        return None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        handlers: Dict[str, Callable] = {
+            "/chat/completions": self._chat,
+            "/embeddings": self._embeddings,
+            "/images/generations": self._image
+        }
+        handler = next((h for suffix, h in handlers.items() if path.endswith(suffix)), None)
+        if handler is None:
+            return self._fail(404, f"Fake backend does not serve {path}")
+
+        await request.aread()
+        body = json.loads(request.content or b"{}")
+        status = self._error()
+        if status == 429:
+            return self._fail(429, "Rate limit reached (injected)", {"retry-after-ms": "50"})
+        delay = self.delay(body.get("model", "default"))
+        if status is not None:
+            await asyncio.sleep(delay)
+            return self._fail(status, "Server error (injected)")
+        return await handler(body, delay)
+
+    @staticmethod
+    def _fail(status: int, message: str, headers: Optional[dict] = None) -> httpx.Response:
+        return httpx.Response(status, json={"error": {"message": message, "type": "fake_error"}}, headers=headers)
+
+    async def _chat(self, body: dict, delay: float) -> httpx.Response:
+        if body.get("tools"):
+            function = body["tools"][0]["function"]
+        elif body.get("functions"):
+            function = body["functions"][0]
+        else:
+            format_ = (body.get("response_format") or {}).get("json_schema") or {}
+            function = {"name": format_.get("name", "")}
+        schema = function["name"].removeprefix("Partial")
+
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        try:
+            arguments = json.dumps(_payload(schema, prompt, random.Random(self.rng.random())))
+        except KeyError:
+            return self._fail(400, f"Fake backend has no payload for {function['name']!r}")
+
+        usage = {"prompt_tokens": max(1, len(prompt) // 4), "completion_tokens": max(1, len(arguments) // 4)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion = {"id": f"chatcmpl-{uuid.uuid4().hex}", "created": int(time.time()), "model": body.get("model")}
+
+        if body.get("stream"):
+            return httpx.Response(
+                200,
+                headers={"content-type": "text/event-stream"},
+                content=self._stream(completion, body, function["name"], arguments, delay)
+            )
+
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={
+            **completion,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": self._message(body, function["name"], arguments)}],
+            "usage": usage
+        })
+
+    @staticmethod
+    def _message(body: dict, name: str, arguments: str, first: bool = True) -> dict:
+        """Assistant message (or delta) carrying arguments the way the request asked"""
+        if body.get("tools"):
+            call = {"index": 0, "function": {"arguments": arguments}}
+            if first:
+                call.update(id=f"call_{uuid.uuid4().hex[:24]}", type="function")
+                call["function"]["name"] = name
+            return {"role": "assistant", "content": None, "tool_calls": [call]}
+        if body.get("functions"):
+            return {"role": "assistant", "content": None,
+                    "function_call": {"name": name, "arguments": arguments} if first else {"arguments": arguments}}
+        return {"role": "assistant", "content": arguments}
+
+    async def _stream(self, completion: dict, body: dict, name: str, arguments: str, delay: float) -> AsyncIterator[bytes]:
+        """SSE chunks: first token at half the delay, the rest spread over the other half"""
+        size = max(1, math.ceil(len(arguments) / self.STREAM_CHUNKS))
+        pieces = [arguments[i:i + size] for i in range(0, len(arguments), size)]
+        await asyncio.sleep(delay / 2)
+        for i, piece in enumerate(pieces):
+            chunk = {**completion, "object": "chat.completion.chunk", "choices": [
+                {"index": 0, "finish_reason": None, "delta": self._message(body, name, piece, first=i == 0)}
+            ]}
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+            await asyncio.sleep(delay / 2 / len(pieces))
+        done = {**completion, "object": "chat.completion.chunk", "choices": [{"index": 0, "finish_reason": "stop", "delta": {}}]}
+        yield f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode()
+
+    async def _embeddings(self, body: dict, delay: float) -> httpx.Response:
+        # Same text, same vector: the semantic cache behaves as it would upstream for exact repeats
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = []
+        for i, text in enumerate(inputs):
+            seed = int.from_bytes(hashlib.sha256(str(text).encode()).digest()[:8], "big")
+            vector = np.random.default_rng(seed).standard_normal(body.get("dimensions") or 1536)
+            data.append({"object": "embedding", "index": i, "embedding": (vector / np.linalg.norm(vector)).tolist()})
+        tokens = sum(max(1, len(str(text)) // 4) for text in inputs)
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={
+            "object": "list", "data": data, "model": body.get("model"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}
+        })
+
+    async def _image(self, body: dict, delay: float) -> httpx.Response:
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json={"created": int(time.time()), "data": [
+            {"url": f"https://images.invalid/{uuid.uuid4().hex}.png", "revised_prompt": body.get("prompt")}
+        ]})
+
+def _fake() -> FakeLLMTransport:
+    return FakeLLMTransport(settings.FAKE_LLM_LATENCY, settings.FAKE_LLM_ERROR_RATES, settings.FAKE_LLM_SEED)
+
+# LLM_BACKEND -> factory for the transport under the upstream clients (None: the network)
+BACKENDS: Dict[str, Callable[[], Optional[httpx.AsyncBaseTransport]]] = {
+    "provider": lambda: None,
+    "fake": _fake
+}
+
+def transport() -> Optional[httpx.AsyncBaseTransport]:
+    """Transport for a new upstream client pool, per LLM_BACKEND"""
+    if settings.LLM_BACKEND not in BACKENDS:
+        raise ValueError(f"Unknown LLM_BACKEND {settings.LLM_BACKEND!r}; expected one of {sorted(BACKENDS)}")
+    return BACKENDS[settings.LLM_BACKEND]()
@@ -0,0 +1,175 @@
+"""Per-request model and provider selection from price and observed latency"""
+from collections import defaultdict, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from prometheus_client import Counter
+from typing import Optional
+
+from app.core.config import settings
+from app.services.http_clients import http_clients
+
+ROUTED_REQUESTS = Counter(
+    "ai_routed_requests_total",
+    "Chat requests by the route that served them",
+    ["endpoint", "provider", "model", "kind"]
+)
+
+# Fewer completed samples than this and a route's p95 is treated as unknown
+MIN_SAMPLES = 5
+
+def censored_quantile(samples, q: float) -> float:
+    """
+    q-quantile of (seconds, completed) samples, some of which are only lower
+    bounds (calls cancelled after `seconds`): Kaplan-Meier, so a call hedged
+    away or abandoned counts as "at least this slow" rather than being
+    dropped or taken as its real duration
+    """
+    # At equal times completions come first: a cancelled call outlived them
+    ordered = sorted(samples, key=lambda sample: (sample[0], not sample[1]))
+    at_risk, survival = len(ordered), 1.0
+    for seconds, completed in ordered:
+        if completed:
+            survival *= 1 - 1 / at_risk
+            if survival <= 1 - q + 1e-9:
+                return seconds
+        at_risk -= 1
+    # Too few completions to reach q: the slowest time seen is a lower bound
+    return ordered[-1][0]
+
+@dataclass(frozen=True)
+class Route:
+    """Where one request was served: provider, model and why (primary/hedge/failover/cache)"""
+    provider: str
+    model: str
+    kind: str = "primary"
+
+    def __str__(self) -> str:
+        return f"{self.provider}:{self.model} ({self.kind})"
+
+# Route that served the latest generation in the current request context
+served_route: ContextVar[Optional[Route]] = ContextVar("served_route", default=None)
+
+def served_model() -> str:
+    route = served_route.get()
+    return route.model if route else settings.OPENAI_MODEL
+
+class ModelRouter:
+    """
+    Picks a model for each call from MODEL_ROUTES: the cheapest candidate
+    whose observed p95 fits the endpoint's latency budget, or the fastest
+    one if none does. Also chooses hedge targets (the fastest known backup,
+    only when it beats the primary's hedge delay) and the provider
+    failover order. Latencies are kept per (provider, model); cancelled
+    calls are kept as censored samples.
+    """
+
+    def __init__(self):
+        self._latencies = defaultdict(lambda: deque(maxlen=settings.ROUTING_LATENCY_WINDOW))
+        self.served = defaultdict(int)
+        self.failures = defaultdict(int)
+
+    @staticmethod
+    def candidates(endpoint: str, model: Optional[str] = None) -> list:
+        """Models acceptable for endpoint (an explicit model is the only one)"""
+        if model:
+            return [model]
+        return settings.MODEL_ROUTES.get(endpoint) or [settings.OPENAI_MODEL]
+
+    @staticmethod
+    def providers() -> list:
+        """Configured provider first, then the other one if it has a key"""
+        primary = http_clients.provider
+        other = "openai" if primary == "openrouter" else "openrouter"
+        available = settings.OPENAI_API_KEY if other == "openai" else settings.OPENROUTER_API_KEY
+        if settings.ENABLE_PROVIDER_FAILOVER and available:
+            return [primary, other]
+        return [primary]
+
+    @staticmethod
+    def provider_model(route: Route) -> str:
+        """Model id as the route's provider names it"""
+        if route.provider == "openrouter" and "/" not in route.model:
+            return f"{settings.OPENROUTER_MODEL_PREFIX}{route.model}"
+        return route.model
+
+    @staticmethod
+    def prices(model: str) -> dict:
+        """Per-1M-token prices; longest configured prefix, else OPENAI_MODEL's"""
+        matches = [name for name in settings.MODEL_PRICES if model.startswith(name)]
+        if not matches:
+            return settings.MODEL_PRICES.get(settings.OPENAI_MODEL, {"input": 0.0, "output": 0.0})
+        return settings.MODEL_PRICES[max(matches, key=len)]
+
+    def p95(self, provider: str, model: str) -> Optional[float]:
+        samples = self._latencies[(provider, model)]
+        if sum(completed for _, completed in samples) < MIN_SAMPLES:
+            return None
+        return float(censored_quantile(samples, 0.95))
+
+    def route(self, endpoint: str, candidates: list) -> Route:
+        provider = self.providers()[0]
+        budget = settings.LATENCY_BUDGETS.get(endpoint, settings.ROUTING_LATENCY_BUDGET)
+        p95s = {model: self.p95(provider, model) for model in candidates}
+
+        within = [m for m in candidates if p95s[m] is None or p95s[m] <= budget]
+        if within:
+            return Route(provider, min(within, key=lambda m: sum(self.prices(m).values())))
+        return Route(provider, min(candidates, key=lambda m: p95s[m]))
+
+    def hedge(self, primary: Route, candidates: list) -> Optional[Route]:
+        """
+        Backup for a slow primary: the fastest other model, or the same model
+        on the other provider, whose known p95 is below the primary's hedge
+        delay; None when no backup would be expected to finish sooner
+        """
+        backups = [Route(primary.provider, m, "hedge") for m in candidates if m != primary.model]
+        backups += [Route(p, primary.model, "hedge") for p in self.providers() if p != primary.provider]
+        p95s = {route: self.p95(route.provider, route.model) for route in backups}
+        delay = self.hedge_delay(primary)
+        faster = [route for route in backups if p95s[route] is not None and p95s[route] < delay]
+        return min(faster, key=p95s.get) if faster else None
+
+    def hedge_delay(self, route: Route) -> float:
+        p95 = self.p95(route.provider, route.model)
+        return max(settings.HEDGE_MIN_DELAY, p95 if p95 is not None else settings.HEDGE_DEFAULT_DELAY)
+
+    def failover(self, route: Route) -> list:
+        """route, then the same model on the remaining providers"""
+        return [route] + [
+            replace(route, provider=provider, kind="failover")
+            for provider in self.providers() if provider != route.provider
+        ]
+
+    def observe(self, route: Route, seconds: float, ok: bool, cancelled: bool = False):
+        """
+        One call's latency; a cancelled call (hedged away, client gone) is a
+        censored sample: it would have taken at least `seconds`
+        """
+        if cancelled:
+            self._latencies[(route.provider, route.model)].append((seconds, False))
+        elif ok:
+            self._latencies[(route.provider, route.model)].append((seconds, True))
+        else:
+            self.failures[(route.provider, route.model)] += 1
+
+    def record(self, endpoint: str, route: Route):
+        """Count the route that served a request"""
+        self.served[(endpoint, route.provider, route.model, route.kind)] += 1
+        ROUTED_REQUESTS.labels(endpoint, route.provider, route.model, route.kind).inc()
+
+    def stats(self) -> dict:
+        routes = set(self._latencies) | set(self.failures)
+        return {
+            "latency_p95": {
+                f"{provider}:{model}": round(p95, 3) if (p95 := self.p95(provider, model)) is not None else None
+                for provider, model in sorted(routes)
+            },
+            "failures": {f"{p}:{m}": n for (p, m), n in self.failures.items()},
+            "served": {
+                f"{endpoint} {provider}:{model} ({kind})": n
+                for (endpoint, provider, model, kind), n in sorted(self.served.items())
+            }
+        }
+
+# Singleton
+model_router = ModelRouter()
@@ -1,38 +1,76 @@
 """OpenAI service with cost tracking and type safety"""
 import instructor
-from openai import AsyncOpenAI
+import openai
 from loguru import logger
+from prometheus_client import Histogram
 import time
-from typing import Type, TypeVar, Optional
+from typing import AsyncIterator, Type, TypeVar, Optional
 import asyncio
-from functools import wraps
+import json
+import numpy as np
 
 from app.core.config import settings
+from app.core.metrics import track_upstream
 from app.services.cost_tracker import cost_tracker
-from app.services.cache_service import cache_service
+from app.services.http_clients import http_clients
+from app.services.model_router import Route, model_router, served_route
+from app.services.prompt_cache import prompt_cache
+from app.services.rate_limiter import rate_limiter
+from app.services.single_flight import single_flight
 
 T = TypeVar('T')
 
+SEMAPHORE_WAIT = Histogram(
+    "ai_semaphore_wait_seconds",
+    "Time calls queue for a MAX_CONCURRENT_REQUESTS slot",
+    ["endpoint"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+# Errors worth retrying on the other provider
+FAILOVER_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError
+)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for responses without usage data"""
+    return max(1, len(text) // 4)
+
 class OpenAIService:
     """Centralized OpenAI service with automatic cost tracking"""
     
     def __init__(self):
         """Initialize OpenAI client with instructor for type safety"""
-        if settings.USE_OPENROUTER and settings.OPENROUTER_API_KEY:
-            self.client = instructor.patch(
-                AsyncOpenAI(
-                    api_key=settings.OPENROUTER_API_KEY,
-                    base_url="https://openrouter.ai/api/v1"
-                )
-            )
-            logger.info("Using OpenRouter API")
-        else:
-            self.client = instructor.patch(
-                AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-            )
-            logger.info("Using OpenAI API")
+        # instructor-patched clients per provider, on http_clients' pools
+        self._clients = {}
+        logger.info(f"Using {'OpenRouter' if http_clients.provider == 'openrouter' else 'OpenAI'} API")
         
-        self.semaphore = asyncio.Semaphore(settings.RATE_LIMIT_REQUESTS)
+        # Caps calls in flight; the request/token budget is rate_limiter's
+        self.semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_REQUESTS)
+    
+    def _client(self, provider: Optional[str] = None):
+        """instructor-patched client for provider (defaults to the configured one)"""
+        provider = provider or http_clients.provider
+        client = self._clients.get(provider)
+        if client is None:
+            client = self._clients[provider] = instructor.patch(http_clients.get(provider))
+        return client
+    
+    @property
+    def client(self):
+        return self._client()
+    
+    @property
+    def raw_client(self):
+        """Pooled client shared with image calls (un-patched there)"""
+        return http_clients.get()
+    
+    def close(self):
+        """Drop the clients once http_clients has closed their pools; later calls get new ones"""
+        self._clients.clear()
     
     async def generate_structured_response(
         self,
@@ -42,7 +80,8 @@ class OpenAIService:
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
         endpoint: str = "unknown",
-        cache_key: Optional[str] = None
+        use_cache: bool = True,
+        semantic_query: Optional[str] = None
     ) -> tuple[T, float]:
         """
         Generate structured response with automatic cost tracking
@@ -50,48 +89,107 @@ class OpenAIService:
         Args:
             response_model: Pydantic model for response validation
             messages: List of chat messages
-            model: Model to use (defaults to settings.OPENAI_MODEL)
+            model: Model to use (defaults to the endpoint's MODEL_ROUTES)
             temperature: Temperature setting
             max_tokens: Max tokens to generate
             endpoint: Endpoint name for tracking
-            cache_key: Optional cache key
+            use_cache: Serve/store through the prompt cache
+            semantic_query: Free-text part of the prompt; near-duplicates
+                of it (same prompt otherwise) may be served from cache
             
         Returns:
             Tuple of (response_object, cost_in_usd)
         """
+        candidates = model_router.candidates(endpoint, model)
+        temperature = temperature or settings.OPENAI_TEMPERATURE
+        max_tokens = max_tokens or settings.OPENAI_MAX_TOKENS
+        
+        # Keyed on the candidate set: a response from any routed model will do
+        cache_model = "|".join(candidates)
+        
         # Check cache first
-        if cache_key and settings.ENABLE_CACHING:
-            cached = await cache_service.get(cache_key)
+        cache_key = similar = None
+        if use_cache and settings.ENABLE_CACHING:
+            cache_key = prompt_cache.key(cache_model, messages, response_model, temperature=temperature, max_tokens=max_tokens)
+            cached, similar = await self._cached(
+                endpoint, cache_key, semantic_query,
+                cache_model, messages, response_model, temperature=temperature, max_tokens=max_tokens
+            )
             if cached:
-                logger.info(f"Cache hit for {cache_key}")
-                return cached, 0.0
+                served_route.set(Route("cache", candidates[0], "cache"))
+                return cached[0], 0.0
         
-        # Rate limiting
-        async with self.semaphore:
-            start_time = time.time()
-            
-            try:
-                # Call OpenAI with type-safe response
-                response = await self.client.chat.completions.create(
-                    model=model or settings.OPENAI_MODEL,
+        # Identical requests already in flight share that one upstream call
+        if cache_key and settings.ENABLE_SINGLE_FLIGHT:
+            (response, cost, route), shared = await single_flight.run(
+                cache_key,
+                lambda: self._complete(
+                    response_model, messages, candidates, temperature, max_tokens, endpoint, cache_key, similar
+                ),
+                endpoint=endpoint,
+                poll=lambda: self._poll(cache_key, candidates)
+            )
+            if shared:
+                cost = 0.0
+        else:
+            response, cost, route = await self._complete(
+                response_model, messages, candidates, temperature, max_tokens, endpoint, cache_key, similar
+            )
+        
+        served_route.set(route)
+        return response, cost
+    
+    @staticmethod
+    async def _poll(cache_key: str, candidates: list) -> Optional[tuple]:
+        """Result another replica cached meanwhile, shaped like _complete's"""
+        cached = await prompt_cache.get(cache_key)
+        return (*cached, Route("cache", candidates[0], "cache")) if cached else None
+    
+    async def _complete(
+        self,
+        response_model: Type[T],
+        messages: list,
+        candidates: list,
+        temperature: float,
+        max_tokens: int,
+        endpoint: str,
+        cache_key: Optional[str],
+        similar: Optional[tuple[str, np.ndarray]]
+    ) -> tuple[T, float, Route]:
+        """The upstream call behind generate_structured_response (cache miss)"""
+        # Rate limiting: reserve the worst case, settle with the real usage
+        prompt_tokens = estimate_tokens(json.dumps(messages))
+        reserved = await rate_limiter.acquire(prompt_tokens + max_tokens)
+        used = prompt_tokens  # unless a response says otherwise
+        queued = time.perf_counter()
+        try:
+            async with self.semaphore:
+                SEMAPHORE_WAIT.labels(endpoint).observe(time.perf_counter() - queued)
+                start_time = time.time()
+                
+                # Call the routed model with type-safe response
+                response, route = await self._routed(
+                    endpoint,
+                    candidates,
+                    reserved,
+                    prompt_tokens,
                     messages=messages,
                     response_model=response_model,
-                    temperature=temperature or settings.OPENAI_TEMPERATURE,
-                    max_tokens=max_tokens or settings.OPENAI_MAX_TOKENS,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
                 )
+                used = response._raw_response.usage.total_tokens
                 
                 generation_time = time.time() - start_time
                 
-                # Track cost (using litellm for accurate pricing)
-                cost = await self._calculate_cost(
-                    model or settings.OPENAI_MODEL,
-                    response._raw_response
-                )
+                # Track cost
+                cost = await self._calculate_cost(route.model, response._raw_response)
+                model_router.record(endpoint, route)
                 
                 # Log metrics
                 await cost_tracker.track_request(
                     endpoint=endpoint,
-                    model=model or settings.OPENAI_MODEL,
+                    model=route.model,
                     input_tokens=response._raw_response.usage.prompt_tokens,
                     output_tokens=response._raw_response.usage.completion_tokens,
                     cost=cost,
@@ -99,52 +197,285 @@ class OpenAIService:
                 )
                 
                 logger.info(
-                    f"Generated {endpoint} response in {generation_time:.2f}s "
+                    f"Generated {endpoint} response via {route} in {generation_time:.2f}s "
                     f"(cost: ${cost:.4f}, tokens: {response._raw_response.usage.total_tokens})"
                 )
                 
                 # Cache result
-                if cache_key and settings.ENABLE_CACHING:
-                    await cache_service.set(cache_key, response, ttl=settings.CACHE_TTL)
+                if cache_key:
+                    await prompt_cache.set(endpoint, cache_key, response, cost, similar)
                 
-                return response, cost
+                return response, cost, route
                 
-            except Exception as e:
-                logger.error(f"OpenAI API error: {e}")
-                raise
+        except Exception as e:
+            logger.error(f"OpenAI API error: {e}")
+            raise
+        finally:
+            # Failed or cancelled calls keep only the prompt estimate
+            await rate_limiter.settle(reserved, used)
     
-    async def _calculate_cost(self, model: str, response) -> float:
-        """Calculate cost based on model and token usage"""
-        input_tokens = response.usage.prompt_tokens
-        output_tokens = response.usage.completion_tokens
-        
-        # Get pricing based on model
-        if "gpt-4o-mini" in model:
-            input_price = settings.GPT4O_MINI_INPUT_PRICE
-            output_price = settings.GPT4O_MINI_OUTPUT_PRICE
-        elif "gpt-4o" in model:
-            input_price = settings.GPT4O_INPUT_PRICE
-            output_price = settings.GPT4O_OUTPUT_PRICE
-        elif "gpt-4" in model:
-            input_price = settings.GPT4_INPUT_PRICE
-            output_price = settings.GPT4_OUTPUT_PRICE
-        else:
-            # Default to GPT-4o pricing
-            input_price = settings.GPT4O_INPUT_PRICE
-            output_price = settings.GPT4O_OUTPUT_PRICE
+    async def _routed(
+        self,
+        endpoint: str,
+        candidates: list,
+        reserved: int,
+        prompt_tokens: int,
+        **kwargs
+    ) -> tuple[object, Route]:
+        """
+        Call the routed model, hedging with a backup route when it is slow
+        
+        The backup starts once the primary has run past its route's p95
+        (ENABLE_HEDGING), if a route is known to answer faster than that
+        (model_router.hedge); the first successful response wins and the other
+        call is cancelled. The backup takes its own rate-limit reservation,
+        settled to the prompt estimate however it ends: the winner's usage
+        settles the primary's reservation, and the loser (either one) may
+        still have been billed for its prompt.
+        """
+        primary = model_router.route(endpoint, candidates)
+        backup = model_router.hedge(primary, candidates) if settings.ENABLE_HEDGING else None
+        
+        calls = {asyncio.create_task(self._with_failover(primary, "chat", **kwargs))}
+        try:
+            if backup is not None:
+                done, _ = await asyncio.wait(calls, timeout=model_router.hedge_delay(primary))
+                if not done:
+                    logger.info(f"Hedging slow {primary} with {backup}")
+                    calls.add(asyncio.create_task(self._hedge(backup, reserved, prompt_tokens, **kwargs)))
+            
+            error = None
+            while calls:
+                done, calls = await asyncio.wait(calls, return_when=asyncio.FIRST_COMPLETED)
+                for call in done:
+                    if call.exception() is None:
+                        return call.result()
+                    error = call.exception()
+            raise error
+        finally:
+            for call in calls:
+                call.cancel()
+    
+    async def _hedge(self, route: Route, reserved: int, prompt_tokens: int, **kwargs) -> tuple[object, Route]:
+        await rate_limiter.acquire(reserved)
+        try:
+            return await self._with_failover(route, "chat", **kwargs)
+        finally:
+            await rate_limiter.settle(reserved, prompt_tokens)
+    
+    async def _with_failover(self, route: Route, operation: str, **kwargs) -> tuple[object, Route]:
+        """Call route; on 429/5xx/connection errors retry the same model on the other provider"""
+        attempts = model_router.failover(route)
+        for i, attempt in enumerate(attempts):
+            try:
+                return await self._create(attempt, operation, **kwargs), attempt
+            except FAILOVER_ERRORS as e:
+                if i == len(attempts) - 1:
+                    raise
+                logger.warning(f"{attempt} failed ({type(e).__name__}); failing over to {attempts[i + 1]}")
+    
+    async def _create(self, route: Route, operation: str, **kwargs):
+        """One chat completion on route's provider, timed into the router's p95"""
+        client = self._client(route.provider)
+        
+        start = time.perf_counter()
+        try:
+            with track_upstream(route.provider, operation):
+                response = await client.chat.completions.create(
+                    model=model_router.provider_model(route), **kwargs
+                )
+        except asyncio.CancelledError:
+            # Hedged away or abandoned: only a lower bound on its latency
+            model_router.observe(route, time.perf_counter() - start, ok=False, cancelled=True)
+            raise
+        except Exception:
+            model_router.observe(route, time.perf_counter() - start, ok=False)
+            raise
+        
+        # Streams return at the first byte, which says nothing about full completions
+        if operation == "chat":
+            model_router.observe(route, time.perf_counter() - start, ok=True)
+        return response
+    
+    async def _cached(
+        self,
+        endpoint: str,
+        cache_key: str,
+        semantic_query: Optional[str],
+        model: str,
+        messages: list,
+        response_model,
+        **params
+    ) -> tuple[Optional[tuple], Optional[tuple[str, np.ndarray]]]:
+        """
+        Exact lookup, then (with semantic_query) a near-duplicate lookup
+        
+        Returns:
+            Tuple of (cached (response, cost) or None, (scope, query_embedding)
+            to index the fresh response under, or None)
+        """
+        cached = await prompt_cache.get(cache_key)
+        if cached is not None or not semantic_query or not settings.ENABLE_SEMANTIC_CACHE:
+            prompt_cache.record(endpoint, cached)
+            return cached, None
+        
+        vector = await self._embed(semantic_query)
+        if vector is None:
+            prompt_cache.record(endpoint, None)
+            return None, None
+        
+        scope = prompt_cache.scope(semantic_query, model, messages, response_model, **params)
+        cached = await prompt_cache.get_similar(scope, vector)
+        prompt_cache.record(endpoint, cached, semantic=True)
+        return cached, (scope, vector)
+    
+    async def _embed(self, text: str) -> Optional[np.ndarray]:
+        """Unit-length query embedding for near-duplicate cache lookups (None on failure)"""
+        try:
+            await rate_limiter.acquire(estimate_tokens(text))
+            with track_upstream("openai", "embeddings"):
+                response = await self.client.embeddings.create(
+                    model=settings.EMBEDDING_MODEL,
+                    input=text,
+                    dimensions=settings.EMBEDDING_DIMENSIONS
+                )
+            tokens = response.usage.total_tokens
+            await cost_tracker.track_request(
+                endpoint="cache_embedding",
+                model=settings.EMBEDDING_MODEL,
+                input_tokens=tokens,
+                output_tokens=0,
+                cost=(tokens / 1_000_000) * settings.EMBEDDING_PRICE,
+                duration=0
+            )
+            vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+            return vector / (np.linalg.norm(vector) or 1.0)
+        except Exception as e:
+            logger.warning(f"Query embedding failed, exact cache only: {e}")
+            return None
+    
+    async def stream_structured_response(
+        self,
+        response_model: Type[T],
+        messages: list,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        endpoint: str = "unknown",
+        use_cache: bool = True
+    ) -> AsyncIterator[tuple[object, Optional[float]]]:
+        """
+        Stream a structured response as it is generated
         
-        # Calculate cost (price is per 1M tokens)
-        input_cost = (input_tokens / 1_000_000) * input_price
-        output_cost = (output_tokens / 1_000_000) * output_price
+        Uses instructor's Partial model: every chunk is re-parsed into a
+        partially populated response_model (all fields optional).
         
-        return input_cost + output_cost
+        Yields:
+            (partial_object, None) for each update, then exactly one
+            (response_object, cost_in_usd) once the complete response
+            has been validated against response_model
+        """
+        candidates = model_router.candidates(endpoint, model)
+        temperature = temperature or settings.OPENAI_TEMPERATURE
+        max_tokens = max_tokens or settings.OPENAI_MAX_TOKENS
+        
+        # Same key as generate_structured_response: both share entries
+        cache_key = None
+        if use_cache and settings.ENABLE_CACHING:
+            cache_key = prompt_cache.key(
+                "|".join(candidates), messages, response_model, temperature=temperature, max_tokens=max_tokens
+            )
+            cached = await prompt_cache.get(cache_key)
+            prompt_cache.record(endpoint, cached)
+            if cached:
+                served_route.set(Route("cache", candidates[0], "cache"))
+                yield cached[0], 0.0
+                return
+        
+        input_tokens = estimate_tokens(json.dumps(messages))
+        reserved = await rate_limiter.acquire(input_tokens + max_tokens)
+        last = None
+        
+        queued = time.perf_counter()
+        try:
+            async with self.semaphore:
+                SEMAPHORE_WAIT.labels(endpoint).observe(time.perf_counter() - queued)
+                start_time = time.time()
+                
+                # No hedging once tokens flow to the client; failover before the first one
+                stream, route = await self._with_failover(
+                    model_router.route(endpoint, candidates),
+                    "chat_stream",
+                    messages=messages,
+                    response_model=instructor.Partial[response_model],
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    # The finished object is validated from parsed JSON, where strict
+                    # mode rejects enum values such as "winter"; validate it laxly
+                    strict=False,
+                )
+                
+                async for partial in stream:
+                    last = partial
+                    yield partial, None
+                
+                if last is None:
+                    raise ValueError("Empty response stream")
+                
+                # Partials are lenient; the final object must pass full validation
+                response = response_model.model_validate(last.model_dump(exclude_none=True))
+                generation_time = time.time() - start_time
+                
+                # Streamed responses carry no usage block: estimate from the text
+                output_tokens = estimate_tokens(response.model_dump_json())
+                cost = self._price(route.model, input_tokens, output_tokens)
+                model_router.record(endpoint, route)
+                served_route.set(route)
+                
+                await cost_tracker.track_request(
+                    endpoint=endpoint,
+                    model=route.model,
+                    input_tokens=input_tokens,
+                    output_tokens=output_tokens,
+                    cost=cost,
+                    duration=generation_time
+                )
+                
+                logger.info(
+                    f"Streamed {endpoint} response via {route} in {generation_time:.2f}s "
+                    f"(estimated cost: ${cost:.4f})"
+                )
+                
+                if cache_key:
+                    await prompt_cache.set(endpoint, cache_key, response, cost)
+                
+                yield response, cost
+                
+        except Exception as e:
+            logger.error(f"OpenAI streaming error: {e}")
+            raise
+        finally:
+            # Also when the client abandons the stream: charge what was generated
+            await rate_limiter.settle(
+                reserved, input_tokens + (estimate_tokens(last.model_dump_json(exclude_none=True)) if last is not None else 0)
+            )
+    
+    async def _calculate_cost(self, model: str, response) -> float:
+        """Calculate cost based on model and token usage"""
+        return self._price(model, response.usage.prompt_tokens, response.usage.completion_tokens)
+    
+    def _price(self, model: str, input_tokens: int, output_tokens: int) -> float:
+        """Cost in USD of a token count for a model (MODEL_PRICES is per 1M tokens)"""
+        prices = model_router.prices(model)
+        return (input_tokens / 1_000_000) * prices["input"] + (output_tokens / 1_000_000) * prices["output"]
     
     async def generate_image(
         self,
         prompt: str,
         size: str = "1024x1024",
         quality: str = "standard",
-        cache_key: Optional[str] = None
+        use_cache: bool = True
     ) -> tuple[str, str, float]:
         """
         Generate image with DALL-E
@@ -153,22 +484,49 @@ class OpenAIService:
             Tuple of (image_url, revised_prompt, cost)
         """
         # Check cache
-        if cache_key and settings.ENABLE_CACHING:
-            cached = await cache_service.get(cache_key)
+        cache_key = None
+        if use_cache and settings.ENABLE_CACHING:
+            cache_key = prompt_cache.key(
+                "dall-e-3", [{"role": "user", "content": prompt}], size=size, quality=quality
+            )
+            cached = await prompt_cache.get(cache_key)
+            prompt_cache.record("image_generation", cached)
             if cached:
-                return cached[0], cached[1], 0.0
+                url, revised_prompt = cached[0]
+                return url, revised_prompt, 0.0
+        
+        if cache_key and settings.ENABLE_SINGLE_FLIGHT:
+            (image, cost), shared = await single_flight.run(
+                cache_key,
+                lambda: self._generate_image(prompt, size, quality, cache_key),
+                endpoint="image_generation",
+                poll=lambda: prompt_cache.get(cache_key)
+            )
+            return image[0], image[1], (0.0 if shared else cost)
         
+        (url, revised_prompt), cost = await self._generate_image(prompt, size, quality, cache_key)
+        return url, revised_prompt, cost
+    
+    async def _generate_image(
+        self,
+        prompt: str,
+        size: str,
+        quality: str,
+        cache_key: Optional[str]
+    ) -> tuple[tuple[str, str], float]:
+        """The DALL-E call behind generate_image, shaped like a cache entry"""
         try:
-            # Use raw OpenAI client (not instructor-patched) for images
-            raw_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+            await rate_limiter.acquire()
             
-            response = await raw_client.images.generate(
-                model="dall-e-3",
-                prompt=prompt,
-                size=size,
-                quality=quality,
-                n=1
-            )
+            # Raw client (not instructor-patched) for images
+            with track_upstream("openai", "images"):
+                response = await self.raw_client.images.generate(
+                    model="dall-e-3",
+                    prompt=prompt,
+                    size=size,
+                    quality=quality,
+                    n=1
+                )
             
             url = response.data[0].url
             revised_prompt = response.data[0].revised_prompt or prompt
@@ -185,16 +543,12 @@ class OpenAIService:
             )
             
             # Cache result
-            if cache_key and settings.ENABLE_CACHING:
-                await cache_service.set(
-                    cache_key,
-                    (url, revised_prompt, cost),
-                    ttl=settings.CACHE_TTL
-                )
+            if cache_key:
+                await prompt_cache.set("image_generation", cache_key, (url, revised_prompt), cost)
             
             logger.info(f"Generated image (cost: ${cost:.4f})")
             
-            return url, revised_prompt, cost
+            return (url, revised_prompt), cost
             
         except Exception as e:
             logger.error(f"Image generation error: {e}")
@@ -0,0 +1,159 @@
+"""Cache of AI responses keyed by a canonical hash of the full request"""
+from collections import defaultdict
+from functools import lru_cache
+from loguru import logger
+from typing import Any, Optional
+import hashlib
+import json
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import record_cache
+from app.services.cache_service import cache_service
+
+@lru_cache(maxsize=None)
+def _schema(response_model) -> Any:
+    return response_model.model_json_schema() if response_model is not None else None
+
+def _normalize(messages: list) -> list:
+    """Roles and whitespace-collapsed content; formatting-only prompt edits keep their hits"""
+    return [
+        {"role": m.get("role"), "content": " ".join(str(m.get("content", "")).split())}
+        for m in messages
+    ]
+
+class SemanticIndex:
+    """
+    Ring buffer of recent query embeddings, each tied to the cache key it
+    produced. Only entries from the same scope (same prompt apart from the
+    query, same model/schema/params) can match.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.vectors: Optional[np.ndarray] = None
+        self.scopes: list = [None] * size
+        self.keys: list = [None] * size
+        self._next = 0
+
+    def nearest(self, scope: str, vector: np.ndarray, threshold: float) -> Optional[str]:
+        if self.vectors is None:
+            return None
+        candidates = np.array([s == scope for s in self.scopes])
+        if not candidates.any():
+            return None
+        similarity = np.where(candidates, self.vectors @ vector, -1.0)
+        best = int(np.argmax(similarity))
+        return self.keys[best] if similarity[best] >= threshold else None
+
+    def add(self, scope: str, vector: np.ndarray, key: str):
+        if self.vectors is None:
+            self.vectors = np.zeros((self.size, vector.shape[0]), dtype=np.float32)
+        slot = self._next
+        self.vectors[slot] = vector
+        self.scopes[slot] = scope
+        self.keys[slot] = key
+        self._next = (slot + 1) % self.size
+
+class PromptCache:
+    """
+    Responses are cached under a SHA-256 of everything that determines them:
+    model, normalized messages, response schema and sampling params (not
+    the endpoint, so a streamed and a plain call share entries). Entries store (response, cost) so hits can report the spend
+    they saved. TTLs are per endpoint (CACHE_TTLS, else CACHE_TTL).
+    Near-duplicate lookup (for short free-text queries) matches query
+    embeddings within one scope; that index is per replica.
+    """
+
+    def __init__(self):
+        self.hits = defaultdict(int)
+        self.semantic_hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.saved_cost = defaultdict(float)
+        self.semantic = SemanticIndex(settings.SEMANTIC_CACHE_SIZE)
+
+    @staticmethod
+    def key(
+        model: str,
+        messages: list,
+        response_model=None,
+        **params
+    ) -> str:
+        canonical = json.dumps(
+            {
+                "model": model,
+                "messages": _normalize(messages),
+                "schema": _schema(response_model),
+                "params": params
+            },
+            sort_keys=True,
+            separators=(",", ":"),
+            default=str
+        )
+        return f"ai:prompt:{hashlib.sha256(canonical.encode()).hexdigest()}"
+
+    @classmethod
+    def scope(cls, query: str, model: str, messages: list, response_model=None, **params) -> str:
+        """key() of the request with the free-text query masked out"""
+        masked = [{**m, "content": str(m.get("content", "")).replace(query, "{query}")} for m in messages]
+        return cls.key(model, masked, response_model, **params)
+
+    @staticmethod
+    def ttl(endpoint: str) -> int:
+        return settings.CACHE_TTLS.get(endpoint, settings.CACHE_TTL)
+
+    async def get(self, key: str) -> Optional[tuple[Any, float]]:
+        """Cached (response, original_cost) for an exact key"""
+        return await cache_service.get(key)
+
+    async def get_similar(self, scope: str, vector: np.ndarray) -> Optional[tuple[Any, float]]:
+        """Cached entry of the most similar earlier query in `scope`, if close enough"""
+        key = self.semantic.nearest(scope, vector, settings.SEMANTIC_CACHE_THRESHOLD)
+        return await cache_service.get(key) if key else None
+
+    def record(self, endpoint: str, entry: Optional[tuple[Any, float]], semantic: bool = False):
+        record_cache("prompt", entry is not None)
+        if entry is None:
+            self.misses[endpoint] += 1
+            return
+        if semantic:
+            self.semantic_hits[endpoint] += 1
+        else:
+            self.hits[endpoint] += 1
+        self.saved_cost[endpoint] += entry[1]
+        logger.info(f"Cache hit for {endpoint}{' (similar query)' if semantic else ''}")
+
+    async def set(
+        self,
+        endpoint: str,
+        key: str,
+        response: Any,
+        cost: float,
+        similar: Optional[tuple[str, np.ndarray]] = None
+    ):
+        """Store (response, cost); `similar` = (scope, query embedding) to index it for near-duplicates"""
+        await cache_service.set(key, (response, cost), ttl=self.ttl(endpoint))
+        if similar is not None:
+            self.semantic.add(similar[0], similar[1], key)
+
+    def stats(self) -> dict:
+        endpoints = set(self.hits) | set(self.semantic_hits) | set(self.misses)
+        by_endpoint = {}
+        for endpoint in sorted(endpoints):
+            hits = self.hits[endpoint] + self.semantic_hits[endpoint]
+            lookups = hits + self.misses[endpoint]
+            by_endpoint[endpoint] = {
+                "hits": self.hits[endpoint],
+                "semantic_hits": self.semantic_hits[endpoint],
+                "misses": self.misses[endpoint],
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "saved_cost": round(self.saved_cost[endpoint], 4)
+            }
+        return {
+            "connected": cache_service.redis is not None,
+            "saved_cost": round(sum(self.saved_cost.values()), 4),
+            "by_endpoint": by_endpoint
+        }
+
+# Singleton
+prompt_cache = PromptCache()
@@ -0,0 +1,230 @@
+"""Token-bucket rate limiting for upstream AI API calls"""
+from redis import asyncio as aioredis
+from loguru import logger
+from typing import Optional
+import asyncio
+import re
+import time
+
+from app.core.config import settings
+
+# Prompt size assumed when sizing the default token budget
+PROMPT_TOKEN_ALLOWANCE = 2000
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Seconds in an x-ratelimit-reset-* header ("20ms", "1s", "6m0s")"""
+    if not value:
+        return None
+    parts = _DURATION.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in parts)
+
+def default_tokens_per_minute() -> int:
+    """
+    Token budget that does not bind before the request budget: every
+    request may reserve OPENAI_MAX_TOKENS plus a prompt. Set
+    RATE_LIMIT_TOKENS_PER_MINUTE to this replica's share of the real limit.
+    """
+    requests_per_minute = settings.RATE_LIMIT_REQUESTS * 60 / settings.RATE_LIMIT_WINDOW
+    return int(requests_per_minute * (settings.OPENAI_MAX_TOKENS + PROMPT_TOKEN_ALLOWANCE))
+
+class TokenBucket:
+    """Refills continuously at capacity / window per second, up to capacity"""
+
+    def __init__(self, capacity: float, window: float):
+        self.capacity = capacity
+        self.rate = capacity / window
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)"""
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+# Both buckets in one atomic step: take from both or report the wait (ms)
+_ACQUIRE_SCRIPT = """
+redis.replicate_commands()  -- TIME before writes (no-op on Redis 7)
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + tonumber(now[2]) / 1000
+local wait = 0
+local levels = {}
+for i = 1, 2 do
+    local capacity = tonumber(ARGV[(i - 1) * 3 + 1])
+    local rate = tonumber(ARGV[(i - 1) * 3 + 2])
+    local amount = math.min(tonumber(ARGV[(i - 1) * 3 + 3]), capacity)
+    local state = redis.call('HMGET', KEYS[i], 'level', 'updated')
+    local level = tonumber(state[1]) or capacity
+    local updated = tonumber(state[2]) or now
+    level = math.min(capacity, level + (now - updated) * rate)
+    levels[i] = level
+    if level < amount then
+        wait = math.max(wait, (amount - level) / rate)
+    end
+end
+if wait == 0 then
+    for i = 1, 2 do
+        levels[i] = levels[i] - math.min(tonumber(ARGV[(i - 1) * 3 + 3]), tonumber(ARGV[(i - 1) * 3 + 1]))
+    end
+end
+for i = 1, 2 do
+    redis.call('HSET', KEYS[i], 'level', levels[i], 'updated', now)
+    redis.call('PEXPIRE', KEYS[i], 3600000)
+end
+return tostring(wait)
+"""
+
+class RateLimiter:
+    """
+    Requests-per-window and tokens-per-minute budget for the upstream API
+
+    Callers queue on a FIFO lock, so they are served in arrival order; the
+    head of the queue sleeps until both buckets can cover it. Token costs are
+    reserved up front (prompt estimate + max_tokens) and settled against the
+    real usage afterwards, or the prompt estimate when a call fails, is
+    cancelled or its stream is abandoned. Chat responses from the primary
+    provider clamp the buckets to what it reports left, and a 429 pauses
+    everyone until the advertised reset. In shared mode the buckets live in
+    Redis so every replica draws from one budget.
+    """
+
+    def __init__(self, requests_per_window: int, window: int, tokens_per_minute: int):
+        self.requests = TokenBucket(requests_per_window, window)
+        self.tokens = TokenBucket(tokens_per_minute, 60)
+        self.redis: Optional[aioredis.Redis] = None
+        self._queue = asyncio.Lock()
+        self._paused_until = 0.0
+        self.waits = 0
+        self.waited_seconds = 0.0
+        self.throttled = 0
+
+    async def connect(self):
+        """Connect to Redis for the shared budget; falls back to a local one"""
+        try:
+            self.redis = await aioredis.from_url(
+                f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}",
+                password=settings.REDIS_PASSWORD,
+                decode_responses=True
+            )
+            await self.redis.ping()
+            self._acquire_script = self.redis.register_script(_ACQUIRE_SCRIPT)
+            logger.info("Connected to Redis (shared rate limit)")
+        except Exception as e:
+            logger.warning(f"Redis connection failed: {e}. Using a per-replica rate limit.")
+            self.redis = None
+
+    async def disconnect(self):
+        if self.redis:
+            await self.redis.close()
+            self.redis = None
+
+    async def _wait_time(self, tokens: int) -> float:
+        """Take from both buckets if possible; otherwise the seconds to wait"""
+        if self.redis:
+            try:
+                wait_ms = await self._acquire_script(
+                    keys=["ai:ratelimit:requests", "ai:ratelimit:tokens"],
+                    args=[
+                        self.requests.capacity, self.requests.rate / 1000, 1,
+                        self.tokens.capacity, self.tokens.rate / 1000, tokens
+                    ]
+                )
+                return float(wait_ms) / 1000
+            except Exception as e:
+                logger.error(f"Shared rate limit error: {e}")
+
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+        if wait == 0:
+            self.requests.take(1)
+            self.tokens.take(tokens)
+        return wait
+
+    async def acquire(self, tokens: int = 0) -> int:
+        """Wait for a request slot and `tokens` tokens; returns the reservation"""
+        async with self._queue:
+            started = time.monotonic()
+            while True:
+                pause = self._paused_until - time.monotonic()
+                wait = pause if pause > 0 else await self._wait_time(tokens)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+
+            waited = time.monotonic() - started
+            if waited > 0.001:
+                self.waits += 1
+                self.waited_seconds += waited
+        return tokens
+
+    async def settle(self, reserved: int, used: int):
+        """Return unused reserved tokens (or charge an overrun)"""
+        refund = reserved - used
+        if refund == 0:
+            return
+        if self.redis:
+            try:
+                await self.redis.hincrbyfloat("ai:ratelimit:tokens", "level", refund)
+                return
+            except Exception as e:
+                logger.error(f"Shared rate limit error: {e}")
+        self.tokens.level = min(self.tokens.capacity, self.tokens.level + refund)
+
+    def observe(self, status_code: int, headers) -> None:
+        """
+        Clamp to the provider's x-ratelimit-remaining-* (and back off on 429)
+        Capacities stay as configured: x-ratelimit-limit-* is per model and
+        for the whole organisation, not one bucket's share of it
+        """
+        if not self.redis:
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining and remaining.isdigit():
+                    bucket.level = min(bucket.level, int(remaining))
+
+        if status_code == 429:
+            self.throttled += 1
+            resets = [
+                parse_reset(headers.get(name))
+                for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+            ]
+            pause = max([r for r in resets if r is not None], default=1.0)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+            logger.warning(f"Upstream rate limited (429); pausing new requests for {pause:.1f}s")
+
+    async def on_response(self, response) -> None:
+        """httpx response hook"""
+        self.observe(response.status_code, response.headers)
+
+    def stats(self) -> dict:
+        return {
+            "shared": self.redis is not None,
+            "requests_available": round(self.requests.level, 1),
+            "tokens_available": round(self.tokens.level),
+            "waits": self.waits,
+            "waited_seconds": round(self.waited_seconds, 3),
+            "throttled": self.throttled
+        }
+
+# Singleton
+rate_limiter = RateLimiter(
+    requests_per_window=settings.RATE_LIMIT_REQUESTS,
+    window=settings.RATE_LIMIT_WINDOW,
+    tokens_per_minute=settings.RATE_LIMIT_TOKENS_PER_MINUTE or default_tokens_per_minute()
+)
@@ -0,0 +1,110 @@
+"""Single-flight coalescing of identical in-flight AI generations"""
+from collections import defaultdict
+from loguru import logger
+from typing import Any, Awaitable, Callable, Optional
+import asyncio
+import time
+import uuid
+
+from app.core.config import settings
+from app.services.cache_service import cache_service
+
+# Delete the lock only if this replica still owns it
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one upstream call
+
+    The first caller starts the work as a task; later callers await the
+    same task (shielded, so a leader whose client disconnects does not
+    cancel it for the others). With SINGLE_FLIGHT_SHARED, a Redis lock
+    extends this across replicas: a replica that finds the lock taken
+    polls the shared cache for the leader's result instead of calling
+    upstream, and takes over if the lock expires without one.
+    """
+
+    def __init__(self):
+        self._inflight: dict = {}
+        self.coalesced = defaultdict(int)
+        self.remote_coalesced = defaultdict(int)
+
+    async def run(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[Any]],
+        endpoint: str = "unknown",
+        poll: Optional[Callable[[], Awaitable[Any]]] = None
+    ) -> tuple[Any, bool]:
+        """
+        Returns:
+            Tuple of (result, shared); shared is True when another caller
+            (here or on another replica) paid for the result
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced[endpoint] += 1
+            result, _ = await asyncio.shield(task)
+            return result, True
+
+        task = asyncio.create_task(self._lead(key, call, endpoint, poll))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Mark the error retrieved even if every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+
+    async def _lead(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[Any]],
+        endpoint: str,
+        poll: Optional[Callable[[], Awaitable[Any]]]
+    ) -> tuple[Any, bool]:
+        redis = cache_service.redis if settings.SINGLE_FLIGHT_SHARED else None
+        if redis is None or poll is None:
+            return await call(), False
+
+        lock_key = f"ai:flight:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + settings.SINGLE_FLIGHT_LOCK_TTL
+        try:
+            owned = await redis.set(lock_key, token, nx=True, ex=settings.SINGLE_FLIGHT_LOCK_TTL)
+            while not owned and time.monotonic() < deadline:
+                await asyncio.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+                result = await poll()
+                if result is not None:
+                    self.remote_coalesced[endpoint] += 1
+                    return result, True
+                owned = await redis.set(lock_key, token, nx=True, ex=settings.SINGLE_FLIGHT_LOCK_TTL)
+        except Exception as e:
+            logger.error(f"Single-flight lock error: {e}")
+            owned = False
+
+        try:
+            return await call(), False
+        finally:
+            if owned:
+                try:
+                    await redis.eval(_RELEASE_SCRIPT, 1, lock_key, token)
+                except Exception as e:
+                    logger.error(f"Single-flight unlock error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "coalesced": dict(self.coalesced),
+            "remote_coalesced": dict(self.remote_coalesced)
+        }
+
+# Singleton
+single_flight = SingleFlight()
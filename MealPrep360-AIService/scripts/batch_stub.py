@@ -0,0 +1,139 @@
+"""
+Local stand-in for the OpenAI Files and Batch endpoints
+
+    python -m scripts.batch_stub --port 8100 --delay 5 --error-rate 0.05
+    OPENAI_BASE_URL=http://localhost:8100/v1 uvicorn app.main:app
+
+Implements the subset the batch job service uses: file upload, batch
+create/retrieve and file content download. A batch completes `--delay`
+seconds after it is created; each request then gets a schema-valid
+recipe (deterministic per custom_id), or with probability `--error-rate`
+an error line in the batch's error file. Everything is kept in memory.
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import time
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from app.services.llm_backends import build_recipe
+
+def create_app(delay: float = 5.0, error_rate: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Batch API stub")
+    files: dict = {}
+    batches: dict = {}
+    ready_at: dict = {}
+    ids = itertools.count(1)
+
+    def store(content: bytes, filename: str, purpose: str) -> dict:
+        file = {
+            "id": f"file-{next(ids)}",
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed"
+        }
+        files[file["id"]] = (file, content)
+        return file
+
+    def run(batch: dict):
+        """Produce the output (and error) file of a batch whose delay has passed"""
+        output, errors = [], []
+        for raw in files[batch["input_file_id"]][1].decode().splitlines():
+            line = json.loads(raw)
+            body = line["body"]
+            if random.random() < error_rate:
+                errors.append({"id": f"req-{next(ids)}", "custom_id": line["custom_id"], "response": None,
+                               "error": {"code": "server_error", "message": "Simulated failure"}})
+                continue
+            prompt = json.dumps(body["messages"])
+            season = re.search(r"spring|summer|fall|winter", body["messages"][-1]["content"].lower())
+            content = json.dumps(build_recipe(random.Random(line["custom_id"]), season.group() if season else "fall"))
+            output.append({"id": f"req-{next(ids)}", "custom_id": line["custom_id"], "error": None, "response": {
+                "status_code": 200,
+                "body": {
+                    "id": f"chatcmpl-{next(ids)}",
+                    "object": "chat.completion",
+                    "model": body["model"],
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                              "total_tokens": (len(prompt) + len(content)) // 4}
+                }
+            }})
+
+        jsonl = lambda lines: "".join(json.dumps(line) + "\n" for line in lines).encode()
+        batch["output_file_id"] = store(jsonl(output), "output.jsonl", "batch_output")["id"]
+        if errors:
+            batch["error_file_id"] = store(jsonl(errors), "errors.jsonl", "batch_output")["id"]
+        batch.update(
+            status="completed",
+            completed_at=int(time.time()),
+            request_counts={"total": len(output) + len(errors), "completed": len(output), "failed": len(errors)}
+        )
+
+    @app.post("/v1/files")
+    async def upload(request: Request):
+        form = await request.form()
+        upload = form["file"]
+        return store(await upload.read(), upload.filename, form["purpose"])
+
+    @app.post("/v1/batches")
+    async def create(request: Request):
+        body = await request.json()
+        if body.get("input_file_id") not in files:
+            raise HTTPException(status_code=400, detail="Unknown input_file_id")
+        total = len(files[body["input_file_id"]][1].splitlines())
+        batch = {
+            "id": f"batch_{next(ids)}",
+            "object": "batch",
+            "endpoint": body["endpoint"],
+            "input_file_id": body["input_file_id"],
+            "completion_window": body["completion_window"],
+            "status": "in_progress",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": int(time.time()),
+            "metadata": body.get("metadata") or {},
+            "request_counts": {"total": total, "completed": 0, "failed": 0}
+        }
+        batches[batch["id"]] = batch
+        ready_at[batch["id"]] = time.monotonic() + delay
+        return batch
+
+    @app.get("/v1/batches/{batch_id}")
+    async def retrieve(batch_id: str):
+        if batch_id not in batches:
+            raise HTTPException(status_code=404, detail="No such batch")
+        batch = batches[batch_id]
+        if batch["status"] == "in_progress" and time.monotonic() >= ready_at[batch_id]:
+            run(batch)
+        return batch
+
+    @app.get("/v1/files/{file_id}/content")
+    async def content(file_id: str):
+        if file_id not in files:
+            raise HTTPException(status_code=404, detail="No such file")
+        return PlainTextResponse(files[file_id][1])
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--delay", type=float, default=5.0, help="seconds until a batch completes")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(args.delay, args.error_rate), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Drive the AI service at a target request rate and report how it held up
+
+    python -m scripts.load_test --rps 20 --duration 60 --mix recipe=2,suggestions=3,blog=1
+    python -m scripts.load_test --rps 50 --env MAX_CONCURRENT_REQUESTS=20 --env FAKE_LLM_ERROR_RATES='{"429": 0.02}'
+    python -m scripts.load_test --url http://localhost:8000 --rps 5
+
+Without --url the app runs in-process on the fake LLM backend
+(LLM_BACKEND=fake), so nothing is billed, and with the client-side rate
+limits lifted (the fake has no provider quota); --env overrides settings
+for that app, e.g. --env RATE_LIMIT_REQUESTS=100 to test throttling.
+
+Arrivals are open-loop (Poisson by default): requests go out at the
+target rate whether or not earlier ones have finished, as real traffic
+does. Each request picks one of --distinct payloads per
+endpoint, so repeats can be served from the prompt cache (Redis).
+
+Reports throughput, latency percentiles per endpoint, errors, and from
+the service's /metrics and /health: prompt cache hit rate, time spent
+queueing for the upstream semaphore, upstream calls and rate-limit waits.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict
+
+import httpx
+import numpy as np
+from prometheus_client.parser import text_string_to_metric_families
+
+SEASONS = ["spring", "summer", "fall", "winter"]
+CUISINES = ["Italian", "Mexican", "American", "Indian", "French"]
+PROTEINS = ["chicken", "beef", "lentil", "turkey", "salmon", "tofu", "pork", "bean"]
+STYLES = ["quick", "freezer-friendly", "one-pot", "slow cooker", "sheet pan"]
+TOPICS = ["Meal Prep for Busy Families", "Freezer Meal Basics", "Batch Cooking on a Budget",
+          "Make-Ahead Breakfasts", "Thawing Food Safely", "Planning a Week of Dinners"]
+
+def payload(endpoint: str, k: int) -> tuple[str, dict]:
+    """Path and body of the k-th distinct request for an endpoint"""
+    if endpoint == "recipe":
+        return "/api/recipes/generate", {
+            "season": SEASONS[k % 4],
+            "servings": 2 + (k // 4) % 10,
+            "cuisine": CUISINES[(k // 40) % len(CUISINES)]
+        }
+    if endpoint == "suggestions":
+        return "/api/suggestions/generate", {
+            "query": f"{STYLES[k % len(STYLES)]} {PROTEINS[(k // len(STYLES)) % len(PROTEINS)]} dinners",
+            "max_results": 3 + (k // 40) % 5
+        }
+    if endpoint == "blog":
+        return "/api/blog/generate", {
+            "topic": TOPICS[k % len(TOPICS)],
+            "length": 600 + 100 * ((k // len(TOPICS)) % 10)
+        }
+    raise ValueError(f"Unknown endpoint {endpoint!r} (recipe, suggestions, blog)")
+
+async def scrape(client: httpx.AsyncClient) -> dict:
+    """(metric sample name, labels) -> value from /metrics, plus rate limiter stats from /health"""
+    samples = {}
+    response = await client.get("/metrics")
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            samples[(sample.name, tuple(sorted(sample.labels.items())))] = sample.value
+    health = (await client.get("/health")).json()
+    for key in ("waits", "waited_seconds", "throttled"):
+        samples[(f"rate_limit_{key}", ())] = health["rate_limit"][key]
+    return samples
+
+def delta(before: dict, after: dict, name: str, **labels) -> float:
+    """Increase of all samples called name whose labels include `labels`"""
+    return sum(
+        value - before.get(key, 0.0)
+        for key, value in after.items()
+        if key[0] == name and labels.items() <= dict(key[1]).items()
+    )
+
+def histogram_quantile(before: dict, after: dict, name: str, q: float) -> float:
+    """Quantile of a Prometheus histogram's increase, interpolated within buckets"""
+    buckets = defaultdict(float)
+    for key, value in after.items():
+        if key[0] == f"{name}_bucket":
+            buckets[float(dict(key[1])["le"])] += value - before.get(key, 0.0)
+    bounds = sorted(buckets)
+    if not bounds or buckets[bounds[-1]] == 0:
+        return 0.0
+    rank = q * buckets[bounds[-1]]
+    lower, below = 0.0, 0.0
+    for bound in bounds:
+        if buckets[bound] >= rank:
+            if bound == float("inf"):
+                return lower
+            return lower + (bound - lower) * (rank - below) / ((buckets[bound] - below) or 1.0)
+        lower, below = bound, buckets[bound]
+    return lower
+
+async def run(client: httpx.AsyncClient, args) -> None:
+    mix = [(name, float(weight)) for name, weight in (part.split("=") for part in args.mix.split(","))]
+    endpoints, weights = zip(*mix)
+    for endpoint in endpoints:
+        payload(endpoint, 0)
+    rng = random.Random(args.seed)
+    results = []  # (endpoint, status, seconds)
+
+    async def send(endpoint: str):
+        path, body = payload(endpoint, rng.randrange(args.distinct))
+        start = time.perf_counter()
+        try:
+            response = await client.post(path, json=body, timeout=args.timeout)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        results.append((endpoint, status, time.perf_counter() - start))
+
+    before = await scrape(client)
+    tasks = []
+    start = time.perf_counter()
+    next_at = start
+    while next_at - start < args.duration:
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        tasks.append(asyncio.create_task(send(rng.choices(endpoints, weights)[0])))
+        next_at += rng.expovariate(args.rps) if args.arrivals == "poisson" else 1 / args.rps
+    sent_for = max(time.perf_counter() - start, args.duration)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    after = await scrape(client)
+
+    ok = [r for r in results if r[1] == 200]
+    print(f"\nOffered {len(tasks)} requests in {sent_for:.1f}s ({len(tasks) / sent_for:.1f} rps); "
+          f"all done after {elapsed:.1f}s")
+    print(f"Throughput: {len(ok) / elapsed:.1f} rps successful ({len(ok)}/{len(results)})")
+    errors = defaultdict(int)
+    for endpoint, status, _ in results:
+        if status != 200:
+            errors[f"{endpoint}:{status}"] += 1
+    if errors:
+        print("Errors: " + ", ".join(f"{key} x{count}" for key, count in sorted(errors.items())))
+
+    print(f"\n{'endpoint':<12} {'ok':>6} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8}  (seconds)")
+    for endpoint in list(endpoints) + ["all"]:
+        latencies = [seconds for name, status, seconds in ok if endpoint in ("all", name)]
+        if latencies:
+            p50, p90, p95, p99 = np.percentile(latencies, [50, 90, 95, 99])
+            print(f"{endpoint:<12} {len(latencies):>6} {p50:>8.3f} {p90:>8.3f} {p95:>8.3f} {p99:>8.3f} {max(latencies):>8.3f}")
+
+    hits = delta(before, after, "cache_lookups_total", cache="prompt", result="hit")
+    lookups = hits + delta(before, after, "cache_lookups_total", cache="prompt", result="miss")
+    queued = delta(before, after, "ai_semaphore_wait_seconds_count")
+    waited = delta(before, after, "ai_semaphore_wait_seconds_sum")
+    chat = delta(before, after, "upstream_call_duration_seconds_count", operation="chat")
+    chat_errors = delta(before, after, "upstream_call_duration_seconds_count", operation="chat", outcome="error")
+    print(f"\nPrompt cache: {hits:.0f}/{lookups:.0f} hits ({hits / lookups if lookups else 0:.1%})")
+    print(f"Semaphore queueing: {queued:.0f} calls, mean {waited / queued if queued else 0:.3f}s, "
+          f"p95 {histogram_quantile(before, after, 'ai_semaphore_wait_seconds', 0.95):.3f}s, "
+          f"p99 {histogram_quantile(before, after, 'ai_semaphore_wait_seconds', 0.99):.3f}s")
+    print(f"Upstream chat calls: {chat:.0f} ({chat_errors:.0f} failed); all upstream calls "
+          f"p95 {histogram_quantile(before, after, 'upstream_call_duration_seconds', 0.95):.3f}s")
+    print(f"Rate limiter: {delta(before, after, 'rate_limit_waits'):.0f} waits, "
+          f"{delta(before, after, 'rate_limit_waited_seconds'):.1f}s waited, "
+          f"{delta(before, after, 'rate_limit_throttled'):.0f} throttled by upstream")
+
+async def main_async(args) -> None:
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=httpx.Limits(max_connections=None)) as client:
+            await run(client, args)
+        return
+
+    os.environ.setdefault("LLM_BACKEND", "fake")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ.setdefault("RATE_LIMIT_REQUESTS", "1000000")
+    os.environ.setdefault("RATE_LIMIT_TOKENS_PER_MINUTE", "1000000000")
+    for override in args.env:
+        key, _, value = override.partition("=")
+        os.environ[key] = value
+
+    from loguru import logger
+    from app.main import app
+    logger.remove()
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+            await run(client, args)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="running service to test (default: in-process app on the fake backend)")
+    parser.add_argument("--rps", type=float, default=10.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to send requests for")
+    parser.add_argument("--mix", default="recipe=2,suggestions=3,blog=1", help="endpoint=weight,...")
+    parser.add_argument("--distinct", type=int, default=200, help="distinct payloads per endpoint")
+    parser.add_argument("--arrivals", choices=["poisson", "uniform"], default="poisson")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="setting override for the in-process app (repeatable)")
+    args = parser.parse_args()
+
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -65,12 +65,13 @@ Write-Host "========================================" -ForegroundColor Green
 Write-Host ""
 Write-Host "Available endpoints:" -ForegroundColor Cyan
 Write-Host "  Health:  http://localhost:8000/health" -ForegroundColor White
-Write-Host "  Metrics: http://localhost:8000/metrics" -ForegroundColor White
+Write-Host "  Costs:   http://localhost:8000/metrics/costs" -ForegroundColor White
+Write-Host "  Metrics: http://localhost:8000/metrics (Prometheus)" -ForegroundColor White
 Write-Host "  Docs:    http://localhost:8000/docs" -ForegroundColor White
 Write-Host ""
 Write-Host "Test commands:" -ForegroundColor Cyan
 Write-Host '  curl http://localhost:8000/health' -ForegroundColor Gray
-Write-Host '  curl http://localhost:8000/metrics' -ForegroundColor Gray
+Write-Host '  curl http://localhost:8000/metrics/costs' -ForegroundColor Gray
 Write-Host ""
 Write-Host "View logs:" -ForegroundColor Cyan
 Write-Host "  docker logs -f mealprep360-ai-service" -ForegroundColor Gray
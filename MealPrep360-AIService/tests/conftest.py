@@ -0,0 +1,5 @@
+"""Shared test setup: settings need an API key before the app is imported"""
+import os
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("LLM_BACKEND", "fake")
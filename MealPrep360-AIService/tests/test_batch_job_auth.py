@@ -0,0 +1,21 @@
+"""Batch API job endpoints are internal-only"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+def test_refused_without_configured_key(client, monkeypatch):
+    monkeypatch.setattr(settings, "INTERNAL_API_KEY", None)
+    response = client.post("/api/recipes/batch-jobs", params={"season": "fall"}, headers={"X-Internal-Key": ""})
+    assert response.status_code == 503
+    assert client.get("/api/recipes/batch-jobs/batch_1").status_code == 503
+
+def test_refused_with_wrong_or_missing_key(client, monkeypatch):
+    monkeypatch.setattr(settings, "INTERNAL_API_KEY", "s3cret")
+    assert client.get("/api/recipes/batch-jobs/batch_1").status_code == 403
+    assert client.get("/api/recipes/batch-jobs/batch_1", headers={"X-Internal-Key": "s3cre"}).status_code == 403
@@ -0,0 +1,57 @@
+"""Batch API jobs against the local stub (scripts/batch_stub.py)"""
+import asyncio
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.models.schemas import Recipe, Season
+from app.services import batch_jobs as batch_jobs_module
+from app.services.batch_jobs import BatchJobService
+from scripts.batch_stub import create_app
+
+def stub_client(error_rate: float) -> AsyncOpenAI:
+    transport = httpx.ASGITransport(app=create_app(delay=0.0, error_rate=error_rate))
+    return AsyncOpenAI(
+        api_key="sk-test",
+        base_url="http://batch-stub/v1",
+        http_client=httpx.AsyncClient(transport=transport)
+    )
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_COST_TRACKING", False)
+    return BatchJobService()
+
+def use_stub(monkeypatch, error_rate: float = 0.0):
+    client = stub_client(error_rate)
+    monkeypatch.setattr(batch_jobs_module.http_clients, "get", lambda provider=None: client)
+
+def test_submit_then_collect_validated_recipes(service, monkeypatch):
+    use_stub(monkeypatch)
+
+    async def scenario():
+        submitted = await service.submit(Season.WINTER, 3, "job-1")
+        return submitted, await service.collect(submitted["batch_id"]), await service.collect(submitted["batch_id"])
+
+    submitted, collected, again = asyncio.run(scenario())
+    assert submitted["job_id"] == "job-1" and not submitted["done"]
+    assert collected["status"] == "completed" and collected["done"]
+    assert sorted(recipe["customId"] for recipe in collected["recipes"]) == ["job-1:0", "job-1:1", "job-1:2"]
+    for recipe in collected["recipes"]:
+        Recipe.model_validate({k: v for k, v in recipe.items() if k != "customId"})
+    assert collected["failures"] == [] and collected["total_cost"] > 0
+    # A repeat poll is served from the collected result, not downloaded again
+    assert again is collected
+
+def test_failed_requests_are_reported_per_item(service, monkeypatch):
+    use_stub(monkeypatch, error_rate=1.0)
+
+    async def scenario():
+        submitted = await service.submit(Season.FALL, 2, "job-2")
+        return await service.collect(submitted["batch_id"])
+
+    collected = asyncio.run(scenario())
+    assert collected["recipes"] == []
+    assert sorted(failure["custom_id"] for failure in collected["failures"]) == ["job-2:0", "job-2:1"]
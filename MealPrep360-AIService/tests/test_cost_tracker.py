@@ -0,0 +1,138 @@
+"""Cost tracker rollups: Redis pipeline path, fallback to the local log, compaction"""
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services.cost_tracker import CostTracker
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        if self.redis.fail:
+            raise ConnectionError("Redis went away")
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+class FakeRedis:
+    """Just the commands the tracker uses, with Redis' integer check on HINCRBY"""
+
+    def __init__(self):
+        self.hashes = {}
+        self.sets = {}
+        self.fail = False
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hincrby(self, key, field, amount):
+        current = self.hashes.setdefault(key, {}).get(field, "0")
+        if not isinstance(amount, int) or "." in current:
+            raise ValueError("ERR hash value is not an integer")
+        self.hashes[key][field] = str(int(current) + amount)
+
+    def hincrbyfloat(self, key, field, amount):
+        current = self.hashes.setdefault(key, {}).get(field, "0")
+        self.hashes[key][field] = repr(float(current) + float(amount))
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    async def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    def xadd(self, *args, **kwargs):
+        pass
+
+    def expire(self, *args):
+        pass
+
+    async def close(self):
+        pass
+
+@pytest.fixture
+def log_file(tmp_path, monkeypatch):
+    path = tmp_path / "usage.jsonl"
+    monkeypatch.setattr(settings, "USAGE_LOG_FILE", str(path))
+    return path
+
+def redis_tracker(redis: FakeRedis) -> CostTracker:
+    tracker = CostTracker()
+    tracker.redis = redis
+    return tracker
+
+def test_redis_rollups_mix_int_and_float_amounts(log_file):
+    redis = FakeRedis()
+    tracker = redis_tracker(redis)
+
+    async def run():
+        # Whole-number cost/duration (batch results have duration=0) must not take HINCRBY
+        await tracker.track_request("recipe", "gpt-4o", 100, 50, 0, 0)
+        await tracker.track_request("recipe", "gpt-4o", 100, 50, 0.25, 1.5)
+        await tracker.track_request("blog", "gpt-4o-mini", 10, 5, 1, 3)
+        return await tracker.get_stats()
+
+    stats = asyncio.run(run())
+    assert stats["backend"] == "redis"
+    assert stats["total_requests"] == 3
+    assert stats["total_cost"] == pytest.approx(1.25)
+    assert stats["total_tokens"] == 315
+    assert stats["average_duration"] == pytest.approx(1.5)
+    assert stats["by_endpoint"]["recipe"]["requests"] == 2
+    assert stats["by_model"]["gpt-4o-mini"]["cost"] == pytest.approx(1.0)
+    assert sum(stats["latency_buckets"].values()) == 3
+    assert not log_file.exists()
+
+def test_redis_failure_falls_back_to_log(log_file):
+    redis = FakeRedis()
+    tracker = redis_tracker(redis)
+
+    async def run():
+        await tracker.track_request("recipe", "gpt-4o", 100, 50, 0.5, 1.0)
+        redis.fail = True
+        await tracker.track_request("recipe", "gpt-4o", 100, 50, 0.25, 2.0)
+        redis.fail = False
+        return await tracker.get_stats()
+
+    stats = asyncio.run(run())
+    assert log_file.read_text().count("\n") == 1
+    assert stats["total_requests"] == 2
+    assert stats["total_cost"] == pytest.approx(0.75)
+    assert stats["by_endpoint"]["recipe"]["requests"] == 2
+    asyncio.run(tracker.save_stats())
+
+def test_local_log_compacts_into_checkpoint(log_file, monkeypatch):
+    monkeypatch.setattr(settings, "COST_TRACKING_BACKEND", "local")
+    monkeypatch.setattr(settings, "USAGE_LOG_COMPACT_BYTES", 2000)
+
+    async def run():
+        writer, reader = CostTracker(), CostTracker()
+        await writer.initialize()
+        await reader.initialize()
+        for i in range(100):
+            await writer.track_request("recipe", "gpt-4o", 10, 5, 0.01, i % 4)
+        stats = await reader.get_stats()
+        await writer.save_stats()
+        await reader.save_stats()
+
+        restarted = CostTracker()
+        await restarted.initialize()
+        replayed = await restarted.get_stats()
+        await restarted.save_stats()
+        return stats, replayed
+
+    stats, replayed = asyncio.run(run())
+    assert log_file.stat().st_size < 4000
+    assert '"checkpoint"' in log_file.read_text().splitlines()[0]
+    for result in (stats, replayed):
+        assert result["total_requests"] == 100
+        assert result["total_cost"] == pytest.approx(1.0)
+        assert result["by_endpoint"]["recipe"]["tokens"] == 1500
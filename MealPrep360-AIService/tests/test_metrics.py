@@ -0,0 +1,35 @@
+"""Route labels of the Prometheus middleware"""
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.core.metrics import PrometheusMiddleware
+
+def test_routes_in_included_routers_are_labelled_with_full_template():
+    inner = APIRouter(prefix="/inner")
+
+    @inner.get("/{x}")
+    def nested(x: str):
+        return x
+
+    router = APIRouter()
+
+    @router.get("/{item_id}")
+    def item(item_id: str):
+        return item_id
+
+    router.include_router(inner)
+    app = FastAPI()
+    app.include_router(router, prefix="/api/label-test")
+    app.add_middleware(PrometheusMiddleware)
+
+    client = TestClient(app)
+    for path in ("/api/label-test/1", "/api/label-test/2", "/api/label-test/inner/3", "/api/label-test-missing"):
+        client.get(path)
+
+    count = lambda route, status: REGISTRY.get_sample_value(
+        "http_request_duration_seconds_count", {"method": "GET", "route": route, "status": status}
+    )
+    assert count("/api/label-test/{item_id}", "200") == 2
+    assert count("/api/label-test/inner/{x}", "200") == 1
+    assert count("<unmatched>", "404") >= 1
@@ -0,0 +1,103 @@
+"""Model router: latency observations, p95 with cancelled calls, route choice"""
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from prometheus_client import REGISTRY
+
+from app.core.config import settings
+from app.services import openai_service as openai_module
+from app.services.model_router import MIN_SAMPLES, ModelRouter, Route, censored_quantile
+
+@pytest.fixture
+def router(monkeypatch):
+    monkeypatch.setattr(settings, "MODEL_ROUTES", {"suggestions": ["gpt-4o-mini", "gpt-4o"]})
+    monkeypatch.setattr(settings, "LATENCY_BUDGETS", {"suggestions": 5.0})
+    return ModelRouter()
+
+def test_quantile_without_cancellations_is_the_empirical_one():
+    seconds = np.random.default_rng(0).lognormal(0, 1, 200)
+    assert censored_quantile([(s, True) for s in seconds], 0.95) == pytest.approx(
+        np.percentile(seconds, 95, method="inverted_cdf")
+    )
+
+def test_cancelled_calls_raise_p95_instead_of_counting_as_fast(router):
+    route = Route("openai", "gpt-4o")
+    for seconds in (1.0, 1.1, 1.2, 1.3, 1.4, 1.5, 1.6, 1.7, 1.8, 1.9):
+        router.observe(route, seconds, ok=True)
+    baseline = router.p95("openai", "gpt-4o")
+    # Hedged away after 3s: they would have taken longer than every completion
+    for _ in range(5):
+        router.observe(route, 3.0, ok=False, cancelled=True)
+    assert router.p95("openai", "gpt-4o") >= 3.0 > baseline
+    assert router.failures[("openai", "gpt-4o")] == 0
+
+def test_p95_needs_enough_completed_calls(router):
+    route = Route("openai", "gpt-4o")
+    router.observe(route, 9.0, ok=False)
+    for _ in range(10):
+        router.observe(route, 2.0, ok=False, cancelled=True)
+    for _ in range(MIN_SAMPLES - 1):
+        router.observe(route, 1.0, ok=True)
+    assert router.p95("openai", "gpt-4o") is None
+    router.observe(route, 1.0, ok=True)
+    assert router.p95("openai", "gpt-4o") == 2.0
+    assert router.failures[("openai", "gpt-4o")] == 1
+
+def test_cheapest_model_within_budget_else_fastest(router):
+    candidates = router.candidates("suggestions")
+    assert router.route("suggestions", candidates).model == "gpt-4o-mini"
+
+    for _ in range(MIN_SAMPLES):
+        router.observe(Route("openai", "gpt-4o-mini"), 8.0, ok=True)
+        router.observe(Route("openai", "gpt-4o"), 3.0, ok=True)
+    assert router.route("suggestions", candidates).model == "gpt-4o"
+
+    for _ in range(MIN_SAMPLES):
+        router.observe(Route("openai", "gpt-4o"), 12.0, ok=True)
+    assert router.route("suggestions", candidates).model == "gpt-4o-mini"
+
+def test_hedge_only_to_a_backup_known_to_beat_the_delay(router, monkeypatch):
+    monkeypatch.setattr(settings, "HEDGE_MIN_DELAY", 2.0)
+    candidates = router.candidates("suggestions")
+    primary = Route("openai", "gpt-4o")
+    # No history for the backup: it could be just as slow
+    assert router.hedge(primary, candidates) is None
+
+    for _ in range(MIN_SAMPLES):
+        router.observe(primary, 3.0, ok=True)
+        router.observe(Route("openai", "gpt-4o-mini"), 8.0, ok=True)
+    # Backup p95 (8s) above the primary's delay (3s): hedging only duplicates load
+    assert router.hedge(primary, candidates) is None
+
+    for _ in range(MIN_SAMPLES):
+        router.observe(primary, 12.0, ok=True)
+    assert router.hedge_delay(primary) == 12.0
+    assert router.hedge(primary, candidates) == Route("openai", "gpt-4o-mini", "hedge")
+
+def test_create_records_cancelled_call_as_censored(router, monkeypatch):
+    monkeypatch.setattr(openai_module, "model_router", router)
+
+    async def slow_create(**kwargs):
+        await asyncio.sleep(10)
+
+    service = openai_module.OpenAIService()
+    service._clients["openai"] = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=slow_create)))
+
+    async def run():
+        call = asyncio.create_task(service._create(Route("openai", "gpt-4o"), "chat", messages=[]))
+        await asyncio.sleep(0.05)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+
+    cancelled = lambda: REGISTRY.get_sample_value(
+        "upstream_call_duration_seconds_count", {"upstream": "openai", "operation": "chat", "outcome": "cancelled"}
+    ) or 0
+    before = cancelled()
+    asyncio.run(run())
+    [(seconds, completed)] = router._latencies[("openai", "gpt-4o")]
+    assert not completed and seconds >= 0.05
+    # Cancelled, not an upstream error
+    assert cancelled() == before + 1
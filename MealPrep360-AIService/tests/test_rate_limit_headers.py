@@ -0,0 +1,42 @@
+"""Provider rate-limit headers: which responses count and what they change"""
+import asyncio
+
+import httpx
+
+from app.core.config import settings
+from app.services.http_clients import ClientRegistry, rate_limiter
+from app.services.rate_limiter import RateLimiter
+
+def test_headers_clamp_levels_but_keep_the_configured_capacity():
+    limiter = RateLimiter(100, 30, 10_000)
+    limiter.observe(200, {
+        "x-ratelimit-limit-requests": "5000",
+        "x-ratelimit-remaining-requests": "40",
+        "x-ratelimit-limit-tokens": "2000000",
+        "x-ratelimit-remaining-tokens": "900"
+    })
+    assert limiter.requests.capacity == 100 and limiter.requests.rate == 100 / 30
+    assert limiter.tokens.capacity == 10_000
+    assert limiter.requests.level == 40 and limiter.tokens.level == 900
+
+def test_only_primary_chat_responses_reach_the_limiter(monkeypatch):
+    monkeypatch.setattr(settings, "USE_OPENROUTER", False)
+    seen = []
+
+    async def record(response):
+        seen.append((response.request.url.host, response.request.url.path))
+
+    monkeypatch.setattr(rate_limiter, "on_response", record)
+    registry = ClientRegistry()
+
+    async def respond(provider: str, url: str):
+        await registry._rate_limit_hook(provider)(httpx.Response(200, request=httpx.Request("POST", url)))
+
+    async def scenario():
+        await respond("openai", "https://api.openai.com/v1/chat/completions")
+        await respond("openai", "https://api.openai.com/v1/embeddings")
+        await respond("openai", "https://api.openai.com/v1/files/file-1/content")
+        await respond("openrouter", "https://openrouter.ai/api/v1/chat/completions")
+
+    asyncio.run(scenario())
+    assert seen == [("api.openai.com", "/v1/chat/completions")]
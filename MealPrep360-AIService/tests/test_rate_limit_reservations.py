@@ -0,0 +1,112 @@
+"""Rate-limit reservations are settled however an upstream call ends"""
+import asyncio
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+from app.core.config import settings
+from app.models.schemas import RecipeSuggestion
+from app.services import openai_service as openai_module
+from app.services.model_router import MIN_SAMPLES, ModelRouter, Route
+from app.services.rate_limiter import RateLimiter
+
+class RecordingLimiter(RateLimiter):
+    """Tokens still held: reserved minus refunded (the bucket itself keeps refilling)"""
+
+    def __init__(self):
+        super().__init__(1000, 60, 100_000)
+        self.held = 0
+
+    async def acquire(self, tokens: int = 0) -> int:
+        self.held += tokens
+        return await super().acquire(tokens)
+
+    async def settle(self, reserved: int, used: int):
+        self.held -= reserved - used
+        await super().settle(reserved, used)
+
+MESSAGES = [{"role": "user", "content": "x" * 400}]  # ~100 prompt tokens estimated
+
+def completion(total_tokens: int):
+    usage = SimpleNamespace(prompt_tokens=100, completion_tokens=total_tokens - 100, total_tokens=total_tokens)
+    return SimpleNamespace(_raw_response=SimpleNamespace(usage=usage))
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = RecordingLimiter()
+    monkeypatch.setattr(openai_module, "rate_limiter", limiter)
+    return limiter
+
+@pytest.fixture
+def service(monkeypatch, limiter):
+    monkeypatch.setattr(openai_module, "model_router", ModelRouter())
+    monkeypatch.setattr(settings, "ENABLE_COST_TRACKING", False)
+    monkeypatch.setattr(settings, "ENABLE_PROVIDER_FAILOVER", False)
+    return openai_module.OpenAIService()
+
+def use_client(service, create):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    service._clients = {"openai": client, "openrouter": client}
+
+def complete(service, candidates=("gpt-4o",)):
+    prompt = openai_module.estimate_tokens(openai_module.json.dumps(MESSAGES))
+    result = service._complete(RecipeSuggestion, MESSAGES, list(candidates), 0.7, 4000, "test", None, None)
+    return prompt, result
+
+def test_success_settles_to_real_usage(service, limiter):
+    async def create(**kwargs):
+        return completion(700)
+
+    use_client(service, create)
+    prompt, call = complete(service)
+    asyncio.run(call)
+    assert limiter.held == 700
+
+def test_failure_refunds_all_but_the_prompt(service, limiter):
+    async def create(**kwargs):
+        raise openai.APIConnectionError(request=None)
+
+    use_client(service, create)
+    prompt, call = complete(service)
+    with pytest.raises(openai.APIConnectionError):
+        asyncio.run(call)
+    assert limiter.held == prompt
+
+def test_cancelled_call_refunds_all_but_the_prompt(service, limiter):
+    async def create(**kwargs):
+        await asyncio.sleep(10)
+
+    use_client(service, create)
+    prompt, call = complete(service)
+
+    async def run():
+        task = asyncio.create_task(call)
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert limiter.held == prompt
+
+def test_hedged_call_settles_both_reservations(service, limiter, monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_HEDGING", True)
+    monkeypatch.setattr(settings, "HEDGE_MIN_DELAY", 0.05)
+    monkeypatch.setattr(settings, "HEDGE_DEFAULT_DELAY", 0.05)
+
+    async def create(model, **kwargs):
+        if model == "gpt-4o-mini":  # the cheaper model is the primary
+            await asyncio.sleep(10)
+        return completion(500)
+
+    # The backup is only used once it is known to answer within the delay
+    for _ in range(MIN_SAMPLES):
+        openai_module.model_router.observe(Route("openai", "gpt-4o"), 0.01, ok=True)
+
+    use_client(service, create)
+    prompt, call = complete(service, ("gpt-4o", "gpt-4o-mini"))
+    response, cost, route = asyncio.run(call)
+    assert route.kind == "hedge"
+    # The winner's usage plus the prompt of the cancelled primary
+    assert limiter.held == 500 + prompt
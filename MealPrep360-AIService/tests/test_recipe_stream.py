@@ -0,0 +1,26 @@
+"""Streamed recipe generation end to end, on the fake LLM backend"""
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+def events(body: str) -> list:
+    """(event, data) pairs of a Server-Sent Events body"""
+    parsed = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        parsed.append((fields["event"], json.loads(fields["data"])))
+    return parsed
+
+def test_stream_ends_with_a_validated_recipe():
+    with TestClient(app) as client:
+        response = client.post("/api/recipes/generate/stream", json={"season": "winter", "servings": 4})
+
+    assert response.status_code == 200
+    streamed = events(response.text)
+    names = [name for name, _ in streamed]
+    assert "error" not in names
+    assert names[-1] == "recipe" and names[:-1] and set(names[:-1]) == {"partial"}
+    # The enum arrives as a JSON string and is coerced, not rejected
+    assert streamed[-1][1]["recipe"]["season"] == "winter"
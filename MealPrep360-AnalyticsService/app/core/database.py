@@ -1,8 +1,22 @@
 """Database connection manager"""
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from loguru import logger
 
 from app.core.config import settings
+from app.core.metrics import UPSTREAM_LATENCY
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command the driver runs (find, getMore, aggregate, ...)"""
+    
+    def started(self, event):
+        pass
+    
+    def succeeded(self, event):
+        UPSTREAM_LATENCY.labels("mongo", event.command_name, "ok").observe(event.duration_micros / 1e6)
+    
+    def failed(self, event):
+        UPSTREAM_LATENCY.labels("mongo", event.command_name, "error").observe(event.duration_micros / 1e6)
 
 class DatabaseManager:
     """Async MongoDB connection manager"""
@@ -14,7 +28,7 @@ class DatabaseManager:
     async def connect(self):
         """Connect to MongoDB"""
         try:
-            self.client = AsyncIOMotorClient(settings.MONGODB_URI)
+            self.client = AsyncIOMotorClient(settings.MONGODB_URI, event_listeners=[CommandMetrics()])
             self.db = self.client[settings.MONGODB_DB_NAME]
             
             # Verify connection
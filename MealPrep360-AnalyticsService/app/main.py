@@ -11,6 +11,7 @@ import sys
 
 from app.core.config import settings
 from app.core.database import db_manager
+from app.core.metrics import PrometheusMiddleware, metrics_endpoint
 from app.routers import users, recipes, system, exports
 
 # Configure logging
@@ -53,6 +54,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Metrics
+app.add_middleware(PrometheusMiddleware)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
 # Include routers
 app.include_router(users.router, prefix="/api/analytics/users", tags=["user-analytics"])
 app.include_router(recipes.router, prefix="/api/analytics/recipes", tags=["recipe-analytics"])
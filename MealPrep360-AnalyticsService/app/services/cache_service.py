@@ -5,6 +5,7 @@ import pickle
 from typing import Any, Optional
 
 from app.core.config import settings
+from app.core.metrics import record_cache, track_upstream
 
 class CacheService:
     """Redis caching with pickle serialization"""
@@ -32,7 +33,9 @@ class CacheService:
             return None
         
         try:
-            value = await self.redis.get(key)
+            with track_upstream("redis", "get"):
+                value = await self.redis.get(key)
+            record_cache("analytics", bool(value))
             if value:
                 return pickle.loads(value)
         except Exception as e:
@@ -46,7 +49,8 @@ class CacheService:
             return
         
         try:
-            await self.redis.set(key, pickle.dumps(value), ex=ttl)
+            with track_upstream("redis", "set"):
+                await self.redis.set(key, pickle.dumps(value), ex=ttl)
         except Exception as e:
             logger.error(f"Cache set error: {e}")
     
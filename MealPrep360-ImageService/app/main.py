@@ -8,6 +8,7 @@ from loguru import logger
 import sys
 
 from app.core.config import settings
+from app.core.metrics import PrometheusMiddleware, metrics_endpoint
 from app.routers import optimize, batch, convert
 
 # Configure logging
@@ -29,6 +30,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Metrics
+app.add_middleware(PrometheusMiddleware)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
 # Include routers
 app.include_router(optimize.router, prefix="/api/images", tags=["optimize"])
 app.include_router(batch.router, prefix="/api/batch", tags=["batch"])
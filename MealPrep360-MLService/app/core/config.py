@@ -0,0 +1,74 @@
+"""Configuration"""
+from pydantic_settings import BaseSettings
+from typing import List
+
+class Settings(BaseSettings):
+    ENVIRONMENT: str = "development"
+    API_PORT: int = 8004
+    ALLOWED_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:3001"]
+    
+    # MongoDB
+    MONGODB_URI: str = "mongodb://localhost:27017"
+    MONGODB_DB_NAME: str = "mealprep360"
+    
+    # Redis
+    REDIS_HOST: str = "localhost"
+    REDIS_PORT: int = 6379
+    REDIS_DB: int = 5
+    REDIS_PASSWORD: str | None = None
+    
+    # Search index
+    SEARCH_INDEX_REFRESH_SECONDS: int = 60  # Delta poll on updatedAt
+    SEARCH_INDEX_RECONCILE_EVERY: int = 10  # Check for deleted recipes every N polls
+    SEARCH_INDEX_REBUILD_RATIO: float = 0.2  # Refit IDF once this share of rows changed
+    SEARCH_SHARDS: int = 0  # Lexical scoring processes per node, shared by its workers (0/1 = score in-process)
+    SEARCH_SHARD_DIR: str = "data/search_shards"  # Pool lock and shard sockets (local to the node)
+    SEARCH_SHARD_CONNECT_SECONDS: int = 60  # How long a worker waits for the shard servers to listen
+    INDEX_BATCH_SIZE: int = 1000  # Recipes per Mongo cursor batch / index build chunk
+    
+    # Search index snapshots (memory-mapped, shared by workers on a node)
+    ENABLE_INDEX_SNAPSHOTS: bool = True
+    SEARCH_INDEX_DIR: str = "data/search_index"
+    SEARCH_INDEX_SNAPSHOT_SECONDS: int = 300  # Min interval between snapshot writes
+    SEARCH_INDEX_SNAPSHOTS_KEEP: int = 2
+    
+    # Search result cache (in-process LRU + Redis), keyed by index content
+    ENABLE_SEARCH_CACHE: bool = True
+    SEARCH_CACHE_SIZE: int = 10000  # Local entries per worker
+    SEARCH_CACHE_TTL: int = 300  # Seconds, Redis tier
+    
+    # Autocomplete (titles, tags, ingredients)
+    ENABLE_AUTOCOMPLETE: bool = True
+    AUTOCOMPLETE_MAX_EDITS: int = 2  # Typos tolerated per word (1 for 4-5 letter words)
+    AUTOCOMPLETE_FUZZY_PENALTY: float = 0.5  # Score multiplier per corrected typo
+    AUTOCOMPLETE_COMPACT_RATIO: float = 0.1  # Re-sort once this share of entries is in the overlay
+    
+    # Dense embeddings (semantic search mode), encoded in the background after
+    # startup; semantic and hybrid searches are served lexically until then
+    ENABLE_EMBEDDINGS: bool = True
+    EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_N_PROBE: int = 32  # IVF lists scanned per query
+    
+    # Hybrid ranking (reciprocal rank fusion)
+    HYBRID_RRF_K: int = 60
+    HYBRID_DEPTH_FACTOR: int = 5  # Candidates taken from each ranker per result
+    
+    # Precomputed similar-recipe table (written by app.jobs.build_neighbours)
+    NEIGHBOURS_PATH: str = "data/neighbours.npz"
+    NEIGHBOURS_PER_RECIPE: int = 20
+    NEIGHBOURS_MEMORY_MB: int = 256  # Dense similarity slab per block
+    NEIGHBOURS_FULL_REBUILD_RATIO: float = 0.2  # Recompute everything past this share of changes
+    
+    # Personalized recommendations (written by app.jobs.train_recommender)
+    RECOMMENDER_MODEL_PATH: str = "data/recommender.npz"
+    RECOMMENDER_SAVE_WEIGHT: float = 3.0
+    ALS_FACTORS: int = 64
+    ALS_REGULARIZATION: float = 0.05
+    ALS_ALPHA: float = 20.0
+    ALS_ITERATIONS: int = 15
+    
+    class Config:
+        env_file = ".env"
+
+settings = Settings()
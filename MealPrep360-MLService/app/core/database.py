@@ -0,0 +1,54 @@
+"""Database connection manager"""
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+from loguru import logger
+
+from app.core.config import settings
+from app.core.metrics import UPSTREAM_LATENCY
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command the driver runs (find, getMore, aggregate, ...)"""
+    
+    def started(self, event):
+        pass
+    
+    def succeeded(self, event):
+        UPSTREAM_LATENCY.labels("mongo", event.command_name, "ok").observe(event.duration_micros / 1e6)
+    
+    def failed(self, event):
+        UPSTREAM_LATENCY.labels("mongo", event.command_name, "error").observe(event.duration_micros / 1e6)
+
+class DatabaseManager:
+    """Async MongoDB connection manager"""
+    
+    def __init__(self):
+        self.client: AsyncIOMotorClient | None = None
+        self.db = None
+    
+    async def connect(self):
+        """Connect to MongoDB"""
+        try:
+            self.client = AsyncIOMotorClient(settings.MONGODB_URI, event_listeners=[CommandMetrics()])
+            self.db = self.client[settings.MONGODB_DB_NAME]
+            
+            # Verify connection
+            await self.client.admin.command('ping')
+            logger.info(f"Connected to MongoDB: {settings.MONGODB_DB_NAME}")
+        except Exception as e:
+            logger.error(f"MongoDB connection failed: {e}")
+            raise
+    
+    async def disconnect(self):
+        """Disconnect from MongoDB"""
+        if self.client:
+            self.client.close()
+            logger.info("Disconnected from MongoDB")
+    
+    def get_collection(self, name: str):
+        """Get a collection"""
+        if self.db is None:
+            raise RuntimeError("Database not connected")
+        return self.db[name]
+
+# Singleton
+db_manager = DatabaseManager()
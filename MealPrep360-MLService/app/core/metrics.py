@@ -0,0 +1,171 @@
+"""Prometheus instrumentation (same module in every Python service)"""
+from contextlib import contextmanager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Match, compile_path
+import asyncio
+import os
+import time
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being served",
+    ["method", "route"],
+    multiprocess_mode="livesum"
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_call_duration_seconds",
+    "Latency of calls to external dependencies (openai, usda, mongo, redis)",
+    ["upstream", "operation", "outcome"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Cache lookups; hit ratio = rate(result=\"hit\") / rate(all)",
+    ["cache", "result"]
+)
+
+@contextmanager
+def track_upstream(upstream: str, operation: str):
+    """Time the enclosed call to an external dependency (outcome ok/error/cancelled)"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except asyncio.CancelledError:
+        # Hedged away or abandoned by the client: not a failure of the upstream
+        outcome = "cancelled"
+        raise
+    finally:
+        UPSTREAM_LATENCY.labels(upstream, operation, outcome).observe(time.perf_counter() - start)
+
+def record_cache(cache: str, hit: bool, count: int = 1):
+    if count:
+        CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc(count)
+
+class PrometheusMiddleware:
+    """
+    ASGI middleware recording latency and in-flight requests per route
+
+    Requests are labelled with the route template ("/api/search/{id}"),
+    never the raw path, so label cardinality stays bounded. The template
+    comes from the route the app picked (scope["route"]) plus the prefix
+    it was included under, and is remembered per (method, path). Routes
+    inside included routers only resolve while routing, so the in-flight
+    gauge of a path not seen before is matched against templates already
+    learned.
+    """
+
+    MAX_PATHS = 10_000
+
+    def __init__(self, app):
+        self.app = app
+        self._templates: dict = {}
+        self._learned: dict = {}  # template -> compiled path regex
+        self._children: dict = {}
+
+    @staticmethod
+    def _route_path(scope) -> str:
+        path, root = scope["path"], scope.get("root_path", "")
+        return path[len(root):] if root and path.startswith(root) else path
+
+    def _guess(self, scope) -> str:
+        """Template before routing: remembered, learned, or a top-level route"""
+        template = self._templates.get((scope["method"], scope["path"]))
+        if template is not None:
+            return template
+        path = self._route_path(scope)
+        for template, regex in self._learned.items():
+            if regex.match(path):
+                return template
+        template = "<unmatched>"
+        for route in scope["app"].routes:
+            route_path = getattr(route, "path", None)
+            if route_path is None:  # Included routers resolve their routes while routing
+                continue
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route_path
+            if match == Match.PARTIAL and template == "<unmatched>":
+                template = route_path
+        return template
+
+    def _routed(self, scope) -> str | None:
+        """Template of the route that handled the request, prefix included"""
+        route = scope.get("route")
+        regex = getattr(route, "path_regex", None)
+        if regex is None:
+            return None
+        path = self._route_path(scope)
+        # A route from an included router matches only the part after the include prefix
+        for start in (i for i, char in enumerate(path) if char == "/"):
+            if regex.match(path[start:]):
+                template = path[:start] + route.path
+                if template not in self._learned:
+                    self._learned[template] = compile_path(template)[0]
+                return template
+        return route.path
+
+    def _remember(self, scope, template: str):
+        if len(self._templates) >= self.MAX_PATHS:
+            self._templates.clear()
+        self._templates[(scope["method"], scope["path"])] = template
+
+    def _child(self, metric, *labels):
+        """metric.labels(...) without its lock on the hot path"""
+        child = self._children.get((metric, labels))
+        if child is None:
+            child = self._children[(metric, labels)] = metric.labels(*map(str, labels))
+        return child
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        guess = self._guess(scope)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = self._child(REQUESTS_IN_PROGRESS, method, guess)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = self._routed(scope) or guess
+            if self._templates.get((method, scope["path"])) != route:
+                self._remember(scope, route)
+            self._child(REQUEST_LATENCY, method, route, status).observe(time.perf_counter() - start)
+            in_progress.dec()
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Prometheus text format; aggregates all workers when PROMETHEUS_MULTIPROC_DIR is set"""
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
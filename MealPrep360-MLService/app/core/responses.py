@@ -0,0 +1,30 @@
+"""Fast JSON responses"""
+from fastapi.responses import JSONResponse
+from bson import ObjectId
+from decimal import Decimal
+import numpy as np
+import orjson
+
+def _default(value):
+    """Types orjson does not serialize natively"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+class ORJSONResponse(JSONResponse):
+    """
+    orjson-rendered response that is safe for Mongo/numpy values
+    Return it directly from a route to skip FastAPI's jsonable_encoder pass
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
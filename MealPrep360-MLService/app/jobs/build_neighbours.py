@@ -0,0 +1,138 @@
+"""
+Batch job: precompute the "similar recipes" neighbour table
+
+    python -m app.jobs.build_neighbours           # incremental when a table exists
+    python -m app.jobs.build_neighbours --full    # recompute every list
+
+Reads the latest search index snapshot (or fits one from MongoDB) and writes
+NEIGHBOURS_PATH, which running services pick up on their next sync tick.
+Schedule incremental runs frequently and a --full run nightly: incremental
+runs only recompute recipes changed since the last build.
+"""
+import argparse
+from datetime import datetime
+from typing import Optional
+import time
+
+import numpy as np
+from loguru import logger
+from pymongo import MongoClient
+
+from app.core.config import settings
+from app.services.index_store import index_store
+from app.services.neighbours import NeighbourTable, compute_neighbours, neighbour_store
+from app.services.projection import MONGO_PROJECTION, RecipeColumns
+from app.services.search_engine import IndexSnapshot, SearchEngine
+
+def load_snapshot(db) -> tuple[IndexSnapshot, Optional[datetime]]:
+    """(snapshot, synced_at): the newest updatedAt the snapshot includes, if known"""
+    loaded = index_store.load()
+    if loaded:
+        return loaded
+
+    logger.info("No index snapshot found, fitting from MongoDB")
+    synced_at = datetime.utcnow()  # Anything updated later is read again next run
+    # Streamed straight into columns, one cursor batch resident at a time
+    columns = RecipeColumns.from_documents(
+        db.recipes.find({}, MONGO_PROJECTION).batch_size(settings.INDEX_BATCH_SIZE)
+    )
+    return SearchEngine()._fit(columns, version=1), synced_at
+
+def carry_over(
+    previous: NeighbourTable,
+    snapshot: IndexSnapshot,
+    ids: np.ndarray,
+    changed: np.ndarray,
+    width: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Previous lists re-numbered to the snapshot, minus deleted/changed neighbours
+    Returns (kept_rows, kept_scores, refresh): `changed` plus every row that
+    lost a neighbour, whose list must be recomputed to be refilled (merging
+    in the changed rows only brings back those that still rank)
+    """
+    n = len(ids)
+    width = min(width, max(n - 1, 0))  # As compute_neighbours clamps it
+    kept_rows = np.full((n, width), -1, dtype=np.int32)
+    kept_scores = np.full((n, width), -np.inf, dtype=np.float32)
+
+    old_to_new = np.array([snapshot.id_to_row.get(str(i), -1) for i in previous.ids], dtype=np.int64)
+    new_to_old = np.array([previous.id_to_row.get(str(i), -1) for i in ids], dtype=np.int64)
+
+    rows = np.flatnonzero(new_to_old >= 0)
+    old_neighbours = previous.neighbours[new_to_old[rows]]
+    mapped = np.where(old_neighbours >= 0, old_to_new[np.maximum(old_neighbours, 0)], -1)
+    invalid = (mapped < 0) | changed[np.maximum(mapped, 0)]
+
+    refresh = changed.copy()
+    refresh[rows[(invalid & (old_neighbours >= 0)).any(axis=1)]] = True
+    # Recomputed rows are merged back into the lists they still rank in
+    invalid |= refresh[np.maximum(mapped, 0)]
+
+    scores = previous.scores[new_to_old[rows]].astype(np.float32)
+    mapped[invalid] = -1
+    scores[invalid] = -np.inf
+
+    kept_rows[rows] = mapped
+    kept_scores[rows] = scores
+    return kept_rows, kept_scores, refresh
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="Ignore the previous table")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    db = MongoClient(settings.MONGODB_URI)[settings.MONGODB_DB_NAME]
+
+    snapshot, synced_at = load_snapshot(db)
+    # The table is as fresh as the snapshot, not this run: the next incremental
+    # run must revisit recipes changed after the snapshot was synced (all of
+    # them when that is unknown)
+    built_at = synced_at or datetime.min
+    ids = np.array(snapshot.columns.ids)
+    width = min(settings.NEIGHBOURS_PER_RECIPE, max(len(ids) - 1, 0))
+
+    previous = None if args.full else neighbour_store.load()
+    if previous is not None and previous.width != width:
+        previous = None
+
+    changed_rows = kept_rows = kept_scores = None
+    if previous is not None:
+        changed_ids = {
+            str(doc["_id"])
+            for doc in db.recipes.find({"updatedAt": {"$gt": previous.built_at}}, {"_id": 1})
+        }
+        changed_ids |= set(ids.tolist()) - set(previous.id_to_row)
+
+        changed = np.zeros(len(ids), dtype=bool)
+        changed[[snapshot.id_to_row[i] for i in changed_ids if i in snapshot.id_to_row]] = True
+
+        if changed.sum() <= settings.NEIGHBOURS_FULL_REBUILD_RATIO * len(ids):
+            kept_rows, kept_scores, refresh = carry_over(previous, snapshot, ids, changed, width)
+            changed_rows = np.flatnonzero(refresh)
+            logger.info(f"Incremental neighbour refresh: {len(changed_rows)} changed recipes")
+
+    if changed_rows is None:
+        logger.info(f"Full neighbour build: {len(ids)} recipes")
+
+    neighbours, scores = compute_neighbours(
+        snapshot.recipe_vectors,
+        width,
+        memory_mb=settings.NEIGHBOURS_MEMORY_MB,
+        changed_rows=changed_rows,
+        kept_rows=kept_rows,
+        kept_scores=kept_scores
+    )
+
+    neighbour_store.save(NeighbourTable(
+        ids=ids,
+        neighbours=neighbours,
+        scores=scores,
+        built_at=built_at,
+        index_version=snapshot.version
+    ))
+    logger.info(f"Neighbour table done in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Batch job: train the personalized recommender (implicit-feedback ALS)
+
+    python -m app.jobs.train_recommender
+
+Builds a users x recipes weight matrix from saved recipes (`userrecipes`)
+and meal plans (`mealplans`), trains user/item factors and writes
+RECOMMENDER_MODEL_PATH, which running services pick up on their next sync tick.
+Recipe `views`/`saves` counters are aggregates without a user, so they only
+feed the cold-start popularity ranking.
+"""
+from collections import defaultdict
+from datetime import datetime
+import time
+
+import numpy as np
+from loguru import logger
+from pymongo import MongoClient
+from scipy import sparse
+
+from app.core.config import settings
+from app.services.recommender import FactorModel, factor_model_store, train_als
+
+# Interaction weights (summed per user/recipe pair)
+MEAL_PLAN_STATUS_WEIGHTS = {
+    "planned": 2.0,
+    "cooked": 4.0,
+    "frozen": 4.0,
+    "consumed": 4.0,
+    "skipped": 0.0,
+}
+
+def collect_interactions(db) -> dict:
+    """{(user_id, recipe_id): weight}"""
+    weights = defaultdict(float)
+
+    for doc in db.userrecipes.find({}, {"userId": 1, "savedRecipes.recipeId": 1}):
+        for saved in doc.get("savedRecipes", []):
+            if saved.get("recipeId"):
+                weights[(str(doc["userId"]), str(saved["recipeId"]))] += settings.RECOMMENDER_SAVE_WEIGHT
+
+    for doc in db.mealplans.find({}, {"userId": 1, "days.recipeId": 1, "days.status": 1}):
+        for day in doc.get("days", []):
+            if day.get("recipeId"):
+                weight = MEAL_PLAN_STATUS_WEIGHTS.get(day.get("status", "planned"), 2.0)
+                if weight:
+                    weights[(str(doc["userId"]), str(day["recipeId"]))] += weight
+
+    return weights
+
+def main():
+    started = time.perf_counter()
+    db = MongoClient(settings.MONGODB_URI)[settings.MONGODB_DB_NAME]
+
+    weights = collect_interactions(db)
+    live_recipes = {str(doc["_id"]): doc for doc in db.recipes.find({}, {"_id": 1, "views": 1, "saves": 1})}
+    weights = {pair: w for pair, w in weights.items() if pair[1] in live_recipes}
+    if not weights:
+        logger.warning("No interactions found, nothing to train")
+        return
+
+    user_ids = np.array(sorted({u for u, _ in weights}))
+    item_ids = np.array(sorted(live_recipes))
+    user_rows = {u: i for i, u in enumerate(user_ids)}
+    item_rows = {r: i for i, r in enumerate(item_ids)}
+
+    pairs = list(weights.items())
+    interactions = sparse.csr_matrix(
+        (
+            np.array([w for _, w in pairs], dtype=np.float64),
+            (
+                np.array([user_rows[u] for (u, _), _ in pairs]),
+                np.array([item_rows[r] for (_, r), _ in pairs])
+            )
+        ),
+        shape=(len(user_ids), len(item_ids))
+    )
+    logger.info(f"Training on {interactions.nnz} interactions ({len(user_ids)} users x {len(item_ids)} recipes)")
+
+    user_factors, item_factors = train_als(
+        interactions,
+        factors=settings.ALS_FACTORS,
+        regularization=settings.ALS_REGULARIZATION,
+        alpha=settings.ALS_ALPHA,
+        iterations=settings.ALS_ITERATIONS
+    )
+
+    popularity = np.asarray(interactions.sum(axis=0)).ravel()
+    popularity += np.array([
+        (live_recipes[r].get("saves") or 0) + 0.1 * (live_recipes[r].get("views") or 0)
+        for r in item_ids
+    ], dtype=np.float64)
+
+    factor_model_store.save(FactorModel(
+        user_ids=user_ids,
+        item_ids=item_ids,
+        user_factors=user_factors,
+        item_factors=item_factors,
+        seen=interactions,
+        popular=np.argsort(-popularity, kind="stable")[:1000].astype(np.int32),
+        trained_at=datetime.utcnow()
+    ))
+    logger.info(f"Recommender trained in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -4,19 +4,48 @@ ML-powered recipe search and recommendations
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from loguru import logger
 import sys
 
 from app.core.config import settings
+from app.core.metrics import PrometheusMiddleware, metrics_endpoint
+from app.core.database import db_manager
+from app.core.responses import ORJSONResponse
 from app.routers import search, recommendations
+from app.services.index_sync import index_sync
+from app.services.query_cache import query_cache
+from app.services.search_engine import search_engine
+from app.services.shards import shard_pool
 
 logger.remove()
 logger.add(sys.stdout, level="INFO")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifespan manager"""
+    await db_manager.connect()
+    if settings.ENABLE_SEARCH_CACHE:
+        await query_cache.connect()
+    if settings.SEARCH_SHARDS > 1:
+        shard_pool.start()
+    
+    # Build the search index once; deltas are applied in the background
+    await index_sync.start()
+    
+    yield
+    
+    await index_sync.stop()
+    shard_pool.stop()
+    await query_cache.disconnect()
+    await db_manager.disconnect()
+
 app = FastAPI(
     title="MealPrep360 ML Service",
     description="ML-powered search and recommendations",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -27,14 +56,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Metrics
+app.add_middleware(PrometheusMiddleware)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
 app.include_router(search.router, prefix="/api/search", tags=["search"])
 app.include_router(recommendations.router, prefix="/api/recommendations", tags=["recommendations"])
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "ml", "version": "1.0.0"}
+    snapshot = search_engine.snapshot
+    return {
+        "status": "healthy",
+        "service": "ml",
+        "version": "1.0.0",
+        "index": {
+            "ready": snapshot is not None,
+            "dense": search_engine.has_dense,
+            "version": search_engine.version,
+            "recipes": snapshot.size if snapshot else 0
+        },
+        "search_cache": query_cache.stats() if settings.ENABLE_SEARCH_CACHE else None
+    }
 
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8004, reload=True)
-
@@ -0,0 +1,35 @@
+"""Request models for the ML service"""
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+class SearchFilters(BaseModel):
+    """Facet filters; repeat values to match any of them (dietary requires all)"""
+    cuisine: Optional[List[str]] = None
+    category: Optional[List[str]] = None
+    season: Optional[List[str]] = None
+    difficulty: Optional[List[str]] = None
+    dietary: Optional[List[str]] = None
+    max_prep_time: Optional[int] = Field(None, ge=0, description="Minutes")
+
+class BatchSearchRequest(BaseModel):
+    """Many search queries resolved in one call"""
+    queries: List[str] = Field(..., min_length=1, max_length=200)
+    limit: int = Field(default=10, ge=1, le=50)
+    mode: str = Field(default="lexical", pattern="^(lexical|semantic|hybrid)$")
+    filters: Optional[SearchFilters] = None
+    fields: Optional[List[str]] = Field(default=None, description="Projected fields per hit")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "queries": ["chicken soup", "vegetarian chili", "beef stew"],
+                "limit": 3,
+                "filters": {"max_prep_time": 30}
+            }
+        }
+
+class BatchSimilarRequest(BaseModel):
+    """Similar recipes for many recipes in one call"""
+    recipe_ids: List[str] = Field(..., min_length=1, max_length=200)
+    limit: int = Field(default=5, ge=1, le=50)
+    fields: Optional[List[str]] = Field(default=None, description="Projected fields per hit")
@@ -1,33 +1,156 @@
 """Recommendation endpoints"""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from loguru import logger
+from typing import Optional
 
-from app.core.database import db_manager
+from app.core.responses import ORJSONResponse
+from app.models.schemas import BatchSimilarRequest
+from app.services.neighbours import neighbour_store
+from app.services.projection import parse_fields
+from app.services.recommender import factor_model_store
 from app.services.search_engine import search_engine
 
 router = APIRouter()
 
+FIELDS_QUERY = Query(None, description="Comma-separated fields per hit, e.g. title,thumbnail")
+
+def _projection(fields) -> tuple:
+    try:
+        return parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/recipe/{recipe_id}")
-async def get_similar_recipes(recipe_id: str, limit: int = 5):
+async def get_similar_recipes(recipe_id: str, limit: int = 5, fields: Optional[str] = FIELDS_QUERY):
     """
     Get recipes similar to a given recipe
     "You might also like..."
+    
+    Served from the precomputed neighbour table; recipes added since the
+    last batch run fall back to a live similarity query.
     """
+    snapshot = search_engine.snapshot
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Search index is still building")
+    projected = _projection(fields)
+    
     try:
-        recipes_collection = db_manager.get_collection("recipes")
-        all_recipes = await recipes_collection.find({}).to_list(length=10000)
+        table = neighbour_store.table
+        hits = table.lookup(recipe_id, limit) if table and limit <= table.width else None
         
-        await search_engine.index_recipes(all_recipes)
+        if hits is not None:
+            source = "precomputed"
+            results = []
+            for neighbour_id, score in hits:
+                row = snapshot.id_to_row.get(neighbour_id)
+                if row is None:  # Deleted since the table was built
+                    continue
+                results.append({
+                    **snapshot.document(row, projected),
+                    "similarity_score": score
+                })
+        else:
+            source = "live"
+            results = await search_engine.find_similar(recipe_id, k=limit, fields=projected)
         
-        results = await search_engine.find_similar(recipe_id, k=limit)
-        
-        return {
+        return ORJSONResponse({
             "recipe_id": recipe_id,
             "similar_recipes": results,
-            "count": len(results)
-        }
+            "count": len(results),
+            "source": source
+        })
         
     except Exception as e:
         logger.error(f"Recommendations error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/recipes/batch")
+async def get_similar_recipes_batch(request: BatchSimilarRequest):
+    """
+    Similar recipes for many recipes at once
+    Table hits are lookups; the rest are scored together in one sparse product
+    """
+    snapshot = search_engine.snapshot
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Search index is still building")
+    projected = _projection(request.fields)
+    
+    try:
+        table = neighbour_store.table
+        similar = {}
+        missing = []
+        for recipe_id in dict.fromkeys(request.recipe_ids):
+            hits = table.lookup(recipe_id, request.limit) if table and request.limit <= table.width else None
+            if hits is None:
+                missing.append(recipe_id)
+                continue
+            similar[recipe_id] = [
+                {**snapshot.document(row, projected), "similarity_score": score}
+                for row, score in (
+                    (snapshot.id_to_row.get(neighbour_id), score) for neighbour_id, score in hits
+                )
+                if row is not None
+            ]
+        
+        if missing:
+            similar.update(await search_engine.find_similar_batch(missing, k=request.limit, fields=projected))
+        
+        return ORJSONResponse({
+            "results": [
+                {
+                    "recipe_id": recipe_id,
+                    "similar_recipes": similar[recipe_id],
+                    "count": len(similar[recipe_id])
+                }
+                for recipe_id in request.recipe_ids
+            ],
+            "live_lookups": len(missing)
+        })
+        
+    except Exception as e:
+        logger.error(f"Batch recommendations error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/user/{user_id}")
+async def get_user_recommendations(
+    user_id: str,
+    limit: int = Query(10, ge=1, le=100),
+    exclude_seen: bool = True,
+    fields: Optional[str] = FIELDS_QUERY
+):
+    """
+    Personalized recipes for a user, from saves and meal plans
+    Users without history get the most popular recipes
+    """
+    snapshot = search_engine.snapshot
+    model = factor_model_store.model
+    if snapshot is None or model is None:
+        raise HTTPException(status_code=503, detail="Recommender is not ready")
+    projected = _projection(fields)
+    
+    try:
+        # Over-fetch a little in case recipes were deleted since training
+        hits, personalized = model.recommend(user_id, limit + 10, exclude_seen=exclude_seen)
+        
+        results = []
+        for recipe_id, score in hits:
+            row = snapshot.id_to_row.get(recipe_id)
+            if row is None:
+                continue
+            results.append({
+                **snapshot.document(row, projected),
+                "recommendation_score": score
+            })
+            if len(results) == limit:
+                break
+        
+        return ORJSONResponse({
+            "user_id": user_id,
+            "recommendations": results,
+            "count": len(results),
+            "personalized": personalized
+        })
+        
+    except Exception as e:
+        logger.error(f"User recommendations error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,8 +1,13 @@
 """Search endpoints"""
 from fastapi import APIRouter, HTTPException, Query
 from loguru import logger
+from typing import List, Optional
 
-from app.core.database import db_manager
+from app.core.config import settings
+from app.core.responses import ORJSONResponse
+from app.models.schemas import BatchSearchRequest
+from app.services.facets import CATEGORICAL_FACETS
+from app.services.projection import parse_fields
 from app.services.search_engine import search_engine
 
 router = APIRouter()
@@ -10,32 +15,145 @@ router = APIRouter()
 @router.get("/recipes")
 async def search_recipes(
     q: str = Query(..., min_length=2),
-    limit: int = Query(10, ge=1, le=50)
+    limit: int = Query(10, ge=1, le=50),
+    mode: str = Query("lexical", pattern="^(lexical|semantic|hybrid)$"),
+    cuisine: Optional[List[str]] = Query(None),
+    category: Optional[List[str]] = Query(None),
+    season: Optional[List[str]] = Query(None),
+    difficulty: Optional[List[str]] = Query(None),
+    dietary: Optional[List[str]] = Query(None, description="All listed values must match"),
+    max_prep_time: Optional[int] = Query(None, ge=0, description="Minutes"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields per hit, e.g. title,thumbnail")
 ):
     """
     Semantic search for recipes
     Better than basic text matching!
+    
+    Repeat a filter to match any of several values (e.g. cuisine=Italian&cuisine=Mexican).
+    Hits carry a compact projection (id, title, thumbnail, facets), never the full document.
     """
+    if not search_engine.is_ready:
+        raise HTTPException(status_code=503, detail="Search index is still building")
+    # Semantic and hybrid searches are answered lexically until the embeddings are built
+    served = search_engine.serving_mode(mode)
+    if served is None:
+        raise HTTPException(status_code=400, detail=f"{mode.title()} search is not available")
+    mode = served
+    
+    filters = {
+        "cuisine": cuisine,
+        "category": category,
+        "season": season,
+        "difficulty": difficulty,
+        "dietary": dietary,
+        "max_prep_time": max_prep_time
+    }
+    filters = {name: value for name, value in filters.items() if value is not None}
+    
     try:
-        # Get all recipes (in production, use caching)
-        recipes_collection = db_manager.get_collection("recipes")
-        all_recipes = await recipes_collection.find({}).to_list(length=10000)
-        
-        # Build/rebuild index
-        await search_engine.index_recipes(all_recipes)
-        
-        # Search
-        results = await search_engine.search(q, k=limit)
+        projected = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        # Search the resident index (kept in sync by index_sync)
+        results = await search_engine.search(q, k=limit, mode=mode, filters=filters, fields=projected)
         
-        logger.info(f"Search for '{q}' returned {len(results)} results")
+        logger.info(f"Search ({mode}) for '{q}' returned {len(results)} results")
         
-        return {
+        return ORJSONResponse({
             "query": q,
+            "mode": mode,
+            "filters": filters,
             "results": results,
-            "total": len(results)
-        }
+            "total": len(results),
+            "index_version": search_engine.version
+        })
         
     except Exception as e:
         logger.error(f"Search error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/recipes/batch")
+async def search_recipes_batch(request: BatchSearchRequest):
+    """
+    Resolve many queries in one call (e.g. one per meal-plan slot)
+    All queries are vectorized together and scored with a single sparse product
+    """
+    if not search_engine.is_ready:
+        raise HTTPException(status_code=503, detail="Search index is still building")
+    mode = search_engine.serving_mode(request.mode)
+    if mode is None:
+        raise HTTPException(status_code=400, detail=f"{request.mode.title()} search is not available")
+    
+    filters = request.filters.model_dump(exclude_none=True) if request.filters else {}
+    
+    try:
+        projected = parse_fields(request.fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        batches = await search_engine.search_batch(
+            request.queries,
+            k=request.limit,
+            mode=mode,
+            filters=filters,
+            fields=projected
+        )
+        
+        logger.info(f"Batch search ({mode}) for {len(request.queries)} queries")
+        
+        return ORJSONResponse({
+            "mode": mode,
+            "filters": filters,
+            "results": [
+                {"query": query, "results": results, "total": len(results)}
+                for query, results in zip(request.queries, batches)
+            ],
+            "index_version": search_engine.version
+        })
+        
+    except Exception as e:
+        logger.error(f"Batch search error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/autocomplete")
+async def autocomplete(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=20)
+):
+    """
+    Typeahead suggestions (recipe titles, tags, ingredients) for each keystroke
+    Matches any word start, tolerates typos, ranks by popularity
+    """
+    snapshot = search_engine.snapshot
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Search index is still building")
+    if snapshot.autocomplete is None:
+        raise HTTPException(status_code=400, detail="Autocomplete is not enabled")
+    
+    try:
+        suggestions = snapshot.autocomplete.suggest(q, limit, settings.AUTOCOMPLETE_FUZZY_PENALTY)
+        
+        return ORJSONResponse({
+            "query": q,
+            "suggestions": suggestions,
+            "index_version": snapshot.version
+        })
+        
+    except Exception as e:
+        logger.error(f"Autocomplete error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/facets")
+async def list_facets():
+    """Known values for each search filter"""
+    snapshot = search_engine.snapshot
+    if snapshot is None or snapshot.facets is None:
+        raise HTTPException(status_code=503, detail="Search index is still building")
+    
+    return {
+        facet: snapshot.facets.values(facet)
+        for facet in CATEGORICAL_FACETS
+    }
@@ -0,0 +1,421 @@
+"""Typo-tolerant prefix autocomplete over recipe titles, tags and ingredients"""
+from dataclasses import dataclass, field, replace
+from collections import OrderedDict
+from itertools import product
+import numpy as np
+from typing import Iterable, Optional
+import bisect
+import re
+
+from app.services.projection import RecipeColumns
+from app.services.ranking import top_k
+
+KIND_TITLE = 1
+KIND_TAG = 2
+KIND_INGREDIENT = 4
+KIND_NAMES = ((KIND_TITLE, "title"), (KIND_TAG, "tag"), (KIND_INGREDIENT, "ingredient"))
+
+# Words a suggestion may not be completed from the middle of
+STOP_WORDS = {"a", "an", "and", "de", "in", "of", "on", "or", "the", "to", "with"}
+MAX_WORD_STARTS = 6
+
+# SymSpell: deletes are generated from the first PREFIX_LENGTH characters only
+PREFIX_LENGTH = 7
+MIN_FUZZY_LENGTH = 4
+
+# Ranges wider than this are ranked once and memoized per index
+HEAVY_RANGE = 512
+MEMO_DEPTH = 50
+MEMO_ENTRIES = 2048
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+def normalize_phrase(text: str) -> str:
+    return " ".join(_NON_WORD.sub(" ", str(text).lower()).split())
+
+def max_edits(length: int, limit: int = 2) -> int:
+    """Edits tolerated for a token: none below 4 characters, 1 up to 5, then 2"""
+    if length < MIN_FUZZY_LENGTH:
+        return 0
+    return min(limit, 1 if length < 6 else 2)
+
+def _deletes(word: str, distance: int) -> set:
+    """`word` plus every string reachable by deleting up to `distance` characters"""
+    found = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        found |= frontier
+    return found
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal-string-alignment distance, or limit + 1 once it is exceeded"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        best = i
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+            best = min(best, current[j])
+        if best > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+def recipe_contributions(
+    title: Optional[str],
+    tags: Iterable[str],
+    ingredients: Iterable[str],
+    popularity: float
+) -> list:
+    """[(phrase, display, kind, weight)] one recipe adds to the suggestion table"""
+    contributions = []
+    for display, kind in (
+        [(title, KIND_TITLE)] if title else []
+    ) + [(t, KIND_TAG) for t in tags] + [(i, KIND_INGREDIENT) for i in ingredients]:
+        phrase = normalize_phrase(display)
+        if phrase:
+            contributions.append((phrase, display, kind, popularity))
+    return contributions
+
+def column_contributions(columns: RecipeColumns, rows: Iterable[int]) -> list:
+    """Contributions of the given column-store rows (popularity from saves/views)"""
+    saves = np.maximum(np.asarray(columns.numbers["saves"]), 0)
+    views = np.maximum(np.asarray(columns.numbers["views"]), 0)
+    contributions = []
+    for row in rows:
+        contributions.extend(recipe_contributions(
+            columns.text["title"][row],
+            columns.lists["tags"][row],
+            columns.lists["ingredientNames"][row],
+            1.0 + float(saves[row]) + 0.1 * float(views[row])
+        ))
+    return contributions
+
+def _word_starts(phrase: str) -> list:
+    """Offsets a prefix may match at: the phrase start plus later content words"""
+    starts, offset = [], 0
+    for word in phrase.split(" "):
+        if not starts or (word not in STOP_WORDS and len(starts) < MAX_WORD_STARTS):
+            starts.append(offset)
+        offset += len(word) + 1
+    return starts
+
+def _word_deletes(word: str, limit: int) -> set:
+    """Deletes of every prefix (MIN_FUZZY_LENGTH..PREFIX_LENGTH) a typed token may be compared with"""
+    keys = set()
+    for length in range(MIN_FUZZY_LENGTH, min(len(word), PREFIX_LENGTH) + 1):
+        keys |= _deletes(word[:length], max_edits(length, limit))
+    return keys
+
+@dataclass(frozen=True)
+class AutocompleteIndex:
+    """
+    Suggestions (distinct normalized titles, tags and ingredient names) with
+    popularity weights, searchable by prefix at any content-word start.
+
+    Prefix lookup: `entry_phrase`/`entry_offset` list every (phrase, word
+    start) sorted by the suffix text, so a prefix is one bisect to a
+    contiguous range. Typos: a SymSpell-style table of hashed deletes over
+    the word vocabulary maps a misspelt token to candidate words, which are
+    verified with a bounded edit distance.
+
+    Updates only adjust weights and add new phrases/words to small "fresh"
+    overlays; `compact()` folds them in once they grow.
+    """
+    phrases: list              # normalized text per phrase id
+    display: list              # original casing per phrase id
+    kinds: np.ndarray          # (P,) uint8 KIND_* bitmask
+    weights: np.ndarray        # (P,) float64 popularity, 0 once gone
+    phrase_ids: dict           # normalized text -> phrase id
+    entry_phrase: np.ndarray   # (E,) int32, sorted by suffix
+    entry_offset: np.ndarray   # (E,) int32
+    words: list                # vocabulary, by word id
+    word_counts: dict          # word -> number of live phrases using it
+    delete_hashes: np.ndarray  # (D,) int64 sorted hashed deletes
+    delete_words: np.ndarray   # (D,) int32 word ids
+    edit_limit: int = 2
+    fresh_entries: list = field(default_factory=list)  # sorted [(suffix, phrase id)]
+    fresh_deletes: dict = field(default_factory=dict)  # hashed delete -> [word id]
+    _memo: OrderedDict = field(default_factory=OrderedDict, repr=False, compare=False)
+
+    @property
+    def fresh_size(self) -> int:
+        return len(self.fresh_entries) + len(self.fresh_deletes)
+
+    @classmethod
+    def build(cls, contributions: Iterable, edit_limit: int = 2) -> "AutocompleteIndex":
+        phrase_ids, phrases, display, kinds, weights = {}, [], [], [], []
+        for phrase, shown, kind, weight in contributions:
+            pid = phrase_ids.get(phrase)
+            if pid is None:
+                pid = phrase_ids[phrase] = len(phrases)
+                phrases.append(phrase)
+                display.append(shown)
+                kinds.append(0)
+                weights.append(0.0)
+            kinds[pid] |= kind
+            weights[pid] += weight
+        return cls._freeze(
+            phrases, display,
+            np.array(kinds, dtype=np.uint8),
+            np.array(weights, dtype=np.float64),
+            edit_limit
+        )
+
+    @classmethod
+    def _freeze(
+        cls,
+        phrases: list,
+        display: list,
+        kinds: np.ndarray,
+        weights: np.ndarray,
+        edit_limit: int
+    ) -> "AutocompleteIndex":
+        """Sorted entry and delete tables for the live phrases"""
+        live = np.flatnonzero(weights > 0)
+        phrases = [phrases[i] for i in live]
+        display = [display[i] for i in live]
+        kinds, weights = kinds[live], weights[live]
+
+        entries = sorted(
+            (phrase[offset:], pid, offset)
+            for pid, phrase in enumerate(phrases)
+            for offset in _word_starts(phrase)
+        )
+
+        word_counts = {}
+        for phrase in phrases:
+            for word in set(phrase.split(" ")):
+                word_counts[word] = word_counts.get(word, 0) + 1
+        words = sorted(word_counts)
+
+        hashes, owners = [], []
+        for wid, word in enumerate(words):
+            for key in _word_deletes(word, edit_limit):
+                hashes.append(hash(key))
+                owners.append(wid)
+        hashes = np.array(hashes, dtype=np.int64)
+        order = np.argsort(hashes, kind="stable")
+
+        return cls(
+            phrases=phrases,
+            display=display,
+            kinds=kinds,
+            weights=weights,
+            phrase_ids={phrase: pid for pid, phrase in enumerate(phrases)},
+            entry_phrase=np.array([e[1] for e in entries], dtype=np.int32),
+            entry_offset=np.array([e[2] for e in entries], dtype=np.int32),
+            words=words,
+            word_counts=word_counts,
+            delete_hashes=hashes[order],
+            delete_words=np.array(owners, dtype=np.int32)[order],
+            edit_limit=edit_limit
+        )
+
+    def compact(self) -> "AutocompleteIndex":
+        """Fold the fresh overlays into the sorted tables and drop dead phrases"""
+        return self._freeze(self.phrases, self.display, self.kinds, self.weights, self.edit_limit)
+
+    def apply(self, removed: list, added: list) -> "AutocompleteIndex":
+        """New index with contributions subtracted/added (copy-on-write)"""
+        phrases, display = list(self.phrases), list(self.display)
+        kinds, weights = self.kinds.copy(), self.weights.copy()
+        phrase_ids = dict(self.phrase_ids)
+        word_counts = dict(self.word_counts)
+        before = {}
+
+        for phrase, _, _, weight in removed:
+            pid = phrase_ids.get(phrase)
+            if pid is not None:
+                before.setdefault(pid, weights[pid])
+                weights[pid] -= weight
+
+        appended = []
+        for phrase, shown, _, _ in added:
+            if phrase not in phrase_ids:
+                phrase_ids[phrase] = len(phrases)
+                appended.append(len(phrases))
+                phrases.append(phrase)
+                display.append(shown)
+        if appended:
+            kinds = np.concatenate([kinds, np.zeros(len(appended), dtype=np.uint8)])
+            weights = np.concatenate([weights, np.zeros(len(appended))])
+
+        for phrase, _, kind, weight in added:
+            pid = phrase_ids[phrase]
+            before.setdefault(pid, weights[pid])
+            kinds[pid] |= kind
+            weights[pid] += weight
+
+        new_words = set()
+        for pid, old in before.items():
+            if weights[pid] < 1e-9:
+                weights[pid] = 0.0
+            alive_before, alive_now = old > 0, weights[pid] > 0
+            if alive_before == alive_now:
+                continue
+            for word in set(phrases[pid].split(" ")):
+                count = word_counts.get(word, 0) + (1 if alive_now else -1)
+                word_counts[word] = count
+                if alive_now and count == 1 and word not in self.word_counts:
+                    new_words.add(word)
+
+        fresh_entries = list(self.fresh_entries)
+        for pid in appended:
+            for offset in _word_starts(phrases[pid]):
+                bisect.insort(fresh_entries, (phrases[pid][offset:], pid))
+
+        words = self.words
+        fresh_deletes = {key: list(wids) for key, wids in self.fresh_deletes.items()}
+        if new_words:
+            words = list(words)
+            for word in sorted(new_words):
+                wid = len(words)
+                words.append(word)
+                for key in _word_deletes(word, self.edit_limit):
+                    fresh_deletes.setdefault(hash(key), []).append(wid)
+
+        return replace(
+            self,
+            phrases=phrases,
+            display=display,
+            kinds=kinds,
+            weights=weights,
+            phrase_ids=phrase_ids,
+            words=words,
+            word_counts=word_counts,
+            fresh_entries=fresh_entries,
+            fresh_deletes=fresh_deletes,
+            _memo=OrderedDict()
+        )
+
+    def _suffix(self, entry: int) -> str:
+        return self.phrases[self.entry_phrase[entry]][self.entry_offset[entry]:]
+
+    def _prefix_phrases(self, prefix: str, depth: int) -> tuple[np.ndarray, np.ndarray]:
+        """Best `depth` live phrases with a word starting with `prefix`: (ids, weights)"""
+        end = prefix + "\uffff"
+        n = len(self.entry_phrase)
+        lo = bisect.bisect_left(range(n), prefix, key=self._suffix)
+        hi = bisect.bisect_left(range(lo, n), end, key=self._suffix) + lo
+
+        if hi - lo > HEAVY_RANGE and depth <= MEMO_DEPTH:
+            ids = self._memo.get(prefix)
+            if ids is None:
+                ids = self._rank(np.unique(self.entry_phrase[lo:hi]), MEMO_DEPTH)
+                self._memo[prefix] = ids
+                while len(self._memo) > MEMO_ENTRIES:
+                    self._memo.popitem(last=False)
+            ids = ids[:depth]
+        else:
+            ids = self._rank(np.unique(self.entry_phrase[lo:hi]), depth)
+
+        if self.fresh_entries:
+            start = bisect.bisect_left(self.fresh_entries, (prefix,))
+            stop = bisect.bisect_left(self.fresh_entries, (end,))
+            fresh = [pid for _, pid in self.fresh_entries[start:stop]]
+            if fresh:
+                ids = self._rank(np.unique(np.concatenate([ids, fresh]).astype(np.int64)), depth)
+
+        # Memoized/main-table ids may have lost all weight since
+        ids = ids[self.weights[ids] > 0]
+        return ids, self.weights[ids]
+
+    def _rank(self, ids: np.ndarray, depth: int) -> np.ndarray:
+        ids = ids.astype(np.int64)
+        return ids[top_k(self.weights[ids], depth)]
+
+    def _candidates(self, token: str) -> set:
+        keys = _deletes(token[:PREFIX_LENGTH], max_edits(len(token), self.edit_limit))
+        hashes = np.fromiter((hash(k) for k in keys), dtype=np.int64, count=len(keys))
+        lo = np.searchsorted(self.delete_hashes, hashes, side="left")
+        hi = np.searchsorted(self.delete_hashes, hashes, side="right")
+        wids = {int(w) for a, b in zip(lo, hi) for w in self.delete_words[a:b]}
+        for h in hashes:
+            wids.update(self.fresh_deletes.get(int(h), ()))
+        return wids
+
+    def corrections(self, token: str, partial: bool, limit: int = 3) -> list:
+        """
+        [(replacement, edits)] for a typed token, closest then most used
+        partial: the token is still being typed, so it is compared with word
+        prefixes and the replacement is that prefix
+        """
+        budget = max_edits(len(token), self.edit_limit)
+        if budget == 0:
+            return [(token, 0)]
+
+        found = {}
+        for wid in self._candidates(token):
+            word = self.words[wid]
+            if self.word_counts.get(word, 0) <= 0:
+                continue
+            if partial:
+                best = (budget + 1, word)
+                for length in range(max(1, len(token) - budget), min(len(word), len(token) + budget) + 1):
+                    distance = edit_distance(token, word[:length], budget)
+                    if distance < best[0]:
+                        best = (distance, word[:length])
+                distance, replacement = best
+            else:
+                distance, replacement = edit_distance(token, word, budget), word
+            if distance <= budget and distance < found.get(replacement, (budget + 1, 0))[0]:
+                found[replacement] = (distance, self.word_counts[word])
+
+        ranked = sorted(found.items(), key=lambda item: (item[1][0], -item[1][1]))
+        return [(replacement, distance) for replacement, (distance, _) in ranked[:limit]]
+
+    def suggest(self, text: str, limit: int = 10, fuzzy_penalty: float = 0.5) -> list:
+        """
+        Top suggestions for what has been typed so far
+        Exact prefix matches first; typo corrections fill the rest at
+        `fuzzy_penalty` ** edits of their popularity
+        """
+        query = normalize_phrase(text)
+        if not query:
+            return []
+        if text[-1:].isspace():
+            query += " "  # Last word is complete
+
+        scores = {}
+        ids, weights = self._prefix_phrases(query, limit)
+        for pid, weight in zip(ids.tolist(), weights.tolist()):
+            scores[pid] = (weight, 0)
+
+        if len(scores) < limit:
+            tokens = query.split()
+            complete = query.endswith(" ")
+            options = [
+                self.corrections(token, partial=(i == len(tokens) - 1 and not complete))
+                for i, token in enumerate(tokens)
+            ]
+            combos = sorted(
+                (sum(edits for _, edits in combo), combo) for combo in product(*options)
+            )
+            for edits, combo in combos[:8]:
+                if edits == 0:
+                    continue
+                corrected = " ".join(word for word, _ in combo) + (" " if complete else "")
+                ids, weights = self._prefix_phrases(corrected, limit)
+                for pid, weight in zip(ids.tolist(), weights.tolist()):
+                    score = weight * fuzzy_penalty ** edits
+                    if pid not in scores or score > scores[pid][0]:
+                        scores[pid] = (score, edits)
+
+        ranked = sorted(scores.items(), key=lambda item: -item[1][0])[:limit]
+        return [
+            {
+                "text": self.display[pid],
+                "kinds": [name for bit, name in KIND_NAMES if self.kinds[pid] & bit],
+                "score": round(score, 4),
+                "edits": edits
+            }
+            for pid, (score, edits) in ranked
+        ]
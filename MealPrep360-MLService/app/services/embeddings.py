@@ -0,0 +1,239 @@
+"""Dense recipe embeddings with an IVF approximate-nearest-neighbour index"""
+from dataclasses import dataclass
+import numpy as np
+from loguru import logger
+import threading
+from typing import Optional
+
+from app.core.config import settings
+from app.services.ranking import top_k
+
+def quantize(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Per-vector symmetric int8 quantization; returns (codes, scales)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def dequantize(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return codes.astype(np.float32) * scales[:, None]
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    iterations: int = 15,
+    sample_size: int = 50_000,
+    seed: int = 0
+) -> np.ndarray:
+    """Cosine k-means on a sample of unit vectors; returns unit centroids"""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample_size:
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        # Re-seed empty clusters with random points
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        norms[empty] = np.linalg.norm(sums[empty], axis=1)
+        centroids = sums / norms[:, None]
+
+    return centroids.astype(np.float32)
+
+@dataclass(frozen=True)
+class IVFIndex:
+    """
+    Inverted-file index over int8-quantized unit vectors
+    Vectors are stored grouped by their nearest centroid so each probed
+    list is a contiguous block: codes[offsets[c]:offsets[c + 1]].
+    """
+    centroids: np.ndarray  # (n_lists, dim) float32
+    codes: np.ndarray      # (n, dim) int8, grouped by list
+    scales: np.ndarray     # (n,) float32
+    rows: np.ndarray       # (n,) int64, index row of each stored vector
+    positions: np.ndarray  # (n,) int64, storage position of each index row
+    offsets: np.ndarray    # (n_lists + 1,) int64
+
+    @property
+    def size(self) -> int:
+        return len(self.rows)
+
+    @staticmethod
+    def n_lists_for(n: int) -> int:
+        return max(1, min(n, int(4 * np.sqrt(n))))
+
+    @classmethod
+    def build(
+        cls,
+        codes: np.ndarray,
+        scales: np.ndarray,
+        centroids: Optional[np.ndarray] = None
+    ) -> "IVFIndex":
+        """
+        Group vectors (given in row order) into lists
+        Pass existing centroids to re-assign without re-training
+        """
+        if centroids is None:
+            vectors = dequantize(codes, scales)
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            centroids = spherical_kmeans(vectors, cls.n_lists_for(len(codes)))
+
+        assignment = np.empty(len(codes), dtype=np.int64)
+        for start in range(0, len(codes), 65_536):
+            block = dequantize(codes[start:start + 65_536], scales[start:start + 65_536])
+            assignment[start:start + 65_536] = np.argmax(block @ centroids.T, axis=1)
+
+        order = np.argsort(assignment, kind="stable").astype(np.int64)
+        positions = np.empty_like(order)
+        positions[order] = np.arange(len(order))
+        counts = np.bincount(assignment, minlength=len(centroids))
+
+        return cls(
+            centroids=centroids,
+            codes=codes[order],
+            scales=scales[order],
+            rows=order,
+            positions=positions,
+            offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        )
+
+    def row_codes(self) -> tuple[np.ndarray, np.ndarray]:
+        """Codes and scales back in index row order"""
+        return self.codes[self.positions], self.scales[self.positions]
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        n_probe: int,
+        mask: Optional[np.ndarray] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Approximate top-k by inner product; returns (rows, scores) best first
+        mask: optional boolean filter over index rows, applied before scoring
+        """
+        if self.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = np.asarray(query, dtype=np.float32)
+        n_probe = min(n_probe, len(self.centroids))
+
+        if mask is not None:
+            allowed = np.flatnonzero(mask)
+            # Selective filter: scoring the allowed rows exactly is cheaper than probing
+            if allowed.size <= n_probe * self.size / len(self.centroids):
+                positions = self.positions[allowed]
+                scores = (self.codes[positions] @ query) * self.scales[positions]
+                best = top_k(scores, k)
+                return allowed[best], scores[best]
+
+        probes = top_k(self.centroids @ query, n_probe)
+
+        slices = [slice(self.offsets[c], self.offsets[c + 1]) for c in probes]
+        codes = np.concatenate([self.codes[s] for s in slices])
+        scales = np.concatenate([self.scales[s] for s in slices])
+        rows = np.concatenate([self.rows[s] for s in slices])
+
+        if mask is not None:
+            keep = mask[rows]
+            codes, scales, rows = codes[keep], scales[keep], rows[keep]
+
+        scores = (codes @ query) * scales
+        best = top_k(scores, k)
+        return rows[best], scores[best]
+
+@dataclass(frozen=True)
+class DenseOverlay:
+    """
+    An IVF index plus vectors appended since it was built, scanned exactly
+    Appended rows continue the base's numbering. The base stays as loaded
+    (memory-mapped), so deltas don't copy it; the overlay is folded into the
+    lists when the snapshot is merged
+    """
+    base: IVFIndex
+    codes: np.ndarray   # (m, dim) int8, rows base.size onwards
+    scales: np.ndarray  # (m,) float32
+
+    @property
+    def size(self) -> int:
+        return self.base.size + len(self.codes)
+
+    @property
+    def centroids(self) -> np.ndarray:
+        return self.base.centroids
+
+    def row_codes(self) -> tuple[np.ndarray, np.ndarray]:
+        codes, scales = self.base.row_codes()
+        return np.concatenate([codes, self.codes]), np.concatenate([scales, self.scales])
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        n_probe: int,
+        mask: Optional[np.ndarray] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """IVFIndex.search over the base, merged with an exact scan of the overlay"""
+        base_mask = None if mask is None else mask[:self.base.size]
+        rows, scores = self.base.search(query, k, n_probe, mask=base_mask)
+
+        query = np.asarray(query, dtype=np.float32)
+        extra_rows = self.base.size + np.arange(len(self.codes), dtype=np.int64)
+        extra_scores = (self.codes @ query) * self.scales
+        if mask is not None:
+            keep = mask[extra_rows]
+            extra_rows, extra_scores = extra_rows[keep], extra_scores[keep]
+
+        rows = np.concatenate([rows, extra_rows])
+        scores = np.concatenate([scores, extra_scores])
+        best = top_k(scores, k)
+        return rows[best], scores[best]
+
+class EmbeddingEncoder:
+    """CPU sentence-transformers encoder, loaded on first use"""
+
+    def __init__(self, model_name: str, batch_size: int = 64):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+        self.available = True
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+
+                self._model = SentenceTransformer(self.model_name, device="cpu")
+                logger.info(f"Loaded embedding model {self.model_name}")
+        return self._model
+
+    def encode(self, texts: list) -> np.ndarray:
+        """Batch-encode texts to unit-length float32 vectors"""
+        model = self._load()
+        return model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        ).astype(np.float32)
+
+    def try_encode(self, texts: list) -> Optional[np.ndarray]:
+        """encode(), but disable dense search instead of failing if the model is unavailable"""
+        if not self.available:
+            return None
+        try:
+            return self.encode(texts)
+        except Exception as e:
+            logger.warning(f"Embedding model unavailable: {e}. Semantic search disabled.")
+            self.available = False
+            return None
+
+# Singleton
+embedding_encoder = EmbeddingEncoder(settings.EMBEDDING_MODEL, batch_size=settings.EMBEDDING_BATCH_SIZE)
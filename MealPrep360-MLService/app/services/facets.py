@@ -0,0 +1,97 @@
+"""Bitmap facet indexes for filtering search candidates before scoring"""
+from dataclasses import dataclass
+import numpy as np
+from typing import Optional
+
+from app.services.projection import RecipeColumns
+
+# Facet name -> recipe field; dietary values are multi-valued
+CATEGORICAL_FACETS = {
+    "cuisine": "cuisine",
+    "category": "category",
+    "season": "season",
+    "difficulty": "difficulty",
+    "dietary": "dietaryInfo",
+}
+
+# Facets where every requested value must match (AND); others match any (OR)
+ALL_OF_FACETS = {"dietary"}
+
+NO_PREP_TIME = np.iinfo(np.int32).max
+
+def normalize_value(value) -> str:
+    return str(value).strip().lower().replace("_", " ").replace("-", " ")
+
+@dataclass(frozen=True)
+class FacetIndex:
+    """
+    One packed bitmap (np.packbits, 1 bit per index row) per facet value,
+    plus a dense prep-time column for range filters
+    """
+    size: int
+    bitmaps: dict  # facet -> {value: packed uint8 bitmap}
+    prep_time: np.ndarray  # (size,) int32, NO_PREP_TIME when missing
+
+    @classmethod
+    def build(cls, columns: RecipeColumns) -> "FacetIndex":
+        """Bitmaps straight from the column store (category codes, tag lists)"""
+        size = len(columns)
+        bitmaps = {}
+
+        for facet, field in CATEGORICAL_FACETS.items():
+            bits_by_value = {}
+            if field in columns.categories:
+                column = columns.categories[field]
+                codes = np.asarray(column.codes)
+                for code, raw in enumerate(column.values):
+                    value = normalize_value(raw)
+                    bits = bits_by_value.setdefault(value, np.zeros(size, dtype=bool))
+                    bits |= codes == code
+            else:
+                for row, values in enumerate(columns.lists[field]):
+                    for raw in values:
+                        value = normalize_value(raw)
+                        bits_by_value.setdefault(value, np.zeros(size, dtype=bool))[row] = True
+            bitmaps[facet] = {value: np.packbits(bits) for value, bits in bits_by_value.items()}
+
+        prep_time = np.asarray(columns.numbers["prepTime"]).astype(np.int32)
+        prep_time[prep_time < 0] = NO_PREP_TIME
+
+        return cls(size=size, bitmaps=bitmaps, prep_time=prep_time)
+
+    def values(self, facet: str) -> list:
+        """Known values of a facet (for UIs building filter menus)"""
+        return sorted(self.bitmaps.get(facet, {}))
+
+    def mask(self, filters: Optional[dict]) -> Optional[np.ndarray]:
+        """
+        Boolean row mask for the given filters, or None when nothing is filtered
+        filters: {facet: [values]} for categorical facets, plus "max_prep_time"
+        """
+        if not filters:
+            return None
+
+        packed = None
+        for facet, requested in filters.items():
+            if facet not in CATEGORICAL_FACETS or not requested:
+                continue
+            bitmaps = self.bitmaps[facet]
+            empty = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+            value_maps = [bitmaps.get(normalize_value(v), empty) for v in requested]
+
+            if facet in ALL_OF_FACETS:
+                combined = np.bitwise_and.reduce(value_maps)
+            else:
+                combined = np.bitwise_or.reduce(value_maps)
+            packed = combined if packed is None else packed & combined
+
+        mask = None
+        if packed is not None:
+            mask = np.unpackbits(packed, count=self.size).astype(bool)
+
+        max_prep_time = filters.get("max_prep_time")
+        if max_prep_time is not None:
+            in_range = self.prep_time <= max_prep_time
+            mask = in_range if mask is None else mask & in_range
+
+        return mask
@@ -0,0 +1,215 @@
+"""On-disk search index snapshots, loaded with numpy.memmap"""
+from scipy import sparse
+import numpy as np
+from loguru import logger
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+import fcntl
+import json
+import os
+import shutil
+import time
+
+from app.core.config import settings
+from app.services.embeddings import IVFIndex
+from app.services.facets import FacetIndex
+from app.services.projection import RecipeColumns
+from app.services.search_engine import IndexSnapshot, SearchEngine, build_autocomplete, layout_key
+
+# Bump when the layout below changes; older snapshots are ignored
+FORMAT_VERSION = 6
+
+DENSE_PARTS = ("centroids", "codes", "scales", "rows", "positions", "offsets")
+
+class IndexStore:
+    """
+    Versioned snapshot directory layout:
+
+        <root>/CURRENT                 name of the live snapshot
+        <root>/writer.lock             held (flock) by the one worker that writes snapshots
+        <root>/<name>/manifest.json    format/index version, content token, shapes, sync cursor
+        <root>/<name>/vocabulary.json  term -> column
+        <root>/<name>/idf.npy          IDF weights
+        <root>/<name>/data.npy         CSR data      (memmapped)
+        <root>/<name>/indices.npy      CSR indices   (memmapped)
+        <root>/<name>/indptr.npy       CSR indptr    (memmapped)
+        <root>/<name>/postings_*.npy   CSC posting lists, same three arrays (memmapped)
+        <root>/<name>/dense_*.npy      IVF lists and int8 codes (optional, memmapped)
+        <root>/<name>/columns.json     projected recipe ids/text/tags (facets and autocomplete are rebuilt from these)
+        <root>/<name>/category_*.npy   dictionary-encoded facet columns (memmapped)
+        <root>/<name>/number_*.npy     times, servings and popularity counters (memmapped)
+
+    Arrays are opened read-only with mmap_mode='r', so every worker on a node
+    maps the same page-cache pages instead of holding a private copy. Only
+    the writer saves (and prunes); the other workers load what it publishes.
+    """
+
+    def __init__(self, root: str, keep: int = 2):
+        self.root = Path(root)
+        self.keep = keep
+        self._writer_lock = None
+
+    @property
+    def is_writer(self) -> bool:
+        return self._writer_lock is not None
+
+    def acquire_writer(self) -> bool:
+        """Become the node's snapshot writer unless another worker is (released when this process exits)"""
+        if self.is_writer:
+            return True
+        self.root.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.root / "writer.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._writer_lock = lock_file
+        return True
+
+    def current_name(self) -> Optional[str]:
+        pointer = self.root / "CURRENT"
+        if not pointer.exists():
+            return None
+        return pointer.read_text().strip() or None
+
+    def save(self, snapshot: IndexSnapshot, synced_at: Optional[datetime] = None) -> str:
+        """
+        Write a snapshot to a temp dir and atomically publish it; returns its name
+        The delta overlay is merged first: files hold live rows only
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        snapshot = snapshot.merged()
+
+        name = f"v{snapshot.version}-{int(time.time() * 1000)}-{os.getpid()}"
+        tmp_dir = self.root / f".{name}.tmp"
+        tmp_dir.mkdir()
+
+        vectors = snapshot.recipe_vectors
+        np.save(tmp_dir / "data.npy", vectors.data)
+        np.save(tmp_dir / "indices.npy", vectors.indices)
+        np.save(tmp_dir / "indptr.npy", vectors.indptr)
+        np.save(tmp_dir / "postings_data.npy", snapshot.postings.data)
+        np.save(tmp_dir / "postings_indices.npy", snapshot.postings.indices)
+        np.save(tmp_dir / "postings_indptr.npy", snapshot.postings.indptr)
+        np.save(tmp_dir / "idf.npy", snapshot.vectorizer.idf_)
+
+        if snapshot.dense is not None:
+            for part in DENSE_PARTS:
+                np.save(tmp_dir / f"dense_{part}.npy", getattr(snapshot.dense, part))
+
+        vocabulary = {term: int(col) for term, col in snapshot.vectorizer.vocabulary_.items()}
+        (tmp_dir / "vocabulary.json").write_text(json.dumps(vocabulary))
+        snapshot.columns.save(tmp_dir)
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "index_version": snapshot.version,
+            "stale_rows": snapshot.stale_rows,
+            "token": f"{snapshot.token:016x}",
+            "shape": list(vectors.shape),
+            "nnz": int(vectors.nnz),
+            "dense": snapshot.dense is not None,
+            "synced_at": synced_at.isoformat() if synced_at else None,
+            "created_at": datetime.utcnow().isoformat()
+        }
+        (tmp_dir / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+        final_dir = self.root / name
+        tmp_dir.rename(final_dir)
+
+        pointer_tmp = self.root / f".CURRENT.{os.getpid()}"
+        pointer_tmp.write_text(name)
+        os.replace(pointer_tmp, self.root / "CURRENT")
+
+        self._prune(keep_name=name)
+        logger.info(f"Saved search index snapshot {name} ({vectors.shape[0]} recipes)")
+        return name
+
+    def _prune(self, keep_name: str):
+        """Drop old snapshots (mapped pages stay valid for readers until unmapped)"""
+        snapshots = sorted(
+            (p for p in self.root.iterdir() if p.is_dir() and not p.name.startswith(".")),
+            key=lambda p: p.stat().st_mtime,
+            reverse=True
+        )
+        for path in snapshots[self.keep:]:
+            if path.name != keep_name:
+                shutil.rmtree(path, ignore_errors=True)
+
+    @staticmethod
+    def _mapped(path: Path, prefix: str) -> tuple:
+        """Memory-map a (data, indices, indptr) triple"""
+        return tuple(
+            np.load(path / f"{prefix}{part}.npy", mmap_mode="r")
+            for part in ("data", "indices", "indptr")
+        )
+
+    def load(self, name: Optional[str] = None) -> Optional[tuple[IndexSnapshot, Optional[datetime]]]:
+        """Load snapshot `name` (default: the current one); returns (snapshot, synced_at) or None"""
+        name = name or self.current_name()
+        if not name:
+            return None
+
+        path = self.root / name
+        try:
+            manifest = json.loads((path / "manifest.json").read_text())
+            if manifest.get("format_version") != FORMAT_VERSION:
+                logger.warning(f"Ignoring snapshot {name}: format {manifest.get('format_version')}")
+                return None
+
+            shape = tuple(manifest["shape"])
+            recipe_vectors = sparse.csr_matrix(
+                self._mapped(path, ""),
+                shape=shape,
+                copy=False
+            )
+            postings = sparse.csc_matrix(
+                self._mapped(path, "postings_"),
+                shape=shape,
+                copy=False
+            )
+
+            # Restore a fitted vectorizer without refitting
+            vectorizer = SearchEngine._fitted_vectorizer(
+                json.loads((path / "vocabulary.json").read_text()),
+                np.load(path / "idf.npy")
+            )
+
+            dense = None
+            if manifest.get("dense"):
+                dense = IVFIndex(**{
+                    part: np.load(path / f"dense_{part}.npy", mmap_mode="r")
+                    for part in DENSE_PARTS
+                })
+
+            columns = RecipeColumns.load(path)
+            token = manifest.get("token")
+            token = int(token, 16) if token else columns.digest(range(len(columns)))
+
+            snapshot = IndexSnapshot(
+                version=manifest["index_version"],
+                vectorizer=vectorizer,
+                recipe_vectors=recipe_vectors,
+                postings=postings,
+                columns=columns,
+                id_to_row={recipe_id: i for i, recipe_id in enumerate(columns.ids)},
+                stale_rows=manifest.get("stale_rows", 0),
+                token=token,
+                dense=dense,
+                facets=FacetIndex.build(columns),
+                autocomplete=build_autocomplete(columns),
+                layout=layout_key(token, "\n".join(columns.ids), vectorizer.idf_),
+                source=str(path)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to load search index snapshot {name}: {e}")
+            return None
+
+        synced_at = datetime.fromisoformat(manifest["synced_at"]) if manifest.get("synced_at") else None
+        logger.info(f"Loaded search index snapshot {name} ({snapshot.size} recipes)")
+        return snapshot, synced_at
+
+# Singleton
+index_store = IndexStore(settings.SEARCH_INDEX_DIR, keep=settings.SEARCH_INDEX_SNAPSHOTS_KEEP)
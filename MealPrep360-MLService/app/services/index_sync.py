@@ -0,0 +1,221 @@
+"""Keeps the resident search index in sync with MongoDB"""
+from bson import ObjectId
+from loguru import logger
+import asyncio
+import time
+from datetime import datetime
+from typing import Optional
+
+from app.core.config import settings
+from app.core.database import db_manager
+from app.services.index_store import index_store
+from app.services.neighbours import neighbour_store
+from app.services.projection import MONGO_PROJECTION, ColumnBuilder, RecipeColumns
+from app.services.recommender import factor_model_store
+from app.services.search_engine import search_engine
+
+class IndexSync:
+    """
+    Builds the search index once at startup, then applies deltas
+    Polls recipes by `updatedAt` or an `_id` past the newest seen (inserts
+    without a timestamp), and periodically reconciles ids to catch deletes
+    and anything the cursors missed; with no cursor yet, every poll reconciles
+
+    One worker per node (the index store's writer) saves snapshots; the
+    others adopt each one it publishes, sync cursor included, and catch up
+    from there. The writer also builds the dense embeddings, in the
+    background: startup only waits for the lexical index
+    """
+
+    def __init__(self):
+        self.last_synced_at: Optional[datetime] = None
+        self.last_id: Optional[ObjectId] = None
+        self._task: Optional[asyncio.Task] = None
+        self._polls = 0
+        self._saved_version = 0
+        self._saved_at = 0.0
+        self._loaded_name: Optional[str] = None  # Snapshot on disk the index was last loaded from
+
+    def _collection(self):
+        return db_manager.get_collection("recipes")
+
+    def _advance(self, recipes: list):
+        """Track the newest updatedAt (server timestamps, not wall clock) and ObjectId seen"""
+        stamps = [r["updatedAt"] for r in recipes if isinstance(r.get("updatedAt"), datetime)]
+        if stamps:
+            newest = max(stamps)
+            if self.last_synced_at is None or newest > self.last_synced_at:
+                self.last_synced_at = newest
+        self._advance_id(r.get("_id") for r in recipes)
+
+    def _advance_id(self, ids):
+        object_ids = [ObjectId(i) for i in ids if ObjectId.is_valid(i)]
+        if object_ids:
+            newest = max(object_ids)
+            if self.last_id is None or newest > self.last_id:
+                self.last_id = newest
+
+    async def start(self):
+        """Warm start from a snapshot if present, else full build; then start the delta loop"""
+        loaded = name = None
+        if settings.ENABLE_INDEX_SNAPSHOTS:
+            index_store.acquire_writer()
+            name = index_store.current_name()
+            loaded = await asyncio.to_thread(index_store.load, name) if name else None
+
+        if loaded:
+            snapshot, self.last_synced_at = loaded
+            self._loaded_name = name
+            self._advance_id(snapshot.columns.ids)
+            await search_engine.load_snapshot(snapshot)
+            self._saved_version = snapshot.version
+            self._saved_at = time.monotonic()
+            # Catch up on everything that changed since the snapshot was written
+            await self.sync_once(reconcile=True)
+        else:
+            await search_engine.index_columns(await self._stream_columns())
+            await self._save_snapshot(force=True)
+
+        await self._reload_models()
+        self._schedule_embedding()
+        self._task = asyncio.create_task(self._run())
+
+    async def _stream_columns(self) -> RecipeColumns:
+        """
+        Drain the whole collection into column form batch by batch; only one
+        cursor batch of (projected) documents is resident at a time
+        """
+        builder = ColumnBuilder()
+        cursor = self._collection().find({}, MONGO_PROJECTION).batch_size(settings.INDEX_BATCH_SIZE)
+        batch = []
+        async for recipe in cursor:
+            batch.append(recipe)
+            if len(batch) >= settings.INDEX_BATCH_SIZE:
+                await asyncio.to_thread(self._ingest, builder, batch)
+                batch = []
+        await asyncio.to_thread(self._ingest, builder, batch)
+        logger.info(f"Streamed {len(builder)} recipes from MongoDB")
+        return builder.build()
+
+    def _ingest(self, builder: ColumnBuilder, recipes: list):
+        for recipe in recipes:
+            builder.add(recipe)
+        self._advance(recipes)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.SEARCH_INDEX_REFRESH_SECONDS)
+            try:
+                await self.sync_once()
+                await self._follow_snapshot()
+            except Exception as e:
+                logger.error(f"Search index sync failed: {e}")
+            await self._reload_models()
+            self._schedule_embedding()
+
+    def _schedule_embedding(self):
+        """Writer only (or without snapshots): the others adopt its snapshot, embeddings included"""
+        if not settings.ENABLE_INDEX_SNAPSHOTS or index_store.is_writer:
+            search_engine.schedule_embedding()
+
+    async def _reload_models(self):
+        """Pick up artifacts written by the offline batch jobs"""
+        await asyncio.to_thread(neighbour_store.reload_if_changed)
+        await asyncio.to_thread(factor_model_store.reload_if_changed)
+
+    async def sync_once(self, reconcile: bool = False):
+        """Fetch recipes changed since the last sync and apply them"""
+        self._polls += 1
+        collection = self._collection()
+
+        cursors = []
+        if self.last_synced_at:
+            cursors.append({"updatedAt": {"$gt": self.last_synced_at}})
+        if self.last_id:
+            cursors.append({"_id": {"$gt": self.last_id}})
+
+        changed = []
+        if cursors:
+            changed = await collection.find({"$or": cursors}, MONGO_PROJECTION).to_list(length=None)
+
+        deleted = set()
+        if reconcile or not cursors or self._polls % settings.SEARCH_INDEX_RECONCILE_EVERY == 0:
+            live_ids = {str(doc["_id"]): doc["_id"] async for doc in collection.find({}, {"_id": 1})}
+            indexed = search_engine.snapshot.id_to_row
+            deleted = indexed.keys() - live_ids.keys()
+            # Inserted without a timestamp and behind the _id cursor (or no cursor yet)
+            seen = {str(r["_id"]) for r in changed}
+            missing = [live_ids[i] for i in live_ids.keys() - indexed.keys() - seen]
+            for start in range(0, len(missing), settings.INDEX_BATCH_SIZE):
+                changed += await collection.find(
+                    {"_id": {"$in": missing[start:start + settings.INDEX_BATCH_SIZE]}},
+                    MONGO_PROJECTION
+                ).to_list(length=None)
+
+        await search_engine.apply_changes(changed, deleted)
+        self._advance(changed)
+        await self._save_snapshot()
+
+    async def _save_snapshot(self, force: bool = False):
+        """
+        Persist the live snapshot, throttled to SEARCH_INDEX_SNAPSHOT_SECONDS,
+        and reload it from disk (merging the delta overlay; a lean snapshot's
+        vectors are fetched back from the shards). Writer only
+        """
+        snapshot = search_engine.snapshot
+        if not settings.ENABLE_INDEX_SNAPSHOTS or snapshot is None or not index_store.is_writer:
+            return
+        if snapshot.version == self._saved_version:
+            return
+        if not force and time.monotonic() - self._saved_at < settings.SEARCH_INDEX_SNAPSHOT_SECONDS:
+            return
+
+        try:
+            merged = await search_engine.merged(snapshot)
+            name = await asyncio.to_thread(index_store.save, merged, self.last_synced_at)
+            self._saved_version = snapshot.version
+            self._saved_at = time.monotonic()
+            # Serve the merged, memory-mapped copy instead of private overlays
+            await self._adopt(name, snapshot)
+        except Exception as e:
+            logger.error(f"Failed to save search index snapshot: {e}")
+
+    async def _follow_snapshot(self):
+        """
+        Other workers: serve the writer's newest snapshot (shared pages) and
+        catch up on what changed since it was written. Takes over writing
+        if the writer is gone
+        """
+        if not settings.ENABLE_INDEX_SNAPSHOTS or index_store.acquire_writer():
+            return
+        name = index_store.current_name()
+        if not name or name == self._loaded_name:
+            return
+        if await self._adopt(name, search_engine.snapshot):
+            await self.sync_once(reconcile=True)
+
+    async def _adopt(self, name: str, current) -> bool:
+        """
+        Swap snapshot `name` in for `current` (skipped if the index moved on);
+        the sync cursors restart from what the snapshot was synced to
+        """
+        loaded = await asyncio.to_thread(index_store.load, name)
+        if not loaded or not await search_engine.reload_snapshot(current, loaded[0]):
+            return False
+        snapshot, self.last_synced_at = loaded
+        self._loaded_name = name
+        self._saved_version = search_engine.version
+        self.last_id = None
+        self._advance_id(snapshot.columns.ids)
+        return True
+
+# Singleton
+index_sync = IndexSync()
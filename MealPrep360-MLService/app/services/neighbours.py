@@ -0,0 +1,189 @@
+"""Precomputed "similar recipes" neighbour table"""
+from dataclasses import dataclass, field
+from scipy import sparse
+import numpy as np
+from loguru import logger
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+import os
+
+from app.core.config import settings
+
+@dataclass(frozen=True)
+class NeighbourTable:
+    """
+    Top-N neighbours per recipe in flat arrays
+    neighbours[i] holds row numbers into `ids` (padded with -1), best first
+    """
+    ids: np.ndarray         # (N,) recipe ids
+    neighbours: np.ndarray  # (N, width) int32
+    scores: np.ndarray      # (N, width) float16
+    built_at: datetime
+    index_version: int = 0
+    id_to_row: dict = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.id_to_row is None:
+            object.__setattr__(self, "id_to_row", {str(i): row for row, i in enumerate(self.ids)})
+
+    @property
+    def width(self) -> int:
+        return self.neighbours.shape[1]
+
+    def lookup(self, recipe_id: str, limit: int) -> Optional[list]:
+        """[(neighbour_id, score)], or None if the recipe is not in the table"""
+        row = self.id_to_row.get(recipe_id)
+        if row is None:
+            return None
+
+        hits = []
+        for neighbour, score in zip(self.neighbours[row, :limit], self.scores[row, :limit]):
+            if neighbour < 0:
+                continue
+            hits.append((str(self.ids[neighbour]), float(score)))
+        return hits
+
+def block_rows_for(n_rows: int, memory_mb: int) -> int:
+    """Rows per block so one dense (block x n_rows) float32 slab fits the budget"""
+    return max(1, (memory_mb * 1024 * 1024) // (4 * max(n_rows, 1)))
+
+def _merge_top(
+    best_rows: np.ndarray,
+    best_scores: np.ndarray,
+    candidate_rows: np.ndarray,
+    candidate_scores: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Row-wise top-width of two candidate sets (both (m, *) arrays)"""
+    width = best_rows.shape[1]
+    rows = np.concatenate([best_rows, candidate_rows], axis=1)
+    scores = np.concatenate([best_scores, candidate_scores], axis=1)
+
+    part = np.argpartition(-scores, width - 1, axis=1)[:, :width]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    part = np.take_along_axis(part, order, axis=1)
+    return np.take_along_axis(rows, part, axis=1), np.take_along_axis(scores, part, axis=1)
+
+def compute_neighbours(
+    vectors: sparse.csr_matrix,
+    width: int,
+    memory_mb: int = 256,
+    changed_rows: Optional[np.ndarray] = None,
+    kept_rows: Optional[np.ndarray] = None,
+    kept_scores: Optional[np.ndarray] = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Top-`width` cosine neighbours for every row of L2-normalized `vectors`
+    using blocked sparse products (vectors[block] @ vectors.T), so peak memory
+    is bounded by `memory_mb` regardless of catalog size.
+
+    Incremental mode: pass `changed_rows` plus the still-valid neighbour lists
+    of all other rows (`kept_rows`/`kept_scores`, -1/-inf padded, with changed
+    and deleted neighbours already removed). Changed rows get fresh lists;
+    other rows only merge in their similarity to the changed rows, so a row
+    that lost a neighbour must be in `changed_rows` to be refilled.
+    """
+    n = vectors.shape[0]
+    width = min(width, max(n - 1, 0))
+
+    best_rows = np.full((n, width), -1, dtype=np.int32)
+    best_scores = np.full((n, width), -np.inf, dtype=np.float32)
+    if width == 0:
+        return best_rows, best_scores.astype(np.float16)
+
+    if changed_rows is None:
+        changed_rows = np.arange(n)
+    else:
+        best_rows[:] = kept_rows
+        best_scores[:] = kept_scores
+
+    unchanged = np.ones(n, dtype=bool)
+    unchanged[changed_rows] = False
+    unchanged_rows = np.flatnonzero(unchanged)
+
+    transposed = vectors.T.tocsc()
+    block = block_rows_for(n, memory_mb)
+    for start in range(0, len(changed_rows), block):
+        rows = changed_rows[start:start + block]
+        similarities = (vectors[rows] @ transposed).toarray().astype(np.float32)
+        similarities[np.arange(len(rows)), rows] = -np.inf  # Never your own neighbour
+
+        # Fresh lists for the changed rows
+        top = np.argpartition(-similarities, width - 1, axis=1)[:, :width]
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        best_rows[rows] = np.take_along_axis(top, order, axis=1)
+        best_scores[rows] = np.take_along_axis(top_scores, order, axis=1)
+
+        # Unchanged rows may gain a changed recipe as a neighbour
+        if unchanged_rows.size:
+            candidate_scores = similarities[:, unchanged_rows].T
+            candidate_rows = np.broadcast_to(rows.astype(np.int32), candidate_scores.shape)
+            merged_rows, merged_scores = _merge_top(
+                best_rows[unchanged_rows], best_scores[unchanged_rows],
+                candidate_rows, candidate_scores
+            )
+            best_rows[unchanged_rows] = merged_rows
+            best_scores[unchanged_rows] = merged_scores
+
+        logger.debug(f"Neighbours: {min(start + block, len(changed_rows))}/{len(changed_rows)} rows")
+
+    # Zero-similarity "neighbours" are noise
+    best_rows[best_scores <= 0] = -1
+    return best_rows, best_scores.astype(np.float16)
+
+class NeighbourStore:
+    """Loads the table written by the batch job and picks up new versions"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.table: Optional[NeighbourTable] = None
+        self._mtime: Optional[float] = None
+
+    def save(self, table: NeighbourTable):
+        """Atomically replace the table file"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                ids=table.ids,
+                neighbours=table.neighbours,
+                scores=table.scores,
+                built_at=np.array(table.built_at.isoformat()),
+                index_version=np.array(table.index_version)
+            )
+        os.replace(tmp, self.path)
+        logger.info(f"Saved neighbour table ({len(table.ids)} recipes x {table.width})")
+
+    def load(self) -> Optional[NeighbourTable]:
+        if not self.path.exists():
+            return None
+        with np.load(self.path) as data:
+            return NeighbourTable(
+                ids=data["ids"],
+                neighbours=data["neighbours"],
+                scores=data["scores"],
+                built_at=datetime.fromisoformat(str(data["built_at"])),
+                index_version=int(data["index_version"])
+            )
+
+    def reload_if_changed(self):
+        """Swap in a newer table file if the batch job has written one"""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+
+        try:
+            self.table = self.load()
+            self._mtime = mtime
+            logger.info(f"Loaded neighbour table built at {self.table.built_at}")
+        except Exception as e:
+            logger.error(f"Failed to load neighbour table: {e}")
+
+# Singleton
+neighbour_store = NeighbourStore(settings.NEIGHBOURS_PATH)
@@ -0,0 +1,262 @@
+"""Compact, column-oriented store of the recipe fields the index serves"""
+import numpy as np
+from array import array
+from pathlib import Path
+from typing import Iterable, Optional, Sequence, Union
+import hashlib
+import json
+import sys
+
+# Free-text fields kept per recipe (description feeds index refits)
+TEXT_FIELDS = ("title", "description", "thumbnail")
+# Low-cardinality strings, dictionary-encoded
+CATEGORY_FIELDS = ("cuisine", "category", "season", "difficulty", "mealType")
+# Small integers, -1 when missing (saves/views weight autocomplete suggestions)
+NUMBER_FIELDS = ("prepTime", "cookTime", "servings", "saves", "views")
+# Short string lists, interned
+LIST_FIELDS = ("tags", "dietaryInfo", "ingredientNames")
+
+STORED_FIELDS = ("_id",) + TEXT_FIELDS + CATEGORY_FIELDS + NUMBER_FIELDS + LIST_FIELDS
+
+# Returned when the caller does not pass `fields=`
+DEFAULT_FIELDS = (
+    "_id", "title", "thumbnail", "cuisine", "category",
+    "difficulty", "prepTime", "cookTime", "dietaryInfo"
+)
+
+# What to fetch from Mongo for indexing (updatedAt drives incremental sync);
+# never ingredients, instructions, images or stored embeddings
+MONGO_PROJECTION = {
+    **{name: 1 for name in STORED_FIELDS if name not in ("thumbnail", "ingredientNames")},
+    "images.thumbnail": 1,
+    "ingredients.name": 1,
+    "imageUrl": 1,
+    "updatedAt": 1
+}
+
+def parse_fields(fields: Optional[Union[str, Sequence[str]]]) -> tuple:
+    """Validate a `fields=` selection (list or comma-separated); `_id` is always included"""
+    if not fields:
+        return DEFAULT_FIELDS
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    requested = [f.strip() for f in fields if f.strip()]
+    unknown = [f for f in requested if f not in STORED_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(STORED_FIELDS)}")
+    return tuple(dict.fromkeys(["_id"] + requested))
+
+def _thumbnail(recipe: dict) -> Optional[str]:
+    images = recipe.get("images")
+    if isinstance(images, dict) and images.get("thumbnail"):
+        return images["thumbnail"]
+    return recipe.get("imageUrl")
+
+def _text(recipe: dict, name: str) -> Optional[str]:
+    value = _thumbnail(recipe) if name == "thumbnail" else recipe.get(name)
+    return str(value) if value is not None else None
+
+def _list(recipe: dict, name: str) -> tuple:
+    if name == "ingredientNames":
+        values = [
+            i.get("name") if isinstance(i, dict) else i
+            for i in recipe.get("ingredients") or ()
+        ]
+    else:
+        values = recipe.get(name) or ()
+    return tuple(sys.intern(str(v)) for v in values if v)
+
+INT32_MAX = np.iinfo(np.int32).max
+
+def _number(value) -> int:
+    try:
+        return min(int(value), INT32_MAX)
+    except (TypeError, ValueError):
+        return -1
+
+class CategoryColumn:
+    """Dictionary-encoded strings: int32 codes into a value list (-1 = missing)"""
+
+    def __init__(self, codes: np.ndarray, values: list):
+        self.codes = codes
+        self.values = values
+
+    def get(self, row: int) -> Optional[str]:
+        code = self.codes[row]
+        return self.values[code] if code >= 0 else None
+
+    def take(self, rows) -> "CategoryColumn":
+        return CategoryColumn(self.codes[rows], self.values)
+
+    def concat(self, other: "CategoryColumn") -> "CategoryColumn":
+        lookup = {value: i for i, value in enumerate(self.values)}
+        values = list(self.values)
+        remap = np.empty(len(other.values) + 1, dtype=np.int32)
+        remap[-1] = -1  # other's -1 codes index the last slot
+        for i, value in enumerate(other.values):
+            if value not in lookup:
+                lookup[value] = len(values)
+                values.append(value)
+            remap[i] = lookup[value]
+        return CategoryColumn(np.concatenate([self.codes, remap[other.codes]]), values)
+
+class ColumnBuilder:
+    """
+    Appends documents one at a time straight into column form, so a cursor
+    can be drained without ever holding more than one raw document
+    Numbers and category codes accumulate in typed arrays (4 bytes per value).
+    """
+
+    def __init__(self):
+        self.ids: list = []
+        self.text = {name: [] for name in TEXT_FIELDS}
+        self.codes = {name: array("i") for name in CATEGORY_FIELDS}
+        self.lookups = {name: {} for name in CATEGORY_FIELDS}
+        self.numbers = {name: array("i") for name in NUMBER_FIELDS}
+        self.lists = {name: [] for name in LIST_FIELDS}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, document: dict):
+        self.ids.append(str(document.get("_id")))
+        for name, column in self.text.items():
+            column.append(_text(document, name))
+        for name, codes in self.codes.items():
+            value = document.get(name)
+            if value is None or value == "":
+                codes.append(-1)
+                continue
+            lookup = self.lookups[name]
+            codes.append(lookup.setdefault(str(value), len(lookup)))
+        for name, column in self.numbers.items():
+            column.append(_number(document.get(name)))
+        for name, column in self.lists.items():
+            column.append(_list(document, name))
+
+    def build(self) -> "RecipeColumns":
+        return RecipeColumns(
+            ids=self.ids,
+            text=self.text,
+            categories={
+                name: CategoryColumn(np.frombuffer(codes, dtype=np.int32).copy(), list(self.lookups[name]))
+                for name, codes in self.codes.items()
+            },
+            numbers={
+                name: np.frombuffer(column, dtype=np.int32).copy()
+                for name, column in self.numbers.items()
+            },
+            lists=self.lists
+        )
+
+class RecipeColumns:
+    """
+    Projected recipe fields stored by column instead of one dict per recipe:
+    ids/text as lists of str, categories as int32 codes, numbers as int32
+    arrays and tag lists as tuples of interned strings.
+    """
+
+    def __init__(self, ids: list, text: dict, categories: dict, numbers: dict, lists: dict):
+        self.ids = ids
+        self.text = text
+        self.categories = categories
+        self.numbers = numbers
+        self.lists = lists
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[dict]) -> "RecipeColumns":
+        builder = ColumnBuilder()
+        for document in documents:
+            builder.add(document)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def document(self, row: int, fields: Sequence[str] = STORED_FIELDS) -> dict:
+        """One recipe as a dict with only the requested fields (missing ones omitted)"""
+        doc = {}
+        for name in fields:
+            if name == "_id":
+                value = self.ids[row]
+            elif name in self.text:
+                value = self.text[name][row]
+            elif name in self.categories:
+                value = self.categories[name].get(row)
+            elif name in self.numbers:
+                value = int(self.numbers[name][row])
+                value = value if value >= 0 else None
+            else:
+                value = list(self.lists[name][row])
+            if value is not None:
+                doc[name] = value
+        return doc
+
+    def documents(self) -> list:
+        return [self.document(row) for row in range(len(self))]
+
+    def digest(self, rows: Iterable[int]) -> int:
+        """
+        Order-independent 64-bit hash of the rows' stored fields (XOR of one
+        blake2b per row), so adding or removing rows updates it incrementally
+        """
+        value = 0
+        for row in rows:
+            encoded = json.dumps(self.document(row), sort_keys=True).encode()
+            value ^= int.from_bytes(hashlib.blake2b(encoded, digest_size=8).digest(), "big")
+        return value
+
+    def take(self, rows: Sequence[int]) -> "RecipeColumns":
+        rows = np.asarray(rows, dtype=np.int64)
+        pick = rows.tolist()
+        return RecipeColumns(
+            ids=[self.ids[i] for i in pick],
+            text={name: [column[i] for i in pick] for name, column in self.text.items()},
+            categories={name: column.take(rows) for name, column in self.categories.items()},
+            numbers={name: column[rows] for name, column in self.numbers.items()},
+            lists={name: [column[i] for i in pick] for name, column in self.lists.items()}
+        )
+
+    def concat(self, other: "RecipeColumns") -> "RecipeColumns":
+        return RecipeColumns(
+            ids=self.ids + other.ids,
+            text={name: column + other.text[name] for name, column in self.text.items()},
+            categories={name: column.concat(other.categories[name]) for name, column in self.categories.items()},
+            numbers={name: np.concatenate([column, other.numbers[name]]) for name, column in self.numbers.items()},
+            lists={name: column + other.lists[name] for name, column in self.lists.items()}
+        )
+
+    def save(self, path: Path):
+        """Arrays as .npy (memory-mappable), strings as one JSON file"""
+        for name, column in self.categories.items():
+            np.save(path / f"category_{name}.npy", column.codes)
+        for name, column in self.numbers.items():
+            np.save(path / f"number_{name}.npy", column)
+
+        strings = {
+            "ids": self.ids,
+            "text": self.text,
+            "category_values": {name: column.values for name, column in self.categories.items()},
+            "lists": {name: [list(v) for v in column] for name, column in self.lists.items()}
+        }
+        (path / "columns.json").write_text(json.dumps(strings))
+
+    @classmethod
+    def load(cls, path: Path) -> "RecipeColumns":
+        strings = json.loads((path / "columns.json").read_text())
+        return cls(
+            ids=strings["ids"],
+            text=strings["text"],
+            categories={
+                name: CategoryColumn(np.load(path / f"category_{name}.npy", mmap_mode="r"), values)
+                for name, values in strings["category_values"].items()
+            },
+            numbers={
+                name: np.load(path / f"number_{name}.npy", mmap_mode="r")
+                for name in NUMBER_FIELDS
+            },
+            lists={
+                name: [tuple(sys.intern(v) for v in values) for values in column]
+                for name, column in strings["lists"].items()
+            }
+        )
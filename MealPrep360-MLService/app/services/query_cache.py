@@ -0,0 +1,140 @@
+"""Two-tier (in-process LRU + Redis) cache of ranked search results"""
+from redis import asyncio as aioredis
+from collections import OrderedDict
+from loguru import logger
+from typing import Optional
+import hashlib
+import orjson
+
+from app.core.config import settings
+from app.core.metrics import record_cache, track_upstream
+from app.services.facets import normalize_value
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+class QueryCache:
+    """
+    Caches normalized query -> ranked (recipe ids, scores), never documents
+    Keys embed the index's content token (a hash of the indexed recipes), so
+    any change to the recipes makes older entries unreachable while every
+    worker and instance serving the same recipes shares them; the local tier
+    is dropped on a token change and Redis entries simply age out. Ids (not
+    row numbers) are cached so an entry resolves against any snapshot.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: int = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis: Optional[aioredis.Redis] = None
+        self._local: OrderedDict = OrderedDict()
+        self._token: Optional[int] = None
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    async def connect(self):
+        """Connect to Redis; the local tier works without it"""
+        try:
+            self.redis = await aioredis.from_url(
+                f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}/{settings.REDIS_DB}",
+                password=settings.REDIS_PASSWORD,
+                decode_responses=False
+            )
+            await self.redis.ping()
+            logger.info("Connected to Redis (search result cache)")
+        except Exception as e:
+            logger.warning(f"Redis connection failed: {e}. Using the in-process cache only.")
+            self.redis = None
+
+    async def disconnect(self):
+        if self.redis:
+            await self.redis.close()
+            self.redis = None
+
+    @staticmethod
+    def key(query: str, token: int, mode: str, k: int, filters: Optional[dict]) -> str:
+        """Stable key for a query; filter values are normalized and ordered"""
+        canonical = {}
+        for name, value in sorted((filters or {}).items()):
+            if isinstance(value, (list, tuple)):
+                value = sorted({normalize_value(v) for v in value})
+            canonical[name] = value
+        digest = hashlib.sha1(
+            orjson.dumps([normalize_query(query), mode, k, canonical])
+        ).hexdigest()
+        return f"ml:search:{token:016x}:{digest}"
+
+    def _roll(self, token: int):
+        if token != self._token:
+            self._local.clear()
+            self._token = token
+
+    async def get_many(self, token: int, keys: list) -> list:
+        """Cached (ids, scores) per key, None for misses"""
+        self._roll(token)
+        found = [None] * len(keys)
+        remote = []
+        for i, key in enumerate(keys):
+            entry = self._local.get(key)
+            if entry is not None:
+                self._local.move_to_end(key)
+                found[i] = entry
+                self.local_hits += 1
+            else:
+                remote.append(i)
+
+        if remote and self.redis:
+            try:
+                with track_upstream("redis", "mget"):
+                    values = await self.redis.mget([keys[i] for i in remote])
+                for i, value in zip(remote, values):
+                    if value is not None:
+                        ids, scores = orjson.loads(value)
+                        found[i] = (ids, scores)
+                        self._store(keys[i], found[i])
+                        self.redis_hits += 1
+            except Exception as e:
+                logger.error(f"Search cache get error: {e}")
+
+        misses = sum(1 for entry in found if entry is None)
+        self.misses += misses
+        record_cache("search", True, len(keys) - misses)
+        record_cache("search", False, misses)
+        return found
+
+    def _store(self, key: str, entry: tuple):
+        self._local[key] = entry
+        self._local.move_to_end(key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    async def set_many(self, token: int, entries: dict):
+        """Store {key: (ids, scores)} in both tiers"""
+        self._roll(token)
+        for key, entry in entries.items():
+            self._store(key, entry)
+
+        if entries and self.redis:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key, entry in entries.items():
+                        pipe.set(key, orjson.dumps(entry), ex=self.ttl)
+                    with track_upstream("redis", "set"):
+                        await pipe.execute()
+            except Exception as e:
+                logger.error(f"Search cache set error: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.local_hits + self.redis_hits) / lookups, 4) if lookups else 0.0,
+            "local_entries": len(self._local),
+            "redis": self.redis is not None
+        }
+
+# Singleton
+query_cache = QueryCache(max_entries=settings.SEARCH_CACHE_SIZE, ttl=settings.SEARCH_CACHE_TTL)
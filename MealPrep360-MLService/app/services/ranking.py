@@ -0,0 +1,61 @@
+"""Ranking helpers shared by the lexical and dense indexes"""
+from scipy import sparse
+import numpy as np
+from typing import Optional
+
+def widen(matrix: sparse.csr_matrix, width: int) -> sparse.csr_matrix:
+    """The same rows with extra (empty) term columns, sharing the arrays"""
+    if matrix.shape[1] == width:
+        return matrix
+    return sparse.csr_matrix((matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], width))
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k largest scores, best first, in O(n + k log k)"""
+    if k <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.size:
+        part = np.argpartition(scores, -k)[-k:]
+    else:
+        part = np.arange(scores.size)
+    return part[np.argsort(scores[part])[::-1]]
+
+def top_k_per_row(
+    scores: sparse.csr_matrix,
+    k: int,
+    mask: Optional[np.ndarray] = None,
+    exclude: Optional[np.ndarray] = None
+) -> list:
+    """
+    Per-row top-k of a sparse score matrix: [(columns, scores)]
+    mask: optional boolean filter over columns
+    exclude: optional column to drop from each row's result
+    """
+    ranked = []
+    for i in range(scores.shape[0]):
+        start, end = scores.indptr[i], scores.indptr[i + 1]
+        candidates, values = scores.indices[start:end], scores.data[start:end]
+        if mask is not None:
+            keep = mask[candidates]
+            candidates, values = candidates[keep], values[keep]
+        if exclude is not None:
+            keep = candidates != exclude[i]
+            candidates, values = candidates[keep], values[keep]
+        best = top_k(values, k)
+        ranked.append((candidates[best], values[best]))
+    return ranked
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fuse ranked row lists: score(row) = sum over lists of 1 / (k + rank)
+    Rank-based, so TF-IDF and embedding scores need no calibration
+    Returns (rows, fused_scores) best first
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(np.asarray(ranking).tolist(), start=1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank)
+
+    rows = np.fromiter(fused.keys(), dtype=np.int64, count=len(fused))
+    scores = np.fromiter(fused.values(), dtype=np.float64, count=len(fused))
+    order = top_k(scores, len(scores))
+    return rows[order], scores[order]
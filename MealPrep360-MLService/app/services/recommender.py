@@ -0,0 +1,168 @@
+"""Personalized recipe recommendations from implicit feedback (ALS)"""
+from dataclasses import dataclass, field
+from scipy import sparse
+import numpy as np
+from loguru import logger
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+import os
+
+from app.core.config import settings
+from app.services.ranking import top_k
+
+def _solve_side(
+    interactions: sparse.csr_matrix,
+    fixed: np.ndarray,
+    regularization: float,
+    alpha: float
+) -> np.ndarray:
+    """
+    One ALS half-step (Hu, Koren & Volinsky 2008)
+    For each row u: (YtY + Yu^T (Cu - I) Yu + lambda*I) x_u = Yu^T Cu p_u,
+    with confidence c = 1 + alpha * r and preference p = 1 for observed pairs.
+    """
+    n_factors = fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(n_factors, dtype=np.float64)
+    solved = np.zeros((interactions.shape[0], n_factors), dtype=np.float64)
+
+    indptr, indices, data = interactions.indptr, interactions.indices, interactions.data
+    for u in range(interactions.shape[0]):
+        start, end = indptr[u], indptr[u + 1]
+        if start == end:
+            continue
+        factors = fixed[indices[start:end]]
+        confidence = alpha * data[start:end]
+        a = gram + (factors.T * confidence) @ factors
+        b = factors.T @ (1.0 + confidence)
+        solved[u] = np.linalg.solve(a, b)
+
+    return solved
+
+def train_als(
+    interactions: sparse.csr_matrix,
+    factors: int = 64,
+    regularization: float = 0.05,
+    alpha: float = 20.0,
+    iterations: int = 15,
+    seed: int = 0
+) -> tuple[np.ndarray, np.ndarray]:
+    """Alternating least squares on a (users x items) weight matrix; returns float32 factors"""
+    rng = np.random.default_rng(seed)
+    n_users, n_items = interactions.shape
+    user_factors = rng.normal(0, 0.01, (n_users, factors))
+    item_factors = rng.normal(0, 0.01, (n_items, factors))
+
+    by_user = interactions.tocsr()
+    by_item = interactions.T.tocsr()
+    for iteration in range(iterations):
+        user_factors = _solve_side(by_user, item_factors, regularization, alpha)
+        item_factors = _solve_side(by_item, user_factors, regularization, alpha)
+        logger.debug(f"ALS iteration {iteration + 1}/{iterations}")
+
+    return (
+        np.ascontiguousarray(user_factors, dtype=np.float32),
+        np.ascontiguousarray(item_factors, dtype=np.float32)
+    )
+
+@dataclass(frozen=True)
+class FactorModel:
+    """User/item factor matrices plus what each user has already interacted with"""
+    user_ids: np.ndarray       # (U,)
+    item_ids: np.ndarray       # (I,) recipe ids
+    user_factors: np.ndarray   # (U, f) float32, C-contiguous
+    item_factors: np.ndarray   # (I, f) float32, C-contiguous
+    seen: sparse.csr_matrix    # (U, I) observed interactions
+    popular: np.ndarray        # item rows by interaction count, for cold-start users
+    trained_at: datetime
+    user_to_row: dict = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.user_to_row is None:
+            object.__setattr__(self, "user_to_row", {str(u): row for row, u in enumerate(self.user_ids)})
+
+    def recommend(self, user_id: str, k: int, exclude_seen: bool = True) -> tuple[list, bool]:
+        """
+        [(recipe_id, score)] for a user: one matmul over the catalog + argpartition
+        Returns (hits, personalized); unknown users get the most popular recipes
+        """
+        row = self.user_to_row.get(user_id)
+        if row is None:
+            return [(str(self.item_ids[i]), 0.0) for i in self.popular[:k]], False
+
+        scores = self.item_factors @ self.user_factors[row]
+        if exclude_seen:
+            start, end = self.seen.indptr[row], self.seen.indptr[row + 1]
+            scores[self.seen.indices[start:end]] = -np.inf
+
+        best = top_k(scores, k)
+        hits = [(str(self.item_ids[i]), float(scores[i])) for i in best if np.isfinite(scores[i])]
+        return hits, True
+
+class FactorModelStore:
+    """Loads the model written by the training job and picks up new versions"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.model: Optional[FactorModel] = None
+        self._mtime: Optional[float] = None
+
+    def save(self, model: FactorModel):
+        """Atomically replace the model file"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                user_ids=model.user_ids,
+                item_ids=model.item_ids,
+                user_factors=model.user_factors,
+                item_factors=model.item_factors,
+                seen_data=model.seen.data,
+                seen_indices=model.seen.indices,
+                seen_indptr=model.seen.indptr,
+                popular=model.popular,
+                trained_at=np.array(model.trained_at.isoformat())
+            )
+        os.replace(tmp, self.path)
+        logger.info(
+            f"Saved recommender model ({len(model.user_ids)} users x "
+            f"{len(model.item_ids)} recipes, {model.user_factors.shape[1]} factors)"
+        )
+
+    def load(self) -> Optional[FactorModel]:
+        if not self.path.exists():
+            return None
+        with np.load(self.path) as data:
+            shape = (len(data["user_ids"]), len(data["item_ids"]))
+            return FactorModel(
+                user_ids=data["user_ids"],
+                item_ids=data["item_ids"],
+                user_factors=np.ascontiguousarray(data["user_factors"]),
+                item_factors=np.ascontiguousarray(data["item_factors"]),
+                seen=sparse.csr_matrix(
+                    (data["seen_data"], data["seen_indices"], data["seen_indptr"]),
+                    shape=shape
+                ),
+                popular=data["popular"],
+                trained_at=datetime.fromisoformat(str(data["trained_at"]))
+            )
+
+    def reload_if_changed(self):
+        """Swap in a newer model file if the training job has written one"""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+
+        try:
+            self.model = self.load()
+            self._mtime = mtime
+            logger.info(f"Loaded recommender model trained at {self.model.trained_at}")
+        except Exception as e:
+            logger.error(f"Failed to load recommender model: {e}")
+
+# Singleton
+factor_model_store = FactorModelStore(settings.RECOMMENDER_MODEL_PATH)
@@ -1,96 +1,918 @@
 """ML-powered search engine"""
+from dataclasses import dataclass, field, replace
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
 import numpy as np
 from loguru import logger
+import asyncio
+from collections import Counter
+import hashlib
+from typing import Iterable, Iterator, Optional, Union
+
+from app.core.config import settings
+from app.services.autocomplete import AutocompleteIndex, column_contributions
+from app.services.embeddings import DenseOverlay, EmbeddingEncoder, IVFIndex, embedding_encoder, quantize
+from app.services.facets import FacetIndex
+from app.services.projection import DEFAULT_FIELDS, STORED_FIELDS, RecipeColumns
+from app.services.query_cache import QueryCache, query_cache
+from app.services.ranking import reciprocal_rank_fusion, top_k_per_row, widen
+from app.services.shards import ShardPool, shard_pool
+
+def recipe_text(recipe: dict) -> str:
+    """Text that gets vectorized for a recipe"""
+    return f"{recipe.get('title', '')} {recipe.get('description', '')} {' '.join(recipe.get('tags', []))}"
+
+def recipe_embedding_text(recipe: dict) -> str:
+    """Richer natural-language text for the dense encoder"""
+    parts = [recipe_text(recipe)]
+    for key in ('cuisine', 'category'):
+        if recipe.get(key):
+            parts.append(str(recipe[key]))
+    if recipe.get('dietaryInfo'):
+        parts.append(', '.join(recipe['dietaryInfo']))
+    return '. '.join(parts)
+
+def vectorize(vectorizer: TfidfVectorizer, texts: list) -> sparse.csr_matrix:
+    """transform(), except that no texts (a delete-only delta) or an empty vocabulary (empty catalog) give empty rows"""
+    if not texts or not vectorizer.vocabulary_:
+        return sparse.csr_matrix((len(texts), len(vectorizer.vocabulary_)), dtype=np.float32)
+    return vectorizer.transform(texts)
+
+def layout_key(*parts) -> str:
+    """
+    Hash of what shard states depend on: which rows, in which order, with
+    which vectors. Workers whose snapshots have equal keys share shard state
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            part = np.ascontiguousarray(part).tobytes()
+        elif isinstance(part, int):
+            part = part.to_bytes(8, "little")
+        elif isinstance(part, str):
+            part = part.encode()
+        digest.update(part)
+    return digest.hexdigest()
+
+# Stored fields recipe_text() reads, used when refitting from the column store
+TEXT_SOURCE_FIELDS = ("title", "description", "tags")
+
+def build_autocomplete(columns: RecipeColumns) -> Optional[AutocompleteIndex]:
+    if not settings.ENABLE_AUTOCOMPLETE:
+        return None
+    return AutocompleteIndex.build(
+        column_contributions(columns, range(len(columns))),
+        edit_limit=settings.AUTOCOMPLETE_MAX_EDITS
+    )
+
+def update_autocomplete(
+    index: Optional[AutocompleteIndex],
+    removed: list,
+    added: list
+) -> Optional[AutocompleteIndex]:
+    """Apply a delta; re-sort the tables once the unsorted overlay grows"""
+    if index is None:
+        return None
+    index = index.apply(removed, added)
+    if index.fresh_size > settings.AUTOCOMPLETE_COMPACT_RATIO * max(len(index.phrases), 1):
+        index = index.compact()
+    return index
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """
+    Immutable, versioned view of the search index
+    Writers build a new snapshot and swap the reference; readers never lock
+
+    Incremental updates never copy the base matrices (memory-mapped when
+    loaded from disk): appended rows go to a small delta overlay and
+    replaced or deleted rows are only marked dead in `live`. Row numbers
+    cover base then delta rows, dead ones included; merged() folds the
+    overlay in (done when the snapshot is saved and reloaded).
+
+    Once the shard processes hold a snapshot the engine keeps it lean():
+    without vectors, postings or delta, which only the shards then hold.
+    """
+    version: int
+    vectorizer: TfidfVectorizer
+    recipe_vectors: Optional[sparse.csr_matrix]  # Base rows; None once the shards hold them
+    postings: Optional[sparse.csc_matrix]  # Same matrix by column: term -> (rows, weights)
+    columns: RecipeColumns  # Projected fields only, never full documents
+    id_to_row: dict = field(repr=False)  # Live rows only
+    stale_rows: int = 0  # Rows vectorized against an older IDF fit
+    token: int = 0  # Content hash of the live rows: the same on every instance serving the same recipes
+    dense: Optional[Union[IVFIndex, DenseOverlay]] = None  # Embedding ANN index, same row numbering
+    facets: Optional[FacetIndex] = None  # Filter bitmaps, same row numbering
+    autocomplete: Optional[AutocompleteIndex] = None  # Typeahead suggestions
+    delta_vectors: Optional[sparse.csr_matrix] = None  # Rows appended since the base was built
+    delta_postings: Optional[sparse.csc_matrix] = None
+    live: Optional[np.ndarray] = None  # False for replaced/deleted rows; None when all are live
+    layout: str = ""  # layout_key(): identifies the shard state of these rows and vectors
+    source: Optional[str] = None  # Snapshot directory the base was loaded from, for the shards to read
+
+    @property
+    def size(self) -> int:
+        """Live recipes"""
+        return len(self.id_to_row)
+
+    @property
+    def n_rows(self) -> int:
+        """Rows, dead ones included"""
+        return len(self.columns)
+
+    def live_rows(self) -> np.ndarray:
+        if self.live is None:
+            return np.arange(self.n_rows)
+        return np.flatnonzero(self.live)
+
+    def document(self, row: int, fields: Iterable[str] = DEFAULT_FIELDS) -> dict:
+        return self.columns.document(row, fields)
+
+    def vectorize(self, texts: list) -> sparse.csr_matrix:
+        return vectorize(self.vectorizer, texts)
+
+    def vectors(self, rows) -> sparse.csr_matrix:
+        """Recipe vectors of base or delta rows, in order, at the vocabulary's width"""
+        rows = np.asarray(rows, dtype=np.int64)
+        width = len(self.vectorizer.vocabulary_)
+        base_size = self.recipe_vectors.shape[0]
+        in_base = rows < base_size
+        if self.delta_vectors is None or in_base.all():
+            return widen(self.recipe_vectors[rows], width)
+
+        stacked = sparse.vstack([
+            widen(self.recipe_vectors[rows[in_base]], width),
+            widen(self.delta_vectors[rows[~in_base] - base_size], width)
+        ], format="csr")
+        order = np.concatenate([np.flatnonzero(in_base), np.flatnonzero(~in_base)])
+        return stacked[np.argsort(order)]
+
+    def mask(self, filters: Optional[dict] = None) -> Optional[np.ndarray]:
+        """Row mask of live rows matching the facet filters; None when nothing is excluded"""
+        mask = self.facets.mask(filters) if self.facets else None
+        if self.live is None:
+            return mask
+        return self.live if mask is None else mask & self.live
+
+    def score(self, vectors: sparse.csr_matrix) -> sparse.csr_matrix:
+        """
+        Cosine scores of each row of `vectors` (queries or recipes) against the index
+        Rows and queries are L2-normalized, so cosine is a sparse dot product.
+        Multiplying by the posting lists (postings.T is CSR: term -> rows) only
+        touches recipes sharing at least one term; one product scores a whole batch.
+        Terms newer than a matrix's columns have no postings in it and are skipped.
+        Returns a (len(vectors), n_rows) CSR matrix holding only candidate scores
+        (dead rows included: filter with mask())
+        """
+        scores = vectors[:, :self.postings.shape[1]] @ self.postings.T
+        if self.delta_postings is not None:
+            delta = vectors[:, :self.delta_postings.shape[1]] @ self.delta_postings.T
+            scores = sparse.hstack([scores, delta])
+        return scores.tocsr()
+
+    @property
+    def is_lean(self) -> bool:
+        return self.recipe_vectors is None
+
+    def lean(self) -> "IndexSnapshot":
+        """This snapshot without its vectors (held by the shards instead)"""
+        return replace(self, recipe_vectors=None, postings=None, delta_vectors=None, delta_postings=None)
+
+    def merged(self, vectors: Optional[sparse.csr_matrix] = None) -> "IndexSnapshot":
+        """
+        The same index with the overlay folded into the base: dead rows
+        dropped, live rows renumbered in order
+        vectors: the live rows' vectors, for a lean snapshot (from the shards)
+        """
+        rows = self.live_rows()
+        if vectors is None:
+            if self.delta_vectors is None and self.live is None:
+                return self
+            vectors = self.vectors(rows)
+        columns = self.columns.take(rows)
+        dense = None
+        if self.dense is not None:
+            codes, scales = self.dense.row_codes()
+            dense = IVFIndex.build(codes[rows], scales[rows], centroids=self.dense.centroids)
+
+        return replace(
+            self,
+            recipe_vectors=vectors,
+            postings=vectors.tocsc(),
+            columns=columns,
+            id_to_row={recipe_id: i for i, recipe_id in enumerate(columns.ids)},
+            dense=dense,
+            facets=FacetIndex.build(columns),
+            delta_vectors=None,
+            delta_postings=None,
+            live=None,
+            layout=layout_key(self.token, "\n".join(columns.ids), self.vectorizer.idf_),
+            source=None
+        )
 
 class SearchEngine:
     """Semantic recipe search using TF-IDF"""
-    
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(
+
+    def __init__(
+        self,
+        rebuild_ratio: float = 0.2,
+        encoder: Optional[EmbeddingEncoder] = None,
+        cache: Optional[QueryCache] = None,
+        shards: Optional[ShardPool] = None
+    ):
+        self.rebuild_ratio = rebuild_ratio
+        self.encoder = encoder
+        self.cache = cache
+        self.shards = shards
+        self._snapshot: Optional[IndexSnapshot] = None
+        self._write_lock = asyncio.Lock()
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self._embed_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _new_vectorizer() -> TfidfVectorizer:
+        return TfidfVectorizer(
             max_features=5000,
             stop_words='english',
-            ngram_range=(1, 2)
+            ngram_range=(1, 2),
+            dtype=np.float32
         )
-        self.recipe_vectors = None
-        self.recipes = []
-    
+
+    @classmethod
+    def _fitted_vectorizer(cls, vocabulary: dict, idf: np.ndarray) -> TfidfVectorizer:
+        """A vectorizer restored from its vocabulary and IDF, without refitting"""
+        vectorizer = cls._new_vectorizer()
+        vectorizer.vocabulary_ = vocabulary
+        vectorizer.idf_ = idf
+        return vectorizer
+
+    @property
+    def snapshot(self) -> Optional[IndexSnapshot]:
+        """Current index snapshot (None until the first build)"""
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version if self._snapshot else 0
+
+    @property
+    def is_ready(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def has_dense(self) -> bool:
+        return self._snapshot is not None and self._snapshot.dense is not None
+
+    @property
+    def embedding_pending(self) -> bool:
+        """Dense search is configured, but the index has no embeddings (yet)"""
+        return self.encoder is not None and self._snapshot is not None and self._snapshot.dense is None
+
+    def serving_mode(self, mode: str) -> Optional[str]:
+        """
+        The mode a `mode` search runs in: lexical while the embeddings are
+        still being built, None if dense search is not available at all
+        """
+        if mode == "lexical" or self.has_dense:
+            return mode
+        return "lexical" if self.embedding_pending else None
+
+    def _encode(self, recipes: list) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        """Batch-encode and int8-quantize recipes; None if dense search is off"""
+        if self.encoder is None:
+            return None
+        vectors = self.encoder.try_encode([recipe_embedding_text(r) for r in recipes])
+        if vectors is None:
+            return None
+        return quantize(vectors)
+
+    def _current(self) -> IndexSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise ValueError("Search index not built. Call index_recipes() first")
+        return snapshot
+
+    def _fit(
+        self,
+        columns: RecipeColumns,
+        version: int,
+        encoded: Optional[tuple[np.ndarray, np.ndarray]] = None
+    ) -> IndexSnapshot:
+        """
+        Full fit of vocabulary and IDF (CPU bound, runs in a worker thread)
+        encoded: existing (codes, scales) in row order, to re-train the IVF
+        lists; without them the snapshot is lexical only until
+        schedule_embedding() encodes the recipes in the background
+        """
+        vectorizer, recipe_vectors = self._fit_vectors(columns)
+        token = columns.digest(range(len(columns)))
+
+        dense = None
+        if len(columns) and encoded is not None:
+            dense = IVFIndex.build(*encoded)
+
+        return IndexSnapshot(
+            version=version,
+            vectorizer=vectorizer,
+            recipe_vectors=recipe_vectors,
+            postings=recipe_vectors.tocsc(),
+            columns=columns,
+            id_to_row={recipe_id: i for i, recipe_id in enumerate(columns.ids)},
+            token=token,
+            dense=dense,
+            facets=FacetIndex.build(columns),
+            autocomplete=build_autocomplete(columns),
+            layout=layout_key(token, "\n".join(columns.ids), vectorizer.idf_)
+        )
+
+    @staticmethod
+    def _chunks(columns: RecipeColumns, fields: Iterable[str]) -> Iterator[list]:
+        """Projected documents, INDEX_BATCH_SIZE rows at a time"""
+        for start in range(0, len(columns), settings.INDEX_BATCH_SIZE):
+            stop = min(start + settings.INDEX_BATCH_SIZE, len(columns))
+            yield [columns.document(row, fields) for row in range(start, stop)]
+
+    def _fit_vectors(self, columns: RecipeColumns) -> tuple[TfidfVectorizer, sparse.csr_matrix]:
+        """
+        fit_transform in two passes over chunks, with bounded peak memory
+        Pass 1 counts term and document frequencies per n-gram, pass 2
+        vectorizes chunk by chunk against the chosen vocabulary. Vocabulary
+        (top max_features by corpus count) and smoothed IDF are the ones
+        fit_transform would pick, without its token-occurrence matrix over
+        the whole corpus.
+        """
+        vectorizer = self._new_vectorizer()
+        analyze = vectorizer.build_analyzer()
+
+        term_counts, doc_counts = Counter(), Counter()
+        for documents in self._chunks(columns, TEXT_SOURCE_FIELDS):
+            for document in documents:
+                terms = analyze(recipe_text(document))
+                term_counts.update(terms)
+                doc_counts.update(set(terms))
+
+        terms = sorted(term_counts)
+        max_features = vectorizer.max_features
+        if len(terms) > max_features:
+            counts = np.fromiter((term_counts[t] for t in terms), dtype=np.int64, count=len(terms))
+            # Ties at the cut-off go to the alphabetically first term
+            keep = np.sort(np.argsort(-counts, kind="stable")[:max_features])
+            terms = [terms[i] for i in keep]
+        del term_counts
+
+        document_frequency = np.array([doc_counts[t] for t in terms], dtype=np.float64)
+        del doc_counts
+        vectorizer = self._fitted_vectorizer(
+            {term: i for i, term in enumerate(terms)},
+            (np.log((1 + len(columns)) / (1 + document_frequency)) + 1).astype(np.float32)
+        )
+        if not terms:
+            # Empty catalog (or only stop words): serve an empty index until recipes arrive
+            return vectorizer, sparse.csr_matrix((len(columns), 0), dtype=np.float32)
+
+        blocks = [
+            vectorizer.transform([recipe_text(d) for d in documents])
+            for documents in self._chunks(columns, TEXT_SOURCE_FIELDS)
+        ]
+        return vectorizer, sparse.vstack(blocks, format="csr")
+
+    def _extend_vocabulary(
+        self,
+        vectorizer: TfidfVectorizer,
+        texts: list,
+        size: int
+    ) -> TfidfVectorizer:
+        """
+        Vectorizer whose vocabulary also covers terms first seen in `texts`
+        New terms are appended (existing columns keep their numbers) with the
+        smoothed IDF of their frequency among `texts` over `size` recipes;
+        the next refit re-derives vocabulary and IDF from the whole catalog
+        """
+        analyze = vectorizer.build_analyzer()
+        doc_counts = Counter()
+        for text in texts:
+            doc_counts.update(set(analyze(text)))
+        unseen = sorted(doc_counts.keys() - vectorizer.vocabulary_.keys())
+        if not unseen:
+            return vectorizer
+
+        vocabulary = dict(vectorizer.vocabulary_)
+        for term in unseen:
+            vocabulary[term] = len(vocabulary)
+        document_frequency = np.array([doc_counts[t] for t in unseen], dtype=np.float64)
+        idf = (np.log((1 + size) / (1 + document_frequency)) + 1).astype(np.float32)
+        return self._fitted_vectorizer(vocabulary, np.concatenate([vectorizer.idf_, idf]))
+
+    def _encode_columns(self, columns: RecipeColumns) -> Optional[tuple[np.ndarray, np.ndarray]]:
+        """_encode() chunk by chunk, so only int8 codes accumulate"""
+        codes, scales = [], []
+        for documents in self._chunks(columns, STORED_FIELDS):
+            encoded = self._encode(documents)
+            if encoded is None:
+                return None
+            codes.append(encoded[0])
+            scales.append(encoded[1])
+        return np.concatenate(codes), np.concatenate(scales)
+
+    def _apply(
+        self,
+        snapshot: IndexSnapshot,
+        upserts: list,
+        deleted_ids: set
+    ) -> tuple[IndexSnapshot, sparse.csr_matrix]:
+        """
+        Derive a new snapshot with rows replaced, appended or dropped
+        Only the overlay is rebuilt: old rows of replaced and deleted recipes
+        are marked dead and new versions appended to the delta rows (kept
+        by the shards alone when the snapshot is lean)
+        Returns (snapshot, vectors of the appended rows)
+        """
+        upserts_by_id = {str(r.get('_id')): r for r in upserts}
+        dropped = deleted_ids | upserts_by_id.keys()
+        dropped_rows = [snapshot.id_to_row[i] for i in dropped if i in snapshot.id_to_row]
+
+        new_recipes = list(upserts_by_id.values())
+        new_columns = RecipeColumns.from_documents(new_recipes)
+        columns = snapshot.columns.concat(new_columns)
+
+        live = np.ones(snapshot.n_rows, dtype=bool) if snapshot.live is None else snapshot.live.copy()
+        live[dropped_rows] = False
+        live = np.concatenate([live, np.ones(len(new_recipes), dtype=bool)])
+
+        id_to_row = {i: row for i, row in snapshot.id_to_row.items() if i not in dropped}
+        id_to_row.update((i, snapshot.n_rows + j) for j, i in enumerate(new_columns.ids))
+
+        # Reuse the fitted IDF (drift is bounded by rebuild_ratio), but give
+        # terms the fit never saw columns of their own so they are searchable
+        texts = [recipe_text(r) for r in new_recipes]
+        vectorizer = self._extend_vocabulary(snapshot.vectorizer, texts, len(id_to_row))
+        added = vectorize(vectorizer, texts)
+        delta_vectors, delta_postings = snapshot.delta_vectors, snapshot.delta_postings
+        if new_recipes and not snapshot.is_lean:
+            width = len(vectorizer.vocabulary_)
+            blocks = [added]
+            if delta_vectors is not None:
+                blocks.insert(0, widen(delta_vectors, width))
+            delta_vectors = sparse.vstack(blocks, format='csr')
+            delta_postings = delta_vectors.tocsc()
+
+        dense = snapshot.dense
+        if dense is not None and new_recipes:
+            encoded = self._encode(new_recipes)
+            if encoded is None:
+                dense = None
+            else:
+                # Scanned exactly until the next merge assigns them to lists
+                base = dense.base if isinstance(dense, DenseOverlay) else dense
+                codes, scales = encoded
+                if isinstance(dense, DenseOverlay):
+                    codes = np.concatenate([dense.codes, codes])
+                    scales = np.concatenate([dense.scales, scales])
+                dense = DenseOverlay(base=base, codes=codes, scales=scales)
+
+        token = snapshot.token ^ snapshot.columns.digest(dropped_rows) ^ new_columns.digest(range(len(new_columns)))
+        return replace(
+            snapshot,
+            version=snapshot.version + 1,
+            vectorizer=vectorizer,
+            columns=columns,
+            id_to_row=id_to_row,
+            stale_rows=snapshot.stale_rows + len(new_recipes),
+            token=token,
+            dense=dense,
+            facets=FacetIndex.build(columns),
+            autocomplete=update_autocomplete(
+                snapshot.autocomplete,
+                column_contributions(snapshot.columns, dropped_rows),
+                column_contributions(new_columns, range(len(new_columns)))
+            ),
+            delta_vectors=delta_vectors,
+            delta_postings=delta_postings,
+            live=None if live.all() else live,
+            layout=layout_key(snapshot.layout, token, "\n".join(new_columns.ids), vectorizer.idf_)
+        ), added
+
     async def index_recipes(self, recipes: list):
-        """Build search index from recipes"""
-        logger.info(f"Indexing {len(recipes)} recipes")
-        
-        self.recipes = recipes
-        
-        # Create text corpus
-        texts = []
-        for recipe in recipes:
-            text = f"{recipe.get('title', '')} {recipe.get('description', '')} {' '.join(recipe.get('tags', []))}"
-            texts.append(text)
-        
-        # Vectorize
-        self.recipe_vectors = self.vectorizer.fit_transform(texts)
-        
-        logger.info("Indexing complete")
-    
-    async def search(self, query: str, k: int = 10) -> list:
+        """Build search index from recipes (only the projected fields are kept)"""
+        columns = await asyncio.to_thread(RecipeColumns.from_documents, recipes)
+        await self.index_columns(columns)
+
+    async def index_columns(self, columns: RecipeColumns):
+        """Build search index from already projected recipes (streamed ingestion)"""
+        logger.info(f"Indexing {len(columns)} recipes")
+
+        async with self._write_lock:
+            snapshot = await asyncio.to_thread(self._fit, columns, self.version + 1)
+            self._snapshot = await self._publish(snapshot)
+
+        logger.info(f"Indexing complete (version {snapshot.version})")
+
+    async def load_snapshot(self, snapshot: IndexSnapshot):
+        """Serve a previously persisted snapshot (warm start)"""
+        async with self._write_lock:
+            self._snapshot = await self._publish(snapshot)
+
+    async def reload_snapshot(self, saved: IndexSnapshot, loaded: IndexSnapshot) -> bool:
+        """
+        Swap in a memory-mapped snapshot from disk in place of `saved` (this
+        worker's just written copy, or the writer's): the overlay is merged
+        and the arrays are shared page cache again
+        Skipped (False) if the index changed since `saved`
+        """
+        async with self._write_lock:
+            if self._snapshot is not saved:
+                return False
+            # Rows were renumbered: a new version, so shards and caches don't mix them up
+            self._snapshot = await self._publish(replace(loaded, version=saved.version + 1))
+        return True
+
+    async def apply_changes(self, upserts: list, deleted_ids: Iterable[str] = ()):
+        """
+        Incrementally apply inserted/updated and deleted recipes
+        Schedules a background refit once too many rows use a stale IDF
+        """
+        deleted_ids = {str(i) for i in deleted_ids}
+        if not upserts and not deleted_ids:
+            return
+
+        async with self._write_lock:
+            current = self._current()
+            snapshot, added = await asyncio.to_thread(self._apply, current, upserts, deleted_ids)
+            self._snapshot = snapshot = await self._publish(snapshot, previous=current, added=added)
+
+        logger.info(
+            f"Applied {len(upserts)} upserts, {len(deleted_ids)} deletes "
+            f"(version {snapshot.version}, {snapshot.size} recipes)"
+        )
+
+        if snapshot.stale_rows > self.rebuild_ratio * max(snapshot.size, 1):
+            self.schedule_rebuild()
+
+    async def _publish(
+        self,
+        snapshot: IndexSnapshot,
+        previous: Optional[IndexSnapshot] = None,
+        added: Optional[sparse.csr_matrix] = None
+    ) -> IndexSnapshot:
+        """
+        Bring the shards up to `snapshot` (called under the write lock, before
+        the swap: readers keep the previous snapshot, which the shards still
+        hold, meanwhile). Returns the snapshot to serve: lean once the shards
+        hold it, else as given, scored in-process
+        previous, added: ship only the rows appended since `previous`
+        """
+        if self.shards is None:
+            return snapshot
+        try:
+            if previous is None:
+                await asyncio.to_thread(self.shards.load, snapshot)
+            else:
+                await asyncio.to_thread(self.shards.apply, previous, snapshot, added)
+            return snapshot.lean()
+        except Exception as e:
+            logger.error(f"Search shard update failed: {e}")
+            if snapshot.is_lean:
+                self.schedule_rebuild()
+            return snapshot
+
+    def _shards_lost(self, snapshot: IndexSnapshot) -> RuntimeError:
+        """
+        The shards no longer hold a lean snapshot (their pool restarted):
+        refit from the resident columns, which ships them a fresh copy
+        """
+        if snapshot is self._snapshot:
+            self.schedule_rebuild()
+        return RuntimeError("Search shards are unavailable; the index is being rebuilt")
+
+    async def merged(self, snapshot: IndexSnapshot) -> IndexSnapshot:
+        """snapshot.merged(), fetching a lean snapshot's vectors back from the shards"""
+        if not snapshot.is_lean:
+            return await asyncio.to_thread(snapshot.merged)
+        vectors = await self._vectors(snapshot, snapshot.live_rows())
+        return await asyncio.to_thread(snapshot.merged, vectors)
+
+    async def _vectors(self, snapshot: IndexSnapshot, rows) -> sparse.csr_matrix:
+        """snapshot.vectors(rows), fetched from the shards when the snapshot is lean"""
+        if not snapshot.is_lean:
+            return snapshot.vectors(rows)
+        try:
+            return await asyncio.to_thread(self.shards.vectors, snapshot, rows)
+        except Exception as e:
+            logger.error(f"Fetching vectors from the search shards failed: {e}")
+            raise self._shards_lost(snapshot)
+
+    def schedule_rebuild(self):
+        """Refit from the resident recipes without blocking readers"""
+        if self._rebuild_task and not self._rebuild_task.done():
+            return
+        self._rebuild_task = asyncio.create_task(self._rebuild())
+
+    async def _rebuild(self):
+        try:
+            async with self._write_lock:
+                current = self._current()
+                logger.info(f"Rebuilding search index ({current.size} recipes)")
+                rows = current.live_rows()
+                columns = current.columns if current.live is None else current.columns.take(rows)
+                # The IDF drifted, the embeddings did not: keep the int8 codes
+                encoded = None
+                if current.dense is not None:
+                    codes, scales = current.dense.row_codes()
+                    encoded = (codes[rows], scales[rows])
+                fitted = await asyncio.to_thread(self._fit, columns, current.version + 1, encoded)
+                self._snapshot = await self._publish(fitted)
+            logger.info(f"Rebuild complete (version {self._snapshot.version})")
+        except Exception as e:
+            logger.error(f"Search index rebuild failed: {e}")
+
+    def schedule_embedding(self):
+        """Encode the resident recipes without blocking readers or deltas; no-op once dense"""
+        if not self.embedding_pending or (self._embed_task and not self._embed_task.done()):
+            return
+        self._embed_task = asyncio.create_task(self._embed())
+
+    async def _embed(self):
+        """
+        Encode the current rows outside the write lock (minutes on a large
+        catalog), then attach the codes to whichever snapshot is current by
+        then: rows are matched by content, the few added meanwhile are
+        encoded under the lock
+        """
+        try:
+            snapshot = self._current()
+            rows = snapshot.live_rows()
+            if not len(rows):
+                return
+            logger.info(f"Encoding {len(rows)} recipes for dense search")
+            columns = snapshot.columns if snapshot.live is None else snapshot.columns.take(rows)
+            encoded = await asyncio.to_thread(self._encode_columns, columns)
+            if encoded is None:
+                return
+
+            async with self._write_lock:
+                current = self._current()
+                if current.dense is not None:
+                    return
+                dense = await asyncio.to_thread(self._dense_for, current, columns, encoded)
+                if dense is None:
+                    return
+                self._snapshot = replace(current, version=current.version + 1, dense=dense)
+            logger.info(f"Dense index ready (version {self._snapshot.version})")
+        except Exception as e:
+            logger.error(f"Building the dense index failed: {e}")
+
+    def _dense_for(
+        self,
+        snapshot: IndexSnapshot,
+        columns: RecipeColumns,
+        encoded: tuple[np.ndarray, np.ndarray]
+    ) -> Optional[IVFIndex]:
+        """
+        IVF index in snapshot's row numbering from (codes, scales) of `columns`
+        Rows whose content was not encoded are encoded now; dead rows get
+        zero codes (masked at search) and take no part in training the lists
+        """
+        codes, scales = encoded
+        if snapshot.live is None and snapshot.columns is columns:
+            return IVFIndex.build(codes, scales)
+
+        position = {columns.digest([i]): i for i in range(len(columns))}
+        live = snapshot.live_rows()
+        matched = {row: position.get(snapshot.columns.digest([row])) for row in live.tolist()}
+        missing = [row for row, i in matched.items() if i is None]
+
+        row_codes = np.zeros((snapshot.n_rows, codes.shape[1]), dtype=codes.dtype)
+        row_scales = np.ones(snapshot.n_rows, dtype=scales.dtype)
+        found = [row for row, i in matched.items() if i is not None]
+        row_codes[found] = codes[[matched[row] for row in found]]
+        row_scales[found] = scales[[matched[row] for row in found]]
+        if missing:
+            extra = self._encode_columns(snapshot.columns.take(missing))
+            if extra is None:
+                return None
+            row_codes[missing], row_scales[missing] = extra
+
+        if snapshot.live is None:
+            return IVFIndex.build(row_codes, row_scales)
+        centroids = IVFIndex.build(row_codes[live], row_scales[live]).centroids
+        return IVFIndex.build(row_codes, row_scales, centroids=centroids)
+
+    async def search(
+        self,
+        query: str,
+        k: int = 10,
+        mode: str = "lexical",
+        filters: Optional[dict] = None,
+        fields: Iterable[str] = DEFAULT_FIELDS
+    ) -> list:
         """
         Semantic search for recipes
         Returns top k results with relevance scores
+        mode: "lexical" (TF-IDF), "semantic" (dense embeddings) or "hybrid" (both, fused)
+        filters: facet filters, applied as a row mask before scoring
+        fields: projected fields to return per hit
         """
-        if self.recipe_vectors is None:
-            raise ValueError("Search index not built. Call index_recipes() first")
-        
-        # Vectorize query
-        query_vector = self.vectorizer.transform([query])
-        
-        # Calculate cosine similarity
-        similarities = cosine_similarity(query_vector, self.recipe_vectors)[0]
-        
-        # Get top k indices
-        top_indices = similarities.argsort()[-k:][::-1]
-        
-        # Return results with scores
-        results = []
-        for idx in top_indices:
-            if similarities[idx] > 0:  # Only include relevant results
-                results.append({
-                    **self.recipes[idx],
-                    "relevance_score": float(similarities[idx]),
-                    "rank": len(results) + 1
+        return (await self.search_batch([query], k=k, mode=mode, filters=filters, fields=fields))[0]
+
+    async def search_batch(
+        self,
+        queries: list,
+        k: int = 10,
+        mode: str = "lexical",
+        filters: Optional[dict] = None,
+        fields: Iterable[str] = DEFAULT_FIELDS
+    ) -> list:
+        """
+        Search many queries at once: one vectorizer/encoder call and one sparse
+        product for the whole batch. Returns one result list per query
+        Rankings are cached per (query, mode, k, filters, index content token),
+        so instances serving the same recipes share entries; only cache
+        misses are scored
+        """
+        snapshot = self._current()
+
+        keys = cached = None
+        if self.cache is not None:
+            keys = [self.cache.key(q, snapshot.token, mode, k, filters) for q in queries]
+            cached = await self.cache.get_many(snapshot.token, keys)
+            missing = [i for i, entry in enumerate(cached) if entry is None]
+        else:
+            missing = list(range(len(queries)))
+
+        ranked = [None] * len(queries)
+        if missing:
+            pending = [queries[i] for i in missing]
+            mask = snapshot.mask(filters)
+            if mode == "semantic":
+                fresh = await self._dense_rank(snapshot, pending, k, mask)
+            elif mode == "hybrid":
+                fresh = await self._hybrid_rank(snapshot, pending, k, mask)
+            else:
+                fresh = await self._lexical_rank(snapshot, pending, k, mask)
+            for i, entry in zip(missing, fresh):
+                ranked[i] = entry
+
+            if self.cache is not None:
+                ids = snapshot.columns.ids
+                await self.cache.set_many(snapshot.token, {
+                    keys[i]: ([ids[row] for row in rows], scores.tolist())
+                    for i, (rows, scores) in zip(missing, fresh)
                 })
-        
-        return results
-    
-    async def find_similar(self, recipe_id: str, k: int = 5) -> list:
-        """Find similar recipes to a given recipe"""
-        # Find recipe index
-        recipe_idx = next(
-            (i for i, r in enumerate(self.recipes) if str(r.get('_id')) == recipe_id),
-            None
+
+        if cached is not None:
+            for i, entry in enumerate(cached):
+                if entry is not None:
+                    ranked[i] = self._resolve(snapshot, *entry)
+
+        return [
+            self._hits(snapshot, rows, scores, "relevance_score", fields, with_rank=True)
+            for rows, scores in ranked
+        ]
+
+    @staticmethod
+    def _resolve(snapshot: IndexSnapshot, ids: list, scores: list) -> tuple[np.ndarray, np.ndarray]:
+        """Cached (ids, scores) -> (rows, scores) against this snapshot"""
+        found = [(snapshot.id_to_row.get(i), s) for i, s in zip(ids, scores)]
+        found = [(row, s) for row, s in found if row is not None]
+        return (
+            np.array([row for row, _ in found], dtype=np.int64),
+            np.array([s for _, s in found], dtype=np.float32)
         )
-        
-        if recipe_idx is None:
-            return []
-        
-        # Get recipe vector
-        recipe_vector = self.recipe_vectors[recipe_idx]
-        
-        # Calculate similarities
-        similarities = cosine_similarity(recipe_vector, self.recipe_vectors)[0]
-        
-        # Get top k (excluding the recipe itself)
-        top_indices = similarities.argsort()[-(k+1):-1][::-1]
-        
+
+    @staticmethod
+    def _hits(
+        snapshot: IndexSnapshot,
+        rows: np.ndarray,
+        scores: np.ndarray,
+        score_key: str,
+        fields: Iterable[str] = DEFAULT_FIELDS,
+        with_rank: bool = False
+    ) -> list:
+        """Projected result documents for ranked rows"""
         results = []
-        for idx in top_indices:
-            results.append({
-                **self.recipes[idx],
-                "similarity_score": float(similarities[idx])
-            })
-        
+        for row, score in zip(rows, scores):
+            if score > 0:  # Only include relevant results
+                hit = snapshot.document(row, fields)
+                hit[score_key] = float(score)
+                if with_rank:
+                    hit["rank"] = len(results) + 1
+                results.append(hit)
         return results
 
-# Singleton
-search_engine = SearchEngine()
+    async def _lexical_rank(
+        self,
+        snapshot: IndexSnapshot,
+        queries: list,
+        k: int,
+        mask: Optional[np.ndarray] = None
+    ) -> list:
+        """TF-IDF top-k over recipes sharing a term with each query"""
+        vectors = snapshot.vectorize(queries)
+        return await self._sparse_rank(snapshot, vectors, k, mask=mask)
 
+    async def _sparse_rank(
+        self,
+        snapshot: IndexSnapshot,
+        vectors: sparse.csr_matrix,
+        k: int,
+        mask: Optional[np.ndarray] = None,
+        exclude: Optional[np.ndarray] = None
+    ) -> list:
+        """
+        Top-k index rows per row of `vectors`: scattered across the shards
+        when they hold this snapshot, otherwise scored in-process
+        """
+        if self.shards is not None:
+            try:
+                ranked = await asyncio.to_thread(self.shards.search, snapshot, vectors, k, mask, exclude)
+                if ranked is not None:
+                    return ranked
+            except Exception as e:
+                logger.error(f"Sharded search failed: {e}")
+        if snapshot.is_lean:
+            raise self._shards_lost(snapshot)
+        return top_k_per_row(snapshot.score(vectors), k, mask, exclude)
+
+    async def _dense_rank(
+        self,
+        snapshot: IndexSnapshot,
+        queries: list,
+        k: int,
+        mask: Optional[np.ndarray] = None
+    ) -> list:
+        """Approximate nearest neighbours of the batch-encoded queries"""
+        if snapshot.dense is None or self.encoder is None:
+            raise ValueError("Semantic search is not available")
+
+        query_vectors = await asyncio.to_thread(self.encoder.encode, queries)
+        return [
+            snapshot.dense.search(vector, k, settings.EMBEDDING_N_PROBE, mask=mask)
+            for vector in query_vectors
+        ]
+
+    async def _hybrid_rank(
+        self,
+        snapshot: IndexSnapshot,
+        queries: list,
+        k: int,
+        mask: Optional[np.ndarray] = None
+    ) -> list:
+        """Reciprocal rank fusion of the lexical and dense rankings"""
+        depth = max(k * settings.HYBRID_DEPTH_FACTOR, k)
+
+        lexical = await self._lexical_rank(snapshot, queries, depth, mask)
+        dense = await self._dense_rank(snapshot, queries, depth, mask)
+
+        ranked = []
+        for (lexical_rows, lexical_scores), (dense_rows, _) in zip(lexical, dense):
+            rows, scores = reciprocal_rank_fusion(
+                [lexical_rows[lexical_scores > 0], dense_rows],
+                k=settings.HYBRID_RRF_K
+            )
+            ranked.append((rows[:k], scores[:k]))
+        return ranked
+
+    async def find_similar(
+        self,
+        recipe_id: str,
+        k: int = 5,
+        fields: Iterable[str] = DEFAULT_FIELDS
+    ) -> list:
+        """Find similar recipes to a given recipe"""
+        return (await self.find_similar_batch([recipe_id], k=k, fields=fields))[recipe_id]
+
+    async def find_similar_batch(
+        self,
+        recipe_ids: list,
+        k: int = 5,
+        fields: Iterable[str] = DEFAULT_FIELDS
+    ) -> dict:
+        """
+        Similar recipes for many recipes with one sparse product
+        Returns {recipe_id: results}; unknown ids map to []
+        """
+        snapshot = self._current()
+
+        found = [(recipe_id, snapshot.id_to_row.get(recipe_id)) for recipe_id in recipe_ids]
+        rows = np.array([row for _, row in found if row is not None], dtype=np.int64)
+
+        ranked = []
+        if rows.size:
+            vectors = await self._vectors(snapshot, rows)
+            # Not similar to itself
+            ranked = await self._sparse_rank(snapshot, vectors, k, mask=snapshot.mask(), exclude=rows)
+
+        similar = {recipe_id: [] for recipe_id in recipe_ids}
+        for (recipe_id, _), (top_rows, top_scores) in zip(
+            [f for f in found if f[1] is not None], ranked
+        ):
+            similar[recipe_id] = self._hits(snapshot, top_rows, top_scores, "similarity_score", fields)
+        return similar
+
+# Singleton
+search_engine = SearchEngine(
+    rebuild_ratio=settings.SEARCH_INDEX_REBUILD_RATIO,
+    encoder=embedding_encoder if settings.ENABLE_EMBEDDINGS else None,
+    cache=query_cache if settings.ENABLE_SEARCH_CACHE else None,
+    shards=shard_pool if settings.SEARCH_SHARDS > 1 else None
+)
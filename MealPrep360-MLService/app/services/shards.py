@@ -0,0 +1,463 @@
+"""Scatter-gather scoring of the TF-IDF index across shard processes shared by a node's workers"""
+from concurrent.futures import Future
+from dataclasses import dataclass
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+from scipy import sparse
+import numpy as np
+from loguru import logger
+import fcntl
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+from typing import Optional
+
+from app.core.config import settings
+from app.services.ranking import top_k, top_k_per_row, widen
+
+# Appended blocks a shard state keeps before folding them into one
+MAX_DELTA_BLOCKS = 8
+
+def shard_of(recipe_ids, n_shards: int) -> np.ndarray:
+    """Stable shard per recipe id (crc32, identical in every process)"""
+    return np.fromiter(
+        (zlib.crc32(str(i).encode()) % n_shards for i in recipe_ids),
+        dtype=np.int16,
+        count=len(recipe_ids)
+    )
+
+class _ShardState:
+    """
+    A shard's rows of one index layout, in shard-local order: the loaded
+    rows plus blocks appended by deltas (derived states share the blocks)
+    """
+
+    def __init__(self, blocks: list):
+        self.blocks = blocks  # [(vectors csr, postings csc)]
+        self.size = sum(vectors.shape[0] for vectors, _ in blocks)
+
+    @classmethod
+    def load(cls, payload) -> "_ShardState":
+        """payload: the rows' vectors, or ("file", snapshot dir, shape, rows) to read them from disk"""
+        if isinstance(payload, tuple):
+            _, path, shape, rows = payload
+            mapped = sparse.csr_matrix(
+                tuple(np.load(Path(path) / f"{part}.npy", mmap_mode="r") for part in ("data", "indices", "indptr")),
+                shape=shape,
+                copy=False
+            )
+            payload = mapped[rows]
+        return cls([(payload, payload.tocsc())])
+
+    def extend(self, added: sparse.csr_matrix) -> "_ShardState":
+        if added.shape[0] == 0:
+            return self
+        blocks = self.blocks + [(added, added.tocsc())]
+        if len(blocks) > MAX_DELTA_BLOCKS + 1:
+            delta = sparse.vstack([widen(vectors, added.shape[1]) for vectors, _ in blocks[1:]], format="csr")
+            blocks = [blocks[0], (delta, delta.tocsc())]
+        return _ShardState(blocks)
+
+    def search(self, queries: sparse.csr_matrix, k: int, packed: Optional[np.ndarray]) -> list:
+        mask = None if packed is None else np.unpackbits(packed, count=self.size).astype(bool)
+        scores = sparse.hstack([queries[:, :postings.shape[1]] @ postings.T for _, postings in self.blocks])
+        return top_k_per_row(scores.tocsr(), k, mask)
+
+    def rows(self, local: np.ndarray) -> sparse.csr_matrix:
+        """Vectors of shard-local rows, in order"""
+        width = max(vectors.shape[1] for vectors, _ in self.blocks)
+        offsets = np.cumsum([0] + [vectors.shape[0] for vectors, _ in self.blocks])
+        block_of = np.searchsorted(offsets, local, side="right") - 1
+        parts, order = [], []
+        for b, (vectors, _) in enumerate(self.blocks):
+            picked = np.flatnonzero(block_of == b)
+            if picked.size:
+                parts.append(widen(vectors[local[picked] - offsets[b]], width))
+                order.append(picked)
+        if not parts:
+            return sparse.csr_matrix((0, width), dtype=np.float32)
+        return sparse.vstack(parts, format="csr")[np.argsort(np.concatenate(order))]
+
+def _serve_shard(path: str, authkey: bytes, parent: int):
+    """
+    Shard server on a unix socket, one thread per connected worker
+    Holds this shard's rows of every layout some worker claims; a layout
+    nobody claims any more is dropped. Exits when the pool owner dies.
+    """
+    states, claims = {}, {}
+    lock = threading.Lock()
+
+    def hold(name: int, keep: list):
+        claims[name] = set(keep)
+        held = set().union(*claims.values())
+        for key in [key for key in states if key not in held]:
+            del states[key]
+
+    def handle(name: int, command: str, args: tuple):
+        if command == "search":
+            key, queries, k, packed = args
+            return states[key].search(queries, k, packed)
+        if command == "rows":
+            key, local = args
+            return states[key].rows(local)
+        if command == "claim":
+            key, keep = args
+            with lock:
+                if key not in states:
+                    return False
+                hold(name, keep)
+            return True
+        if command == "load":
+            key, keep, payload = args
+            state = _ShardState.load(payload)
+            with lock:
+                states.setdefault(key, state)
+                hold(name, keep)
+            return state.size
+        if command == "apply":
+            key, base_key, keep, added = args
+            with lock:
+                state = states.get(key)
+                base = states.get(base_key)
+            if state is None:
+                if base is None:
+                    raise KeyError(f"Shard does not hold layout {base_key}")
+                state = base.extend(added)
+            with lock:
+                states.setdefault(key, state)
+                hold(name, keep)
+            return state.size
+        raise ValueError(f"Unknown shard command {command}")
+
+    def serve(conn, name: int):
+        try:
+            while True:
+                request_id, command, *args = conn.recv()
+                try:
+                    reply = handle(name, command, tuple(args))
+                except Exception as e:
+                    reply = e
+                conn.send((request_id, reply))
+        except (EOFError, OSError):
+            pass
+        finally:
+            with lock:
+                hold(name, [])
+                del claims[name]
+            conn.close()
+
+    def watch_parent():
+        while os.getppid() == parent:
+            time.sleep(1)
+        os._exit(0)
+
+    threading.Thread(target=watch_parent, daemon=True).start()
+    listener = Listener(path, family="AF_UNIX", authkey=authkey)
+    for name in itertools.count():
+        try:
+            conn = listener.accept()
+        except (OSError, AuthenticationError, EOFError):
+            continue
+        threading.Thread(target=serve, args=(conn, name), daemon=True).start()
+
+class _ShardClient:
+    """One worker's connection to a shard server; requests are pipelined, replies matched by id"""
+
+    def __init__(self, path: str, authkey: bytes):
+        self._conn = Client(path, family="AF_UNIX", authkey=authkey)
+        self._send_lock = threading.Lock()
+        self._pending: dict = {}
+        self._ids = itertools.count()
+        self.closed = False
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def request(self, command: str, *args) -> Future:
+        future = Future()
+        with self._send_lock:
+            if self.closed:
+                raise ConnectionError("Search shard connection closed")
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            self._conn.send((request_id, command) + args)
+        return future
+
+    def _read(self):
+        try:
+            while True:
+                request_id, reply = self._conn.recv()
+                future = self._pending.pop(request_id)
+                if isinstance(reply, Exception):
+                    future.set_exception(reply)
+                else:
+                    future.set_result(reply)
+        except (EOFError, OSError) as e:
+            with self._send_lock:
+                self.closed = True
+                pending, self._pending = self._pending, {}
+            for future in pending.values():
+                future.set_exception(ConnectionError(f"Search shard connection lost: {e}"))
+
+    def close(self):
+        self._conn.close()
+
+@dataclass(frozen=True)
+class _Layout:
+    """Where each snapshot row lives: its shard and position there"""
+    assignment: np.ndarray  # (n_rows,) shard of each snapshot row
+    members: list           # per shard: snapshot rows in shard-local order
+    local: np.ndarray       # (n_rows,) shard-local position of each snapshot row
+
+    @classmethod
+    def of(cls, assignment: np.ndarray, n_shards: int) -> "_Layout":
+        members = [np.flatnonzero(assignment == s) for s in range(n_shards)]
+        local = np.empty(len(assignment), dtype=np.int64)
+        for rows in members:
+            local[rows] = np.arange(len(rows))
+        return cls(assignment=assignment, members=members, local=local)
+
+class ShardPool:
+    """
+    N shard server processes per node, shared by every worker on it, each
+    scoring the recipes whose id hashes to it
+
+    The first worker to lock <directory>/pool.lock starts the servers on
+    unix sockets there; the others connect to them, and take over if the
+    owner goes away. Shards keep their rows per snapshot layout
+    (IndexSnapshot.layout), so workers serving the same snapshot share one
+    copy, and follow each worker through full loads and incremental deltas
+    (appended rows; dead rows are excluded by the search mask). The
+    coordinator (the SearchEngine) vectorizes queries once and merges each
+    shard's local top-k; once the shards hold a snapshot it drops its own
+    copy of the vectors. Requests to a shard are pipelined over one
+    connection per worker, so concurrent queries don't wait for each other.
+    """
+
+    def __init__(self, n_shards: int, directory: str):
+        self.n_shards = n_shards
+        self.directory = Path(directory)
+        self._clients: list = []
+        self._processes: list = []
+        self._lock_file = None
+        self._connect_lock = threading.Lock()
+        self._layouts: dict = {}  # layout key -> _Layout, for the layouts this worker holds
+        self._current: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        clients = self._clients
+        return bool(clients) and not any(client.closed for client in clients)
+
+    @property
+    def owner(self) -> bool:
+        return self._lock_file is not None
+
+    def start(self):
+        with self._connect_lock:
+            self._connect()
+
+    def _socket(self, shard: int) -> str:
+        return str(self.directory / f"shard-{shard}.sock")
+
+    def _spawn(self):
+        """Start the node's shard servers (this worker holds pool.lock)"""
+        authkey = os.urandom(32)
+        pending = self.directory / f".authkey.{os.getpid()}"
+        with os.fdopen(os.open(pending, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+            f.write(authkey)
+        os.replace(pending, self.directory / "authkey")
+
+        context = multiprocessing.get_context("spawn")
+        for s in range(self.n_shards):
+            Path(self._socket(s)).unlink(missing_ok=True)
+            process = context.Process(
+                target=_serve_shard,
+                args=(self._socket(s), authkey, os.getpid()),
+                daemon=True
+            )
+            process.start()
+            self._processes.append(process)
+        logger.info(f"Started {self.n_shards} search shard servers in {self.directory}")
+
+    def _take_ownership(self):
+        if self.owner:
+            return
+        lock_file = open(self.directory / "pool.lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return
+        self._lock_file = lock_file
+        self._spawn()
+
+    def _connect(self):
+        """(Re)connect to the node's shard servers, starting them if no worker runs them"""
+        for client in self._clients:
+            client.close()
+        self._clients, self._layouts, self._current = [], {}, None
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        deadline = time.monotonic() + settings.SEARCH_SHARD_CONNECT_SECONDS
+        while True:
+            self._take_ownership()
+            clients = []
+            try:
+                authkey = (self.directory / "authkey").read_bytes()
+                for s in range(self.n_shards):
+                    clients.append(_ShardClient(self._socket(s), authkey))
+                self._clients = clients
+                return
+            except (OSError, EOFError, AuthenticationError) as e:
+                # Servers still starting, or a previous owner's stale sockets
+                for client in clients:
+                    client.close()
+                if time.monotonic() > deadline:
+                    raise ConnectionError(f"Search shards unavailable: {e}")
+                time.sleep(0.1)
+
+    def _ensure(self) -> list:
+        with self._connect_lock:
+            if not self.running:
+                self._connect()
+            return self._clients
+
+    def stop(self):
+        with self._connect_lock:
+            for client in self._clients:
+                client.close()
+            for process in self._processes:
+                process.terminate()
+                process.join(timeout=5)
+            if self._lock_file is not None:
+                self._lock_file.close()
+            self._clients, self._processes, self._lock_file = [], [], None
+            self._layouts, self._current = {}, None
+
+    def _keep(self, key: str) -> list:
+        """
+        Layouts this worker keeps claimed once `key` is current: it and the
+        previous one, which readers that started before the swap still use
+        """
+        return [k for k in (self._current, key) if k is not None]
+
+    def _hold(self, key: str, layout: _Layout):
+        layouts = {k: self._layouts[k] for k in self._keep(key) if k in self._layouts}
+        layouts[key] = layout
+        self._layouts, self._current = layouts, key
+
+    @staticmethod
+    def _gather(futures: list) -> list:
+        return [future.result() for future in futures]
+
+    def load(self, snapshot):
+        """
+        Give every shard its rows of `snapshot`, unless another worker
+        already loaded the same layout: shipped from this worker, or read
+        by the shards from the snapshot's files when it was loaded from disk
+        """
+        clients = self._ensure()
+        key = snapshot.layout
+        layout = _Layout.of(shard_of(snapshot.columns.ids, self.n_shards), self.n_shards)
+        keep = self._keep(key)
+        held = self._gather([client.request("claim", key, keep) for client in clients])
+
+        missing = [s for s in range(self.n_shards) if not held[s]]
+        if missing:
+            self._gather([
+                clients[s].request("load", key, keep, self._payload(snapshot, layout.members[s]))
+                for s in missing
+            ])
+            logger.info(f"Loaded search shards (version {snapshot.version}, layout {key[:12]})")
+        self._hold(key, layout)
+
+    @staticmethod
+    def _payload(snapshot, rows: np.ndarray):
+        if snapshot.source is not None and not snapshot.is_lean and snapshot.delta_vectors is None:
+            return ("file", snapshot.source, snapshot.recipe_vectors.shape, rows)
+        if snapshot.recipe_vectors is None:
+            raise RuntimeError("Snapshot holds no vectors to load into the shards")
+        return snapshot.vectors(rows)
+
+    def apply(self, previous, snapshot, added: sparse.csr_matrix):
+        """
+        Follow an incremental update: append the rows `snapshot` added to
+        `previous` (their vectors: `added`; mirrors SearchEngine._apply,
+        replaced rows stay, masked dead)
+        """
+        base = self._layouts.get(previous.layout)
+        if base is None or not self.running:
+            self.load(snapshot)
+            return
+
+        clients = self._clients
+        first_new = previous.n_rows
+        new_assignment = shard_of(snapshot.columns.ids[first_new:], self.n_shards)
+        keep = self._keep(snapshot.layout)
+        self._gather([
+            client.request(
+                "apply", snapshot.layout, previous.layout, keep, added[np.flatnonzero(new_assignment == s)]
+            )
+            for s, client in enumerate(clients)
+        ])
+        self._hold(snapshot.layout, _Layout.of(np.concatenate([base.assignment, new_assignment]), self.n_shards))
+
+    def search(
+        self,
+        snapshot,
+        queries: sparse.csr_matrix,
+        k: int,
+        mask: Optional[np.ndarray] = None,
+        exclude: Optional[np.ndarray] = None
+    ) -> Optional[list]:
+        """
+        [(rows, scores)] per query in snapshot row numbers, or None if the
+        shards do not hold this snapshot's layout
+        exclude: optional snapshot row to drop from each query's result
+        """
+        layout = self._layouts.get(snapshot.layout)
+        clients = self._clients
+        if layout is None or not self.running:
+            return None  # Shards are behind (or loading): don't wait for them
+
+        depth = k + 1 if exclude is not None else k
+        replies = self._gather([
+            client.request(
+                "search", snapshot.layout, queries, depth, None if mask is None else np.packbits(mask[rows])
+            )
+            for client, rows in zip(clients, layout.members)
+        ])
+
+        ranked = []
+        for i in range(queries.shape[0]):
+            rows = np.concatenate([layout.members[s][reply[i][0]] for s, reply in enumerate(replies)])
+            scores = np.concatenate([reply[i][1] for reply in replies])
+            if exclude is not None:
+                keep = rows != exclude[i]
+                rows, scores = rows[keep], scores[keep]
+            best = top_k(scores, k)
+            ranked.append((rows[best], scores[best]))
+        return ranked
+
+    def vectors(self, snapshot, rows) -> sparse.csr_matrix:
+        """Recipe vectors of snapshot rows, in order, fetched from the shards"""
+        layout = self._layouts.get(snapshot.layout)
+        if layout is None or not self.running:
+            raise RuntimeError("Search shards do not hold this snapshot")
+
+        rows = np.asarray(rows, dtype=np.int64)
+        shards = layout.assignment[rows]
+        picked = [np.flatnonzero(shards == s) for s in range(self.n_shards)]
+        replies = self._gather([
+            client.request("rows", snapshot.layout, layout.local[rows[p]])
+            for client, p in zip(self._clients, picked)
+        ])
+        width = len(snapshot.vectorizer.vocabulary_)
+        stacked = sparse.vstack([widen(reply, width) for reply in replies], format="csr")
+        return stacked[np.argsort(np.concatenate(picked))]
+
+# Singleton
+shard_pool = ShardPool(settings.SEARCH_SHARDS, settings.SEARCH_SHARD_DIR)
@@ -0,0 +1 @@
+"""Offline benchmarks for the ML service (run from the service root: python -m benchmarks.<name>)"""
@@ -0,0 +1,64 @@
+"""
+N single search/similarity calls vs one batch call
+
+    python -m benchmarks.bench_batch --size 100000 --batch 21 100
+
+Measures the engine only; over HTTP each single call also pays a request
+round-trip, so the real gap is larger.
+"""
+import argparse
+import asyncio
+import time
+
+from app.services.search_engine import SearchEngine
+from benchmarks.corpus import generate_queries, generate_recipes
+
+async def timed(coroutine) -> float:
+    start = time.perf_counter()
+    await coroutine
+    return (time.perf_counter() - start) * 1000
+
+async def singles(engine: SearchEngine, queries: list, k: int):
+    for query in queries:
+        await engine.search(query, k=k)
+
+async def similar_singles(engine: SearchEngine, recipe_ids: list, k: int):
+    for recipe_id in recipe_ids:
+        await engine.find_similar(recipe_id, k=k)
+
+async def run(size: int, batches: list, k: int, repeats: int):
+    engine = SearchEngine()
+    await engine.index_recipes(generate_recipes(size))
+    recipe_ids = list(engine.snapshot.columns.ids)
+
+    print(f"{size:,} recipes, k={k}, best of {repeats}")
+    for batch in batches:
+        queries = generate_queries(batch)
+        ids = recipe_ids[:batch]
+
+        single = min([await timed(singles(engine, queries, k)) for _ in range(repeats)])
+        batched = min([await timed(engine.search_batch(queries, k=k)) for _ in range(repeats)])
+        similar_single = min([await timed(similar_singles(engine, ids, k)) for _ in range(repeats)])
+        similar_batched = min([await timed(engine.find_similar_batch(ids, k=k)) for _ in range(repeats)])
+
+        print(
+            f"  batch {batch:>4} | search: {batch} singles {single:8.2f}ms, batch {batched:8.2f}ms "
+            f"({single / batched:4.1f}x) | similar: singles {similar_single:8.2f}ms, "
+            f"batch {similar_batched:8.2f}ms ({similar_single / similar_batched:4.1f}x)"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, nargs="+", default=[21, 100])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    from loguru import logger
+    logger.remove()
+
+    asyncio.run(run(args.size, args.batch, args.k, args.repeats))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+IVF (int8) approximate search vs exact float32 brute force on synthetic embeddings
+
+    python -m benchmarks.bench_dense --sizes 100000 1000000 --n-probe 8 16 32
+
+Vectors are drawn from a Gaussian mixture on the unit sphere (384 dims, like
+all-MiniLM-L6-v2), so they have cluster structure similar to real embeddings
+without needing the model.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.services.embeddings import IVFIndex, quantize
+from app.services.ranking import top_k
+
+def synthetic_embeddings(n: int, dim: int, topics: int = 256, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, topics, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def run(size: int, dim: int, n_queries: int, k: int, n_probes: list):
+    vectors = synthetic_embeddings(size, dim)
+    queries = synthetic_embeddings(n_queries, dim, seed=1)
+
+    start = time.perf_counter()
+    index = IVFIndex.build(*quantize(vectors))
+    build = time.perf_counter() - start
+
+    exact, brute = [], []
+    for query in queries:
+        start = time.perf_counter()
+        exact.append(set(top_k(vectors @ query, k)))
+        brute.append(time.perf_counter() - start)
+
+    print(
+        f"{size:>9,} | build {build:6.1f}s | lists {len(index.centroids):5} | "
+        f"brute p50 {np.percentile(brute, 50) * 1000:7.2f}ms"
+    )
+    for n_probe in n_probes:
+        latencies, recall = [], []
+        for query, truth in zip(queries, exact):
+            start = time.perf_counter()
+            rows, _ = index.search(query, k, n_probe)
+            latencies.append(time.perf_counter() - start)
+            recall.append(len(truth & set(rows.tolist())) / k)
+        print(
+            f"{'':>9} | n_probe {n_probe:3} | p50 {np.percentile(latencies, 50) * 1000:6.2f}ms "
+            f"p95 {np.percentile(latencies, 95) * 1000:6.2f}ms | recall@{k} {np.mean(recall):.3f}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size, args.dim, args.queries, args.k, args.n_probe)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Response size and resident index memory: full documents vs the column store
+
+    python -m benchmarks.bench_payload --size 100000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import time
+import tracemalloc
+
+import orjson
+
+from app.services.projection import STORED_FIELDS, RecipeColumns
+from app.services.search_engine import SearchEngine
+from benchmarks.corpus import generate_queries, generate_recipes
+
+def resident(build) -> tuple:
+    """(object, MB still allocated once `build` returns and its temporaries are freed)"""
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return value, current / 1024 / 1024
+
+async def run(size: int, k: int):
+    full, full_mb = resident(lambda: generate_recipes(size))
+    _, columns_mb = resident(lambda: RecipeColumns.from_documents(generate_recipes(size)))
+    print(f"resident recipes ({size}): full documents {full_mb:.0f} MB, column store {columns_mb:.0f} MB")
+
+    engine = SearchEngine()
+    await engine.index_recipes(full)
+    queries = generate_queries(100)
+
+    def response_bytes(batches, encode) -> float:
+        return sum(len(encode(hits)) for hits in batches) / len(batches)
+
+    slim = await engine.search_batch(queries, k=k)
+    stored = await engine.search_batch(queries, k=k, fields=STORED_FIELDS)
+    by_id = {recipe["_id"]: recipe for recipe in full}
+    documents = [
+        [{**by_id[hit["_id"]], "relevance_score": hit["relevance_score"]} for hit in hits]
+        for hits in slim
+    ]
+    print(
+        f"bytes per response (k={k}): default fields {response_bytes(slim, orjson.dumps):.0f}, "
+        f"all stored fields {response_bytes(stored, orjson.dumps):.0f}, "
+        f"full documents {response_bytes(documents, orjson.dumps):.0f}"
+    )
+
+    for name, encode in (("json", lambda hits: json.dumps(hits).encode()), ("orjson", orjson.dumps)):
+        start = time.perf_counter()
+        for hits in documents:
+            encode(hits)
+        print(f"{name} encode, full documents: {(time.perf_counter() - start) / len(documents) * 1e6:.0f} us/response")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(run(args.size, args.k))
+
+if __name__ == "__main__":
+    main()
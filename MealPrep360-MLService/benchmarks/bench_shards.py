@@ -0,0 +1,71 @@
+"""
+In-process vs sharded lexical scoring (p50/p95 per call)
+
+    python -m benchmarks.bench_shards --size 200000 1000000 --shards 4 --batch 1 32
+
+Shards only pay off once one sparse product costs more than the socket
+round-trip to every shard; small indexes should keep SEARCH_SHARDS=0.
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.search_engine import SearchEngine
+from app.services.shards import ShardPool
+from benchmarks.corpus import generate_queries, generate_recipes
+
+async def latencies(call, batches: list) -> np.ndarray:
+    timings = []
+    for batch in batches:
+        start = time.perf_counter()
+        await call(batch)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+def summary(timings: np.ndarray) -> str:
+    return f"p50 {np.percentile(timings, 50):7.2f}ms p95 {np.percentile(timings, 95):7.2f}ms"
+
+async def run(sizes: list, n_shards: int, batch_sizes: list, k: int, rounds: int):
+    pool = ShardPool(n_shards, tempfile.mkdtemp(prefix="shards-"))
+    pool.start()
+    try:
+        for size in sizes:
+            recipes = generate_recipes(size)
+            local, sharded = SearchEngine(), SearchEngine(shards=pool)
+            await local.index_recipes(recipes)
+            await sharded.index_recipes(recipes)
+            recipe_ids = list(local.snapshot.columns.ids)
+            del recipes
+
+            print(f"{size:,} recipes, {n_shards} shards, k={k}, {rounds} calls each")
+            for batch in batch_sizes:
+                queries = generate_queries(rounds * batch)
+                query_batches = [queries[i:i + batch] for i in range(0, len(queries), batch)]
+                id_batches = [recipe_ids[i:i + batch] for i in range(0, rounds * batch, batch)]
+
+                for name, engine in (("local", local), ("sharded", sharded)):
+                    search = await latencies(lambda q: engine.search_batch(q, k=k), query_batches)
+                    similar = await latencies(lambda ids: engine.find_similar_batch(ids, k=k), id_batches)
+                    print(f"  batch {batch:>3} {name:>7} | search {summary(search)} | similar {summary(similar)}")
+    finally:
+        pool.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, nargs="+", default=[200_000])
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 32])
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    from loguru import logger
+    logger.remove()
+
+    asyncio.run(run(args.size, args.shards, args.batch, args.k, args.rounds))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Top-k retrieval benchmark: posting-list pruning + argpartition vs brute force
+
+    python -m benchmarks.bench_topk --sizes 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from app.services.search_engine import SearchEngine
+from benchmarks.corpus import generate_queries, generate_recipes
+
+def brute_force(snapshot, query: str, k: int) -> np.ndarray:
+    """Previous implementation: dense similarity row + full argsort"""
+    similarities = cosine_similarity(snapshot.vectorizer.transform([query]), snapshot.recipe_vectors)[0]
+    return similarities.argsort()[-k:][::-1]
+
+def percentile_ms(samples: list, q: float) -> float:
+    return float(np.percentile(samples, q) * 1000)
+
+async def run(size: int, queries: list, k: int):
+    engine = SearchEngine()
+
+    start = time.perf_counter()
+    await engine.index_recipes(generate_recipes(size))
+    build = time.perf_counter() - start
+    snapshot = engine.snapshot
+
+    pruned, brute = [], []
+    for query in queries:
+        start = time.perf_counter()
+        await engine.search(query, k=k)
+        pruned.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        brute_force(snapshot, query, k)
+        brute.append(time.perf_counter() - start)
+
+    print(
+        f"{size:>9,} | build {build:7.1f}s | "
+        f"pruned p50 {percentile_ms(pruned, 50):7.2f}ms p95 {percentile_ms(pruned, 95):7.2f}ms | "
+        f"brute p50 {percentile_ms(brute, 50):7.2f}ms p95 {percentile_ms(brute, 95):7.2f}ms"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    args = parser.parse_args()
+
+    from loguru import logger
+    logger.remove()
+
+    queries = generate_queries(args.queries)
+    for size in args.sizes:
+        asyncio.run(run(size, queries, args.k))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Synthetic recipe corpus for benchmarks"""
+import numpy as np
+
+PROTEINS = [
+    "chicken", "beef", "pork", "turkey", "salmon", "shrimp", "tofu", "lentil",
+    "chickpea", "black bean", "sausage", "lamb", "cod", "tempeh", "egg", "ham"
+]
+DISHES = [
+    "soup", "stew", "chili", "casserole", "curry", "lasagna", "pot pie", "enchiladas",
+    "meatballs", "burrito", "pasta bake", "stir fry", "tacos", "risotto", "gumbo", "bake"
+]
+FLAVORS = [
+    "creamy", "spicy", "smoky", "garlic", "lemon", "herb", "cheesy", "honey",
+    "ginger", "coconut", "tomato", "mushroom", "pesto", "teriyaki", "cajun", "buffalo"
+]
+EXTRAS = [
+    "spinach", "potato", "sweet potato", "rice", "quinoa", "broccoli", "kale", "corn",
+    "pepper", "onion", "carrot", "zucchini", "squash", "cauliflower", "noodle", "bean"
+]
+TAGS = [
+    "comfort food", "kid-friendly", "slow cooker", "crock pot", "one pot", "high protein",
+    "freezer friendly", "weeknight", "budget", "healthy", "gluten free", "dairy free",
+    "vegetarian", "vegan", "low carb", "meal prep"
+]
+CUISINES = ["American", "Italian", "Mexican", "Indian", "Thai", "Chinese", "French", "Cajun"]
+CATEGORIES = ["soup", "casserole", "pasta dish", "stew", "main dish", "slow cooker"]
+SEASONS = ["spring", "summer", "fall", "winter"]
+DIFFICULTIES = ["easy", "medium", "hard"]
+
+# Query-side paraphrases the lexical index cannot match verbatim
+SYNONYMS = {
+    "chicken": "poultry", "shrimp": "prawns", "beef": "steak", "black bean": "frijoles",
+    "soup": "broth", "stew": "ragout", "chili": "chile con carne", "pasta bake": "baked pasta",
+    "stir fry": "wok", "spicy": "hot", "cheesy": "cheese", "lemon": "citrus",
+    "potato": "spuds", "noodle": "noodles", "slow cooker": "crockpot", "crock pot": "slow-cooker",
+    "kid-friendly": "family friendly", "budget": "cheap", "healthy": "nutritious",
+    "low carb": "keto", "meal prep": "make ahead", "weeknight": "quick dinner",
+}
+CONCEPT_POOLS = [FLAVORS, PROTEINS, EXTRAS, DISHES, TAGS]
+
+def _zipf_choice(rng: np.random.Generator, words: list, size: int) -> np.ndarray:
+    """Skewed word choice so a few terms dominate, like real titles"""
+    weights = 1.0 / np.arange(1, len(words) + 1)
+    return rng.choice(len(words), size=size, p=weights / weights.sum())
+
+def generate_recipes(n: int, seed: int = 42) -> list:
+    """Generate n recipe documents shaped like the Mongo `recipes` collection"""
+    rng = np.random.default_rng(seed)
+
+    flavor = _zipf_choice(rng, FLAVORS, n)
+    protein = _zipf_choice(rng, PROTEINS, n)
+    extra = _zipf_choice(rng, EXTRAS, n)
+    dish = _zipf_choice(rng, DISHES, n)
+    tag_picks = rng.integers(0, len(TAGS), size=(n, 3))
+
+    recipes = []
+    for i in range(n):
+        title = f"{FLAVORS[flavor[i]].title()} {PROTEINS[protein[i]].title()} {EXTRAS[extra[i]].title()} {DISHES[dish[i]].title()}"
+        recipes.append({
+            "_id": f"{i:024x}",
+            "title": title,
+            "description": (
+                f"A {FLAVORS[flavor[i]]} {DISHES[dish[i]]} with {PROTEINS[protein[i]]} "
+                f"and {EXTRAS[extra[i]]}, made ahead and frozen for busy nights."
+            ),
+            "tags": sorted({TAGS[t] for t in tag_picks[i]}),
+            "cuisine": CUISINES[i % len(CUISINES)],
+            "category": CATEGORIES[dish[i] % len(CATEGORIES)],
+            "season": SEASONS[i % len(SEASONS)],
+            "difficulty": DIFFICULTIES[i % len(DIFFICULTIES)],
+            "prepTime": int(rng.integers(5, 90)),
+            "cookTime": int(rng.integers(10, 240)),
+            "servings": int(rng.integers(2, 9)),
+            "saves": min(int(rng.zipf(2.0)) - 1, 10_000),
+            "views": min(int(rng.zipf(2.0)) * 10, 1_000_000),
+            "ingredients": [
+                {"name": PROTEINS[protein[i]], "amount": "1", "unit": "lb"},
+                {"name": EXTRAS[extra[i]], "amount": "2", "unit": "cups"},
+                {"name": FLAVORS[flavor[i]], "amount": "1", "unit": "tbsp"},
+                {"name": "onion", "amount": "1", "unit": "whole"},
+                {"name": "broth", "amount": "4", "unit": "cups"},
+            ],
+            "prepInstructions": [
+                f"Chop the {EXTRAS[extra[i]]} and onion.",
+                f"Season the {PROTEINS[protein[i]]} with salt and pepper.",
+            ],
+            "cookingInstructions": [
+                f"Brown the {PROTEINS[protein[i]]} in a large pot over medium-high heat.",
+                f"Add the vegetables and cook until softened, about 5 minutes.",
+                f"Stir in the broth and simmer for 30 minutes.",
+            ],
+            "defrostInstructions": ["Thaw overnight in the refrigerator."],
+            "images": {
+                "main": f"https://images.mealprep360.com/recipes/{i:024x}/main.jpg",
+                "thumbnail": f"https://images.mealprep360.com/recipes/{i:024x}/thumb.jpg",
+            },
+            "dietaryInfo": [t for t in ("vegetarian", "vegan", "gluten free", "dairy free") if t in {TAGS[x] for x in tag_picks[i]}],
+        })
+    return recipes
+
+def generate_queries(n: int, seed: int = 7) -> list:
+    """Short free-text queries drawn from the same vocabulary"""
+    rng = np.random.default_rng(seed)
+    pools = [FLAVORS, PROTEINS, EXTRAS, DISHES, TAGS]
+    queries = []
+    for _ in range(n):
+        words = [pools[p][rng.integers(0, len(pools[p]))] for p in rng.choice(len(pools), size=2, replace=False)]
+        queries.append(" ".join(words))
+    return queries
+
+def _normalized(text: str) -> str:
+    return " " + " ".join("".join(c if c.isalnum() else " " for c in text.lower()).split()) + " "
+
+def concept_index(recipes: list) -> dict:
+    """concept -> set of recipe ids whose title or tags mention it"""
+    index = {concept: set() for pool in CONCEPT_POOLS for concept in pool}
+    for recipe in recipes:
+        text = _normalized(f"{recipe.get('title', '')} {' '.join(recipe.get('tags', []))}")
+        for concept in index:
+            if _normalized(concept) in text:
+                index[concept].add(str(recipe["_id"]))
+    return index
+
+def generate_labelled_queries(
+    recipes: list,
+    n: int,
+    paraphrase_rate: float = 0.3,
+    seed: int = 11
+) -> list:
+    """
+    Two-concept queries (e.g. "smoky lentil") with binary relevance labels:
+    a recipe is relevant when its title/tags mention both concepts.
+    A share of queries swap a concept for a synonym (kind "paraphrase") to
+    measure what lexical matching misses.
+    [{"query", "kind", "relevant": {recipe_id: 1}}]
+    """
+    rng = np.random.default_rng(seed)
+    index = concept_index(recipes)
+
+    queries = []
+    attempts = 0
+    while len(queries) < n and attempts < n * 50:
+        attempts += 1
+        first, second = rng.choice(len(CONCEPT_POOLS), size=2, replace=False)
+        concepts = [
+            CONCEPT_POOLS[pool][_zipf_choice(rng, CONCEPT_POOLS[pool], 1)[0]]
+            for pool in (first, second)
+        ]
+        relevant = index[concepts[0]] & index[concepts[1]]
+        if not relevant:
+            continue
+
+        kind = "literal"
+        words = list(concepts)
+        if rng.random() < paraphrase_rate:
+            swappable = [i for i, c in enumerate(words) if c in SYNONYMS]
+            if swappable:
+                i = swappable[rng.integers(0, len(swappable))]
+                words[i] = SYNONYMS[words[i]]
+                kind = "paraphrase"
+
+        queries.append({
+            "query": " ".join(words),
+            "kind": kind,
+            "relevant": {recipe_id: 1 for recipe_id in sorted(relevant)}
+        })
+    return queries
@@ -0,0 +1,70 @@
+"""
+Load benchmark corpora and labelled queries from files, so runs need no MongoDB
+
+Recipes: a JSON array or JSON lines, e.g. `mongoexport --collection recipes`
+output ({"$oid"}/{"$date"} wrappers are unwrapped).
+Queries: JSON lines of {"query": str, "relevant": {recipe_id: grade}, "kind": str}
+"""
+from pathlib import Path
+import json
+
+from benchmarks.corpus import generate_labelled_queries, generate_queries, generate_recipes
+
+def _unwrap(value):
+    """Extended JSON -> plain values"""
+    if isinstance(value, dict):
+        if set(value) == {"$oid"}:
+            return value["$oid"]
+        if set(value) == {"$date"}:
+            date = value["$date"]
+            return date.get("$numberLong") if isinstance(date, dict) else date
+        if len(value) == 1 and next(iter(value)) in ("$numberInt", "$numberLong", "$numberDouble"):
+            return float(next(iter(value.values())))
+        return {k: _unwrap(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_unwrap(v) for v in value]
+    return value
+
+def _read_json(path: Path) -> list:
+    text = path.read_text()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def load_recipes(path: str) -> list:
+    return [_unwrap(doc) for doc in _read_json(Path(path))]
+
+def load_queries(path: str) -> list:
+    queries = _read_json(Path(path))
+    for query in queries:
+        query.setdefault("kind", "labelled")
+        query["relevant"] = {str(k): v for k, v in query.get("relevant", {}).items()}
+    return queries
+
+def load_fixture(
+    recipes_path: str = None,
+    queries_path: str = None,
+    size: int = 10_000,
+    n_queries: int = 200
+) -> tuple[list, list]:
+    """(recipes, labelled queries) from files, falling back to the synthetic corpus"""
+    recipes = load_recipes(recipes_path) if recipes_path else generate_recipes(size)
+    if queries_path:
+        queries = load_queries(queries_path)
+    elif recipes_path:
+        # No labels for an exported corpus: latency/memory only
+        queries = [{"query": q, "kind": "unlabelled", "relevant": {}} for q in generate_queries(n_queries)]
+    else:
+        queries = generate_labelled_queries(recipes, n_queries)
+    return recipes, queries
+
+def write_fixture(directory: str, recipes: list, queries: list):
+    """Persist a corpus + labels (JSON lines) to rerun or share a benchmark"""
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / "recipes.jsonl", "w") as f:
+        for recipe in recipes:
+            f.write(json.dumps(recipe, default=str) + "\n")
+    with open(path / "queries.jsonl", "w") as f:
+        for query in queries:
+            f.write(json.dumps(query) + "\n")
@@ -0,0 +1,189 @@
+"""
+Relevance + latency + memory harness for SearchEngine, one process per mode
+
+    python -m benchmarks.harness --size 100000 --queries 300
+    python -m benchmarks.harness --modes lexical hybrid -k 10 --json after.json --baseline before.json
+    python -m benchmarks.harness --recipes export.jsonl --labels queries.jsonl
+    python -m benchmarks.harness --size 20000 --write-fixture fixtures/20k
+
+Each mode is built and queried in a fresh process so peak RSS is its own.
+Reports NDCG@k / recall@k (overall and per query kind), p50/p95/p99
+single-query latency, index build time, index RSS and peak RSS.
+Modes that need the embedding model are skipped when it is unavailable.
+The query cache is not used: every query is scored.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import resource
+import time
+
+import numpy as np
+
+from benchmarks.metrics import latency_summary, ndcg_at_k, recall_at_k
+
+MODES = ("lexical", "semantic", "hybrid")
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 1024 / 1024
+    except OSError:
+        return peak_rss_mb()
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+
+async def evaluate(mode: str, options: dict) -> dict:
+    from app.services.embeddings import embedding_encoder
+    from app.services.search_engine import SearchEngine
+    from benchmarks.fixtures import load_fixture
+
+    recipes, queries = load_fixture(
+        options["recipes"], options["labels"], options["size"], options["queries"]
+    )
+    k = options["k"]
+
+    before = rss_mb()
+    engine = SearchEngine(encoder=None if mode == "lexical" else embedding_encoder)
+    start = time.perf_counter()
+    await engine.index_recipes(recipes)
+    build = time.perf_counter() - start
+    index_rss = rss_mb() - before
+
+    if mode != "lexical" and not engine.has_dense:
+        return {"mode": mode, "skipped": "embedding model unavailable"}
+
+    for query in queries[:10]:  # Warm-up
+        await engine.search(query["query"], k=k, mode=mode)
+
+    latencies, by_kind = [], {}
+    for query in queries:
+        start = time.perf_counter()
+        hits = await engine.search(query["query"], k=k, mode=mode)
+        latencies.append(time.perf_counter() - start)
+
+        if query["relevant"]:
+            ranked = [hit["_id"] for hit in hits]
+            scores = by_kind.setdefault(query["kind"], {"ndcg": [], "recall": []})
+            scores["ndcg"].append(ndcg_at_k(ranked, query["relevant"], k))
+            scores["recall"].append(recall_at_k(ranked, query["relevant"], k))
+
+    quality = {
+        kind: {
+            "queries": len(scores["ndcg"]),
+            f"ndcg@{k}": float(np.mean(scores["ndcg"])),
+            f"recall@{k}": float(np.mean(scores["recall"]))
+        }
+        for kind, scores in sorted(by_kind.items())
+    }
+    if by_kind:
+        all_ndcg = [v for s in by_kind.values() for v in s["ndcg"]]
+        all_recall = [v for s in by_kind.values() for v in s["recall"]]
+        quality["all"] = {
+            "queries": len(all_ndcg),
+            f"ndcg@{k}": float(np.mean(all_ndcg)),
+            f"recall@{k}": float(np.mean(all_recall))
+        }
+
+    return {
+        "mode": mode,
+        "recipes": len(recipes),
+        "build_s": build,
+        "index_rss_mb": index_rss,
+        "peak_rss_mb": peak_rss_mb(),
+        "latency": latency_summary(latencies),
+        "quality": quality
+    }
+
+def _child(mode: str, options: dict, results):
+    from loguru import logger
+    logger.remove()
+    try:
+        results.put(asyncio.run(evaluate(mode, options)))
+    except Exception as e:
+        results.put({"mode": mode, "skipped": f"failed: {e}"})
+
+def run_isolated(mode: str, options: dict) -> dict:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_child, args=(mode, options, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+def _delta(now: float, then: float, lower_is_better: bool) -> str:
+    if not then:
+        return ""
+    change = (now - then) / then * 100
+    better = change < 0 if lower_is_better else change > 0
+    return f" ({change:+.1f}%{'' if abs(change) < 1 else ' better' if better else ' worse'})"
+
+def report(results: list, k: int, baseline: dict):
+    for result in results:
+        mode = result["mode"]
+        if "skipped" in result:
+            print(f"\n[{mode}] skipped: {result['skipped']}")
+            continue
+
+        old = baseline.get(mode, {})
+        latency, old_latency = result["latency"], old.get("latency", {})
+        print(f"\n[{mode}] {result['recipes']:,} recipes")
+        print(
+            f"  build {result['build_s']:.1f}s{_delta(result['build_s'], old.get('build_s'), True)} | "
+            f"index RSS {result['index_rss_mb']:.0f} MB | "
+            f"peak RSS {result['peak_rss_mb']:.0f} MB{_delta(result['peak_rss_mb'], old.get('peak_rss_mb'), True)}"
+        )
+        print("  latency " + " ".join(
+            f"{name} {latency[name]:.2f}ms{_delta(latency[name], old_latency.get(name), True)}"
+            for name in ("p50_ms", "p95_ms", "p99_ms")
+        ) + f" | {latency['qps']:.0f} qps")
+        for kind, scores in result["quality"].items():
+            old_scores = old.get("quality", {}).get(kind, {})
+            print(f"  {kind:<11} ({scores['queries']:>4} queries) " + " ".join(
+                f"{name} {scores[name]:.3f}{_delta(scores[name], old_scores.get(name), False)}"
+                for name in (f"ndcg@{k}", f"recall@{k}")
+            ))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=20_000, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=300, help="Synthetic labelled queries")
+    parser.add_argument("--recipes", help="Recipe fixture (JSON / JSON lines, e.g. mongoexport)")
+    parser.add_argument("--labels", help="Labelled queries (JSON lines)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--json", help="Write results here")
+    parser.add_argument("--baseline", help="Earlier --json output to compare against")
+    parser.add_argument("--write-fixture", help="Save the synthetic corpus + labels to this directory and exit")
+    args = parser.parse_args()
+
+    if args.write_fixture:
+        from benchmarks.fixtures import load_fixture, write_fixture
+        write_fixture(args.write_fixture, *load_fixture(size=args.size, n_queries=args.queries))
+        print(f"Wrote fixture to {args.write_fixture}")
+        return
+
+    options = {
+        "recipes": args.recipes,
+        "labels": args.labels,
+        "size": args.size,
+        "queries": args.queries,
+        "k": args.k
+    }
+    results = [run_isolated(mode, options) for mode in args.modes]
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = {r["mode"]: r for r in json.load(f)["results"]}
+    report(results, args.k, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"options": options, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Ranking quality and latency metrics"""
+import numpy as np
+
+def dcg(gains: list) -> float:
+    return float(sum((2 ** g - 1) / np.log2(i + 2) for i, g in enumerate(gains)))
+
+def ndcg_at_k(ranked_ids: list, relevant: dict, k: int) -> float:
+    """Graded NDCG@k with exponential gain; relevant: {id: grade}"""
+    ideal = dcg(sorted(relevant.values(), reverse=True)[:k])
+    if ideal == 0:
+        return 0.0
+    return dcg([relevant.get(i, 0) for i in ranked_ids[:k]]) / ideal
+
+def recall_at_k(ranked_ids: list, relevant: dict, k: int) -> float:
+    """
+    Share of the attainable relevant results found in the top k
+    (capped at k, so queries with thousands of matches can still score 1.0)
+    """
+    attainable = min(k, sum(1 for grade in relevant.values() if grade > 0))
+    if attainable == 0:
+        return 0.0
+    found = sum(1 for i in ranked_ids[:k] if relevant.get(i, 0) > 0)
+    return found / attainable
+
+def latency_summary(seconds: list) -> dict:
+    ms = np.asarray(seconds) * 1000
+    return {
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "qps": float(len(ms) / (ms.sum() / 1000)) if ms.sum() else 0.0
+    }
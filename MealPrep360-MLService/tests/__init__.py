@@ -0,0 +1,6 @@
+"""Shared test setup: no embedding model, Redis or shard processes in unit tests"""
+import os
+
+os.environ.setdefault("ENABLE_EMBEDDINGS", "false")
+os.environ.setdefault("ENABLE_SEARCH_CACHE", "false")
+os.environ.setdefault("SEARCH_SHARDS", "0")
@@ -0,0 +1,186 @@
+"""Search index build and delta path: empty catalogs, new terms, deletes, sync polling"""
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app.core.config import settings
+from app.services import index_sync as index_sync_module
+from app.services.index_store import IndexStore
+from app.services.index_sync import IndexSync
+from app.services.search_engine import SearchEngine
+
+def recipe(title: str, **fields) -> dict:
+    return {"_id": ObjectId(), "title": title, "description": "", "tags": [], **fields}
+
+CATALOG = [
+    recipe("Chicken curry", tags=["spicy"]),
+    recipe("Beef stew", description="slow cooked"),
+    recipe("Lentil soup", tags=["vegan"]),
+]
+
+def titles(hits: list) -> list:
+    return [hit["title"] for hit in hits]
+
+def test_empty_catalog_builds_an_empty_index():
+    engine = SearchEngine()
+    asyncio.run(engine.index_recipes([]))
+
+    assert engine.is_ready and engine.snapshot.size == 0
+    assert asyncio.run(engine.search("chicken")) == []
+
+def test_first_recipes_are_searchable_after_an_empty_start():
+    engine = SearchEngine()
+
+    async def scenario():
+        await engine.index_recipes([])
+        await engine.apply_changes(CATALOG[:1])
+        return await engine.search("chicken")
+
+    assert titles(asyncio.run(scenario())) == ["Chicken curry"]
+
+def test_terms_first_seen_in_a_delta_are_searchable():
+    engine = SearchEngine(rebuild_ratio=10.0)
+
+    async def scenario():
+        await engine.index_recipes(CATALOG)
+        before = engine.snapshot
+        await engine.apply_changes([recipe("Zzzunique tart")])
+        return before, await engine.search("zzzunique"), await engine.search("lentil")
+
+    before, unique, lentil = asyncio.run(scenario())
+    assert titles(unique) == ["Zzzunique tart"]
+    assert titles(lentil) == ["Lentil soup"]
+    # Readers may still hold the previous snapshot: its vectorizer is untouched
+    assert "zzzunique" not in before.vectorizer.vocabulary_
+    assert before.vectorize(["zzzunique"]).nnz == 0
+
+def test_updates_and_deletes_replace_rows():
+    engine = SearchEngine(rebuild_ratio=10.0)
+    chicken, beef, _ = CATALOG
+
+    async def scenario():
+        await engine.index_recipes(CATALOG)
+        await engine.apply_changes([{**beef, "title": "Beef ragu"}], deleted_ids=[str(chicken["_id"])])
+        return await engine.search("chicken"), await engine.search("ragu")
+
+    removed, renamed = asyncio.run(scenario())
+    assert removed == []
+    assert titles(renamed) == ["Beef ragu"]
+    assert engine.snapshot.size == 2
+
+class FakeCursor:
+    def __init__(self, documents: list):
+        self.documents = documents
+
+    def batch_size(self, _):
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.documents)
+
+    def __aiter__(self):
+        async def iterate():
+            for document in self.documents:
+                yield document
+        return iterate()
+
+def _matches(document: dict, query: dict) -> bool:
+    for name, condition in query.items():
+        if name == "$or":
+            if not any(_matches(document, clause) for clause in condition):
+                return False
+            continue
+        value = document.get(name)
+        if "$gt" in condition and (value is None or not value > condition["$gt"]):
+            return False
+        if "$in" in condition and value not in condition["$in"]:
+            return False
+    return True
+
+class FakeCollection:
+    """The find() subset IndexSync uses, over an in-memory list"""
+
+    def __init__(self, documents: list):
+        self.documents = documents
+
+    def find(self, query: dict, projection=None):
+        return FakeCursor([d for d in self.documents if _matches(d, query)])
+
+@pytest.fixture
+def sync(monkeypatch):
+    engine = SearchEngine(rebuild_ratio=10.0)
+    collection = FakeCollection([])
+    monkeypatch.setattr(index_sync_module, "search_engine", engine)
+    monkeypatch.setattr(settings, "ENABLE_INDEX_SNAPSHOTS", False)
+    monkeypatch.setattr(settings, "SEARCH_INDEX_RECONCILE_EVERY", 1000)
+    sync = IndexSync()
+    monkeypatch.setattr(sync, "_collection", lambda: collection)
+    return sync, engine, collection
+
+def test_sync_picks_up_inserts_without_updated_at(sync):
+    sync, engine, collection = sync
+
+    async def scenario():
+        await engine.index_columns(await sync._stream_columns())
+        # Empty collection: no cursor yet, so polls reconcile
+        collection.documents.append(recipe("Chicken curry"))
+        await sync.sync_once()
+        first = await engine.search("chicken")
+        # Now the _id cursor finds the next insert without a full reconcile
+        collection.documents.append(recipe("Beef stew"))
+        await sync.sync_once()
+        return first, await engine.search("beef")
+
+    first, second = asyncio.run(scenario())
+    assert titles(first) == ["Chicken curry"]
+    assert titles(second) == ["Beef stew"]
+    assert sync.last_id == collection.documents[-1]["_id"]
+
+def test_sync_applies_updates_by_timestamp(sync):
+    sync, engine, collection = sync
+    stew = recipe("Beef stew", updatedAt=datetime(2024, 1, 1))
+    collection.documents.extend([recipe("Chicken curry", updatedAt=datetime(2024, 1, 1)), stew])
+
+    async def scenario():
+        await engine.index_columns(await sync._stream_columns())
+        stew.update(title="Beef ragu", updatedAt=datetime(2024, 1, 2))
+        await sync.sync_once()
+        return await engine.search("ragu")
+
+    assert titles(asyncio.run(scenario())) == ["Beef ragu"]
+    assert sync.last_synced_at == datetime(2024, 1, 2)
+
+def test_only_the_writer_saves_and_followers_adopt_its_cursor(sync, tmp_path, monkeypatch):
+    sync, engine, collection = sync
+    writer = IndexStore(str(tmp_path))
+    assert writer.acquire_writer()
+    monkeypatch.setattr(index_sync_module, "index_store", IndexStore(str(tmp_path)))
+    monkeypatch.setattr(settings, "ENABLE_INDEX_SNAPSHOTS", True)
+    collection.documents.extend([
+        recipe("Chicken curry", updatedAt=datetime(2024, 1, 1)),
+        recipe("Beef stew", updatedAt=datetime(2024, 1, 1))
+    ])
+
+    async def scenario():
+        await engine.index_columns(await sync._stream_columns())
+        await sync._save_snapshot(force=True)
+        saved_by_follower = writer.current_name()
+
+        # The writer saves before this insert; the follower has already applied it
+        written = SearchEngine()
+        await written.index_recipes(collection.documents)
+        name = writer.save(written.snapshot, synced_at=datetime(2024, 1, 1))
+        collection.documents.append(recipe("Lentil soup", updatedAt=datetime(2024, 1, 2)))
+        await sync.sync_once()
+
+        await sync._follow_snapshot()
+        return saved_by_follower, name, await engine.search("lentil")
+
+    saved_by_follower, name, lentil = asyncio.run(scenario())
+    assert saved_by_follower is None
+    assert engine.snapshot.source == str(tmp_path / name)
+    # Adopted from the manifest's cursor, then caught up past it
+    assert titles(lentil) == ["Lentil soup"]
+    assert sync.last_synced_at == datetime(2024, 1, 2)
@@ -0,0 +1,140 @@
+"""Delta overlay: deltas leave the (memory-mapped) base alone and merge on save/reload; background embeddings"""
+import asyncio
+import zlib
+
+import numpy as np
+from bson import ObjectId
+
+from app.services.embeddings import DenseOverlay, IVFIndex
+from app.services.index_store import IndexStore
+from app.services.search_engine import SearchEngine
+
+class HashingEncoder:
+    """Deterministic stand-in for the sentence encoder: one dimension per word hash"""
+
+    def encode(self, texts: list) -> np.ndarray:
+        vectors = np.zeros((len(texts), 32), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().replace(".", " ").replace(",", " ").split():
+                vectors[i, zlib.crc32(word.encode()) % 32] += 1.0
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def try_encode(self, texts: list) -> np.ndarray:
+        return self.encode(texts)
+
+def recipe(title: str) -> dict:
+    return {"_id": ObjectId(), "title": title}
+
+CATALOG = [recipe(title) for title in (
+    "Chicken curry", "Beef stew", "Lentil soup", "Pork tacos", "Salmon bowl", "Tofu stir fry"
+)]
+
+def titles(hits: list) -> list:
+    return [hit["title"] for hit in hits]
+
+async def embedded(engine: SearchEngine):
+    engine.schedule_embedding()
+    await engine._embed_task
+
+def test_embeddings_are_built_in_the_background_and_catch_up_on_deltas():
+    engine = SearchEngine(rebuild_ratio=10.0, encoder=HashingEncoder())
+
+    async def scenario():
+        await engine.index_recipes(CATALOG)
+        # Served (lexically) before anything is encoded
+        assert not engine.has_dense and engine.serving_mode("semantic") == "lexical"
+        engine.schedule_embedding()
+        # Deltas land while the catalog is being encoded
+        await engine.apply_changes([recipe("Chicken pie")], deleted_ids=[str(CATALOG[0]["_id"])])
+        await engine._embed_task
+        return await engine.search("chicken pie", mode="semantic")
+
+    hits = asyncio.run(scenario())
+    snapshot = engine.snapshot
+    assert engine.serving_mode("semantic") == "semantic"
+    assert snapshot.dense.size == snapshot.n_rows == 7
+    assert titles(hits)[0] == "Chicken pie" and "Chicken curry" not in titles(hits)
+    assert SearchEngine().serving_mode("semantic") is None
+
+def test_deltas_do_not_copy_the_base():
+    engine = SearchEngine(rebuild_ratio=10.0, encoder=HashingEncoder())
+    chicken, beef = CATALOG[:2]
+
+    async def scenario():
+        await engine.index_recipes(CATALOG)
+        await embedded(engine)
+        base = engine.snapshot
+        await engine.apply_changes(
+            [recipe("Chicken pie"), {**beef, "title": "Beef ragu"}],
+            deleted_ids=[str(chicken["_id"])]
+        )
+        return base, await engine.search("chicken"), await engine.search("beef"), await engine.search(
+            "beef", mode="semantic"
+        )
+
+    base, chicken_hits, beef_hits, semantic = asyncio.run(scenario())
+    snapshot = engine.snapshot
+    assert snapshot.recipe_vectors is base.recipe_vectors
+    assert snapshot.postings is base.postings
+    assert isinstance(snapshot.dense, DenseOverlay) and snapshot.dense.base is base.dense
+    assert snapshot.size == 6 and snapshot.n_rows == 8
+
+    assert titles(chicken_hits) == ["Chicken pie"]
+    assert titles(beef_hits) == ["Beef ragu"]
+    assert "Beef stew" not in titles(semantic) and "Chicken curry" not in titles(semantic)
+
+def test_merge_drops_dead_rows_and_keeps_results():
+    engine = SearchEngine(rebuild_ratio=10.0, encoder=HashingEncoder())
+
+    async def scenario():
+        await engine.index_recipes(CATALOG)
+        await embedded(engine)
+        await engine.apply_changes([recipe("Chicken pie")], deleted_ids=[str(CATALOG[0]["_id"])])
+        return await engine.search("chicken pie")
+
+    before = asyncio.run(scenario())
+    merged = engine.snapshot.merged()
+    assert merged.n_rows == merged.size == 6
+    assert merged.delta_vectors is None and merged.live is None
+    assert isinstance(merged.dense, IVFIndex) and merged.dense.size == 6
+
+    async def search_merged():
+        await engine.load_snapshot(merged)
+        return await engine.search("chicken pie")
+
+    assert asyncio.run(search_merged()) == before
+
+def test_save_and_reload_serves_the_memory_mapped_merge(tmp_path):
+    engine = SearchEngine(rebuild_ratio=10.0)
+    store = IndexStore(str(tmp_path))
+
+    async def scenario():
+        await engine.index_recipes(CATALOG)
+        await engine.apply_changes([recipe("Zzzunique tart")], deleted_ids=[str(CATALOG[0]["_id"])])
+        saved = engine.snapshot
+        await asyncio.to_thread(store.save, saved)
+        reloaded = await engine.reload_snapshot(saved, store.load()[0])
+        return saved, reloaded, await engine.search("zzzunique")
+
+    saved, reloaded, hits = asyncio.run(scenario())
+    snapshot = engine.snapshot
+    assert reloaded and snapshot.version == saved.version + 1
+    # Read-only views of the mapped files, not private copies
+    assert not snapshot.recipe_vectors.data.flags.owndata
+    assert not snapshot.recipe_vectors.data.flags.writeable
+    assert snapshot.delta_vectors is None and snapshot.n_rows == snapshot.size == 6
+    assert titles(hits) == ["Zzzunique tart"]
+
+def test_reload_is_skipped_when_the_index_moved_on(tmp_path):
+    engine = SearchEngine(rebuild_ratio=10.0)
+    store = IndexStore(str(tmp_path))
+
+    async def scenario():
+        await engine.index_recipes(CATALOG)
+        saved = engine.snapshot
+        await asyncio.to_thread(store.save, saved)
+        await engine.apply_changes([recipe("Chicken pie")])
+        return await engine.reload_snapshot(saved, store.load()[0])
+
+    assert asyncio.run(scenario()) is False
+    assert engine.snapshot.size == 7
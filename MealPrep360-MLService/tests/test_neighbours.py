@@ -0,0 +1,63 @@
+"""Neighbour table: incremental refresh of small catalogs and after deletions"""
+import asyncio
+from datetime import datetime
+
+import numpy as np
+from bson import ObjectId
+
+from app.jobs.build_neighbours import carry_over
+from app.services.neighbours import NeighbourTable, compute_neighbours
+from app.services.projection import RecipeColumns
+from app.services.search_engine import SearchEngine
+
+TITLES = ["Chicken curry", "Chicken soup", "Beef stew", "Beef curry", "Lentil soup", "Lentil curry"]
+
+def test_incremental_refresh_of_a_catalog_smaller_than_the_width():
+    columns = RecipeColumns.from_documents([{"_id": ObjectId(), "title": t} for t in TITLES])
+    snapshot = SearchEngine()._fit(columns, version=1)
+    ids = np.array(columns.ids)
+
+    neighbours, scores = compute_neighbours(snapshot.recipe_vectors, 20)
+    previous = NeighbourTable(ids=ids, neighbours=neighbours, scores=scores, built_at=datetime(2024, 1, 1))
+    assert previous.width == len(ids) - 1
+
+    changed = np.zeros(len(ids), dtype=bool)
+    changed[0] = True
+    kept_rows, kept_scores, refresh = carry_over(previous, snapshot, ids, changed, 20)
+    refreshed, _ = compute_neighbours(
+        snapshot.recipe_vectors, 20,
+        changed_rows=np.flatnonzero(refresh), kept_rows=kept_rows, kept_scores=kept_scores
+    )
+    # Same lists as a full build (ties may come in another order)
+    np.testing.assert_array_equal(np.sort(refreshed, axis=1), np.sort(neighbours, axis=1))
+
+def test_rows_that_lose_a_neighbour_are_refilled():
+    engine = SearchEngine(rebuild_ratio=10.0)
+    recipes = [{"_id": ObjectId(), "title": t} for t in TITLES]
+    width = 2
+
+    async def scenario():
+        await engine.index_recipes(recipes)
+        before = engine.snapshot
+        await engine.apply_changes([], deleted_ids=[str(recipes[1]["_id"])])  # Chicken soup
+        return before, engine.snapshot.merged()
+
+    before, after = asyncio.run(scenario())
+    neighbours, scores = compute_neighbours(before.recipe_vectors, width)
+    previous = NeighbourTable(
+        ids=np.array(before.columns.ids), neighbours=neighbours, scores=scores, built_at=datetime(2024, 1, 1)
+    )
+    assert width < len(TITLES) - 1 and (neighbours == 1).any()
+
+    ids = np.array(after.columns.ids)
+    unchanged = np.zeros(len(ids), dtype=bool)  # A deletion only
+    kept_rows, kept_scores, refresh = carry_over(previous, after, ids, unchanged, width)
+    assert refresh.any()
+    refreshed, refreshed_scores = compute_neighbours(
+        after.recipe_vectors, width,
+        changed_rows=np.flatnonzero(refresh), kept_rows=kept_rows, kept_scores=kept_scores
+    )
+    full, full_scores = compute_neighbours(after.recipe_vectors, width)
+    # As full as a fresh build: the deleted recipe's slots were refilled
+    np.testing.assert_array_equal((refreshed >= 0).sum(axis=1), (full >= 0).sum(axis=1))
+    np.testing.assert_array_equal(np.sort(refreshed_scores, axis=1), np.sort(full_scores, axis=1))
@@ -0,0 +1,84 @@
+"""Search result cache keys: shared by every instance serving the same recipes"""
+import asyncio
+
+from bson import ObjectId
+
+from app.services.query_cache import QueryCache
+from app.services.search_engine import SearchEngine
+
+def recipe(title: str) -> dict:
+    return {"_id": ObjectId(), "title": title}
+
+CATALOG = [recipe(title) for title in ("Chicken curry", "Beef stew", "Lentil soup")]
+
+class FakeRedis:
+    """The mget / pipelined set subset the cache uses"""
+
+    def __init__(self):
+        self.values = {}
+
+    async def mget(self, keys: list) -> list:
+        return [self.values.get(key) for key in keys]
+
+    def pipeline(self, transaction: bool = True):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.pending = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def set(self, key, value, ex=None):
+        self.pending[key] = value
+
+    async def execute(self):
+        self.redis.values.update(self.pending)
+
+def test_token_depends_on_content_not_history():
+    built = SearchEngine(rebuild_ratio=10.0)
+    patched = SearchEngine(rebuild_ratio=10.0)
+    pie = recipe("Chicken pie")
+
+    async def scenario():
+        await built.index_recipes(CATALOG[1:] + [pie])
+        # Same recipes reached through a delta, in another order, with more versions
+        await patched.index_recipes(CATALOG)
+        await patched.apply_changes([pie], deleted_ids=[str(CATALOG[0]["_id"])])
+
+    asyncio.run(scenario())
+    assert built.snapshot.version != patched.snapshot.version
+    assert built.snapshot.token == patched.snapshot.token
+
+    async def edit():
+        await patched.apply_changes([{**pie, "title": "Chicken pot pie"}])
+
+    asyncio.run(edit())
+    assert patched.snapshot.token != built.snapshot.token
+    assert QueryCache.key("pie", built.snapshot.token, "lexical", 10, None) != QueryCache.key(
+        "pie", patched.snapshot.token, "lexical", 10, None
+    )
+
+def test_instances_share_cached_rankings():
+    redis = FakeRedis()
+    caches = [QueryCache(), QueryCache()]
+    for cache in caches:
+        cache.redis = redis
+    first, second = (SearchEngine(cache=cache) for cache in caches)
+
+    async def scenario():
+        await first.index_recipes(CATALOG)
+        # A second instance that happened to refit once more: same recipes, newer version
+        await second.index_recipes(CATALOG)
+        await second.index_recipes(CATALOG)
+        hits = await first.search("curry")
+        return hits, await second.search("curry")
+
+    hits, shared = asyncio.run(scenario())
+    assert shared == hits
+    assert caches[1].redis_hits == 1 and caches[1].misses == 0
@@ -0,0 +1,69 @@
+"""Shard pool shared by a node's workers: one copy per layout, lean coordinators, owner takeover"""
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from app.services.search_engine import SearchEngine
+from app.services.shards import ShardPool
+
+def recipe(title: str) -> dict:
+    return {"_id": ObjectId(), "title": title}
+
+CATALOG = [recipe(title) for title in (
+    "Chicken curry", "Beef stew", "Lentil soup", "Pork tacos", "Salmon bowl", "Chicken soup"
+)]
+
+def titles(hits: list) -> list:
+    return [hit["title"] for hit in hits]
+
+@pytest.fixture
+def pools(tmp_path):
+    # Two workers on one node: the first starts the servers, the second connects
+    owner, worker = ShardPool(2, str(tmp_path)), ShardPool(2, str(tmp_path))
+    owner.start()
+    worker.start()
+    yield owner, worker
+    worker.stop()
+    owner.stop()
+
+def test_workers_share_shard_state_and_match_in_process(pools, monkeypatch):
+    owner, worker = pools
+    shipped = []
+    monkeypatch.setattr(worker, "_payload", lambda snapshot, rows: shipped.append(rows))
+    first, second = SearchEngine(rebuild_ratio=10.0, shards=owner), SearchEngine(rebuild_ratio=10.0, shards=worker)
+    local = SearchEngine(rebuild_ratio=10.0)
+    delta = ([recipe("Chicken pie"), {**CATALOG[1], "title": "Beef ragu"}], [str(CATALOG[0]["_id"])])
+
+    async def scenario():
+        results = []
+        for engine in (first, second, local):
+            await engine.index_recipes(CATALOG)
+            await engine.apply_changes(*delta)
+            searches = await asyncio.gather(*[engine.search(q) for q in ("chicken", "beef", "soup") * 4])
+            similar = await engine.find_similar(str(CATALOG[2]["_id"]))
+            results.append(([titles(hits) for hits in searches], titles(similar)))
+        return results
+
+    sharded, shared, in_process = asyncio.run(scenario())
+    assert owner.owner and not worker.owner
+    assert sharded == shared == in_process
+    # The coordinators dropped their vectors; the second worker shipped none
+    assert first.snapshot.is_lean and second.snapshot.is_lean
+    assert first.snapshot.layout == second.snapshot.layout
+    assert shipped == []
+
+def test_a_worker_takes_over_when_the_owner_stops(pools):
+    owner, worker = pools
+    engine = SearchEngine(rebuild_ratio=10.0, shards=worker)
+
+    async def scenario():
+        await engine.index_recipes(CATALOG)
+        owner.stop()
+        with pytest.raises(RuntimeError):
+            await engine.search("chicken")
+        await engine._rebuild_task
+        return await engine.search("chicken")
+
+    assert titles(asyncio.run(scenario())) == ["Chicken soup", "Chicken curry"]
+    assert worker.owner and engine.snapshot.is_lean
@@ -8,6 +8,7 @@ from loguru import logger
 import sys
 
 from app.core.config import settings
+from app.core.metrics import PrometheusMiddleware, metrics_endpoint
 from app.routers import calculate, ingredients, meal_plans
 
 logger.remove()
@@ -28,6 +29,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Metrics
+app.add_middleware(PrometheusMiddleware)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
 # Include routers
 app.include_router(calculate.router, prefix="/api/nutrition", tags=["nutrition"])
 app.include_router(ingredients.router, prefix="/api/ingredients", tags=["ingredients"])
@@ -4,6 +4,7 @@ from loguru import logger
 from typing import Optional, Dict
 
 from app.core.config import settings
+from app.core.metrics import record_cache, track_upstream
 
 class USDAClient:
     """Client for USDA FoodData Central API"""
@@ -16,20 +17,22 @@ class USDAClient:
     
     async def search_food(self, query: str) -> Optional[Dict]:
         """Search for food in USDA database"""
+        record_cache("usda", query in self.cache)
         if query in self.cache:
             return self.cache[query]
         
         try:
             async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.BASE_URL}/foods/search",
-                    params={
-                        "query": query,
-                        "api_key": self.api_key,
-                        "dataType": ["Foundation", "SR Legacy"],
-                        "pageSize": 1
-                    }
-                )
+                with track_upstream("usda", "foods_search"):
+                    response = await client.get(
+                        f"{self.BASE_URL}/foods/search",
+                        params={
+                            "query": query,
+                            "api_key": self.api_key,
+                            "dataType": ["Foundation", "SR Legacy"],
+                            "pageSize": 1
+                        }
+                    )
                 
                 if response.status_code == 200:
                     data = response.json()
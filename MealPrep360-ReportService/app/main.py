@@ -8,6 +8,7 @@ from loguru import logger
 import sys
 
 from app.core.config import settings
+from app.core.metrics import PrometheusMiddleware, metrics_endpoint
 from app.routers import meal_plans, shopping_lists, analytics
 
 logger.remove()
@@ -27,6 +28,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Metrics
+app.add_middleware(PrometheusMiddleware)
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+
 app.include_router(meal_plans.router, prefix="/api/reports/meal-plans", tags=["meal-plans"])
 app.include_router(shopping_lists.router, prefix="/api/reports/shopping-lists", tags=["shopping-lists"])
 app.include_router(analytics.router, prefix="/api/reports/analytics", tags=["analytics"])
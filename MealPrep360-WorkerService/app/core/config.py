@@ -17,6 +17,14 @@ class Settings(BaseSettings):
     # Service URLs
     AI_SERVICE_URL: str = "http://ai-service:8000"
     IMAGE_SERVICE_URL: str = "http://image-service:8002"
+    AI_INTERNAL_API_KEY: str | None = None  # AI service INTERNAL_API_KEY
+    
+    # Recipe jobs through the provider Batch API (half price, results within 24h);
+    # needs AI_INTERNAL_API_KEY set here and INTERNAL_API_KEY on the AI service
+    USE_BATCH_API: bool = False
+    BATCH_API_MIN_COUNT: int = 20  # Smaller on-demand jobs stay synchronous
+    BATCH_API_POLL_SECONDS: int = 300
+    BATCH_API_MAX_POLLS: int = 300  # Just over the 24h completion window
     
     class Config:
         env_file = ".env"
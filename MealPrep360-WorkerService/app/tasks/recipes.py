@@ -1,10 +1,13 @@
 """Recipe-related background tasks"""
 from celery import Task
 from loguru import logger
+from pymongo import UpdateOne
+from typing import Optional
 import httpx
 from datetime import datetime
 
 from app.celery_app import app
+from app.core.config import settings
 from app.core.database import get_db
 
 class RecipeTask(Task):
@@ -15,12 +18,24 @@ class RecipeTask(Task):
     def on_failure(self, exc, task_id, args, kwargs, einfo):
         logger.error(f"Task {task_id} failed: {exc}")
 
+def _ai_headers() -> dict:
+    return {"X-Internal-Key": settings.AI_INTERNAL_API_KEY} if settings.AI_INTERNAL_API_KEY else {}
+
 @app.task(base=RecipeTask, bind=True, max_retries=3)
-def generate_recipe_batch(self, season: str, count: int, job_id: str):
+def generate_recipe_batch(self, season: str, count: int, job_id: str, use_batch_api: Optional[bool] = None):
     """
     Generate multiple recipes in background
     No time limits!
+    
+    Jobs of BATCH_API_MIN_COUNT or more (or use_batch_api=True) are handed
+    to the AI service's Batch API mode instead of generated one by one;
+    collect_recipe_batch picks the results up when the batch finishes.
+    If the AI service refuses batch jobs (not configured for internal
+    callers), the job is generated one by one instead.
     """
+    if use_batch_api is None:
+        use_batch_api = settings.USE_BATCH_API and count >= settings.BATCH_API_MIN_COUNT
+    
     try:
         logger.info(f"Starting batch generation: {count} recipes for {season}")
         
@@ -31,6 +46,14 @@ def generate_recipe_batch(self, season: str, count: int, job_id: str):
             {"$set": {"status": "processing", "progress": 0, "total": count}}
         )
         
+        if use_batch_api:
+            try:
+                return _submit_batch_job(season, count, job_id)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code not in (403, 503):
+                    raise
+                logger.warning(f"Batch API refused ({e.response.status_code}), generating job {job_id} one by one")
+        
         generated = []
         failed = 0
         
@@ -103,6 +126,138 @@ def generate_recipe_batch(self, season: str, count: int, job_id: str):
         )
         raise self.retry(exc=exc, countdown=60 * (self.request.retries + 1))
 
+def _submit_batch_job(season: str, count: int, job_id: str) -> dict:
+    """
+    Queue the job on the AI service's Batch API and schedule its collection
+    A retried task whose batch was already submitted only reschedules the
+    collection, so the batch isn't submitted (and billed) twice
+    """
+    job = get_db().jobs.find_one({"_id": job_id}, {"data.batchId": 1})
+    batch_id = ((job or {}).get("data") or {}).get("batchId")
+    if batch_id:
+        collect_recipe_batch.apply_async((batch_id, job_id), countdown=settings.BATCH_API_POLL_SECONDS)
+        logger.info(f"Job {job_id} already submitted as batch {batch_id}")
+        return {"batch_id": batch_id, "status": "already submitted"}
+    
+    with httpx.Client(timeout=120.0) as client:
+        response = client.post(
+            f"{settings.AI_SERVICE_URL}/api/recipes/batch-jobs",
+            params={"season": season, "count": count, "job_id": job_id},
+            headers=_ai_headers()
+        )
+        response.raise_for_status()
+        batch = response.json()
+    
+    get_db().jobs.update_one(
+        {"_id": job_id},
+        {"$set": {"data.batchId": batch["batch_id"]}}
+    )
+    collect_recipe_batch.apply_async((batch["batch_id"], job_id), countdown=settings.BATCH_API_POLL_SECONDS)
+    
+    logger.info(f"Submitted {count} recipes for {season} as batch {batch['batch_id']}")
+    return {"batch_id": batch["batch_id"], "status": batch["status"]}
+
+def _poll_again(task: Task, batch_id: str, job_id: str, exc: Optional[Exception] = None) -> dict:
+    """Schedule the next poll; once BATCH_API_MAX_POLLS are used up, fail the job"""
+    if task.request.retries < task.max_retries:
+        raise task.retry(exc=exc, countdown=settings.BATCH_API_POLL_SECONDS)
+    
+    error = f"Batch {batch_id} not collected after {task.max_retries} polls" + (f": {exc}" if exc else "")
+    get_db().jobs.update_one(
+        {"_id": job_id},
+        {"$set": {"status": "failed", "error": error}}
+    )
+    logger.error(error)
+    return {"batch_id": batch_id, "status": "timed out"}
+
+@app.task(base=RecipeTask, bind=True, max_retries=settings.BATCH_API_MAX_POLLS)
+def collect_recipe_batch(self, batch_id: str, job_id: str):
+    """
+    Poll a Batch API job until it finishes, then save its recipes in bulk
+    
+    Recipes arrive already validated against the Recipe schema; items that
+    failed or didn't validate are counted as failed. Each recipe is upserted
+    on its batch request id (batchCustomId), so a collection that is re-run
+    after a crash does not insert duplicates.
+    """
+    db = get_db()
+    job = db.jobs.find_one({"_id": job_id}, {"status": 1})
+    if job and job.get("status") == "completed":
+        return {"batch_id": batch_id, "status": "already collected"}
+    
+    try:
+        with httpx.Client(timeout=120.0) as client:
+            response = client.get(
+                f"{settings.AI_SERVICE_URL}/api/recipes/batch-jobs/{batch_id}",
+                headers=_ai_headers()
+            )
+            response.raise_for_status()
+            batch = response.json()
+    except httpx.HTTPError as exc:
+        return _poll_again(self, batch_id, job_id, exc)
+    
+    counts = batch.get("request_counts") or {}
+    if not batch["done"]:
+        db.jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"progress": counts.get("completed", 0) + counts.get("failed", 0)}}
+        )
+        return _poll_again(self, batch_id, job_id)
+    
+    if batch["status"] != "completed":
+        db.jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"status": "failed", "error": f"Batch {batch_id} {batch['status']}"}}
+        )
+        logger.error(f"Batch {batch_id} ended as {batch['status']}")
+        return {"batch_id": batch_id, "status": batch["status"]}
+    
+    now = datetime.utcnow()
+    recipes = batch["recipes"]
+    if recipes:
+        db.recipes.create_index(
+            "batchCustomId",
+            unique=True,
+            partialFilterExpression={"batchCustomId": {"$exists": True}}
+        )
+        upserts = []
+        for i, recipe in enumerate(recipes):
+            # Results cached before requests carried their id: position in the batch
+            custom_id = recipe.pop("customId", None) or f"{batch_id}:{i}"
+            upserts.append(UpdateOne(
+                {"batchCustomId": custom_id},
+                {"$setOnInsert": {
+                    **recipe,
+                    "batchCustomId": custom_id,
+                    "jobId": job_id,
+                    "createdAt": now,
+                    "updatedAt": now
+                }},
+                upsert=True
+            ))
+        db.recipes.bulk_write(upserts, ordered=False)
+    
+    failed = len(batch["failures"])
+    db.jobs.update_one(
+        {"_id": job_id},
+        {"$set": {
+            "status": "completed",
+            "progress": len(recipes) + failed,
+            "completedAt": now,
+            "data.recipesGenerated": len(recipes),
+            "data.recipesFailed": failed,
+            "data.cost": batch["total_cost"]
+        }}
+    )
+    
+    logger.info(f"Batch {batch_id} complete: {len(recipes)} generated, {failed} failed (${batch['total_cost']:.4f})")
+    
+    return {
+        "generated": len(recipes),
+        "failed": failed,
+        "recipes": [recipe["title"] for recipe in recipes]
+    }
+
 @app.task
 def generate_daily_recipes():
     """Scheduled task: Generate recipes daily"""
@@ -123,6 +278,6 @@ def generate_daily_recipes():
         "createdAt": datetime.utcnow()
     })
     
-    # Trigger batch generation
-    generate_recipe_batch.delay(season, 10, job_id)
+    # Trigger batch generation (nobody waits on it: the cheaper Batch API when enabled)
+    generate_recipe_batch.delay(season, 10, job_id, use_batch_api=settings.USE_BATCH_API)
 